@@ -1,60 +1,219 @@
 
-from kivy.graphics import VertexInstruction
-from kivy.clock import Clock
-from copy import copy
+import heapq
+from backend import Clock
+from settings import LOD_SMALL_SIZE, LOD_SMALL_DELAY
 
 GLOBAL_PAUSE = False
-_ANIMATIONS = []
+
+
+class AnimationTicker(object):
+    """
+    Shows next frames of all animated objects from one Clock callback.
+    Objects are kept in heap by time when their next frame is due, time of
+    ticker doesn't go while it's paused.
+
+    Endless animations of objects which are out of view (see set_view) are
+    suspended and catch up when objects become visible (when view is
+    changed or objects are moved, see update_dynamic). Objects which are
+    small on screen are woken less often, so they skip frames and are
+    animated with lower frame rate, but at the same speed
+    """
+
+    def __init__(self):
+        self.time = 0.
+        self.paused = False
+        # visible part of scene (x0, y0, x1, y1), None if all is visible
+        self.view = None
+        self.view_scale = 1.
+        self._heap = []
+        # object: number of its actual entry in heap, others are skipped
+        self._entries = {}
+        # suspended objects: time when their frame was due
+        self._hidden = {}
+        self._counter = 0
+        self._running = False
+
+    def __len__(self):
+        return len(self._entries) + len(self._hidden)
+
+    def schedule(self, obj, delay):
+        """
+        Call obj._animate(lag) after delay seconds of ticker time, returns due
+        time. Small object is called later, lag is counted from due time
+        """
+        due = self.time + delay
+        self._push(obj, due, max(due, self.time + self.min_delay(obj)))
+        self._run()
+        return due
+
+    def _push(self, obj, due, wake=None):
+        self._counter += 1
+        self._entries[obj] = self._counter
+        heapq.heappush(self._heap, (due if wake is None else wake, self._counter, obj, due))
+
+    def unschedule(self, obj):
+        self._entries.pop(obj, None)
+        self._hidden.pop(obj, None)
+
+    def set_view(self, view, scale=1.):
+        """ Set visible rectangle of scene and its scale on screen """
+        self.view = view
+        self.view_scale = scale
+        self._show(list(self._hidden))
+
+    def update_dynamic(self, objs):
+        """ Called each frame with objects which were moved """
+        if self._hidden:
+            self._show([obj for obj in objs if obj in self._hidden])
+
+    def _show(self, objs):
+        """ Resume suspended objects which became visible """
+        for obj in objs:
+            if self.is_visible(obj):
+                self._push(obj, self._hidden.pop(obj))
+        self._run()
+
+    def is_visible(self, obj):
+        if self.view is None:
+            return True
+        bbox = obj.bbox()
+        if bbox is None:
+            return True
+        x, y, w, h = bbox
+        x0, y0, x1, y1 = self.view
+        return x < x1 and x + w > x0 and y < y1 and y + h > y0
+
+    def min_delay(self, obj):
+        """ Minimal time between frames of object """
+        bbox = obj.bbox()
+        if bbox and max(bbox[2], bbox[3]) * self.view_scale < LOD_SMALL_SIZE:
+            return LOD_SMALL_DELAY
+        return 0.
+
+    def pause(self):
+        self.paused = True
+        self._stop()
+
+    def resume(self):
+        self.paused = False
+        self._run()
+
+    def reset(self):
+        self._stop()
+        self.time = 0.
+        self.paused = False
+        self._heap = []
+        self._entries = {}
+        self._hidden = {}
+
+    def _run(self):
+        # time goes on while objects are suspended, so they catch up when shown
+        if not self._running and not self.paused and (self._entries or self._hidden):
+            self._running = True
+            Clock.schedule_interval(self.tick, 0)
+
+    def _stop(self):
+        if self._running:
+            self._running = False
+            Clock.unschedule(self.tick)
+
+    def tick(self, dt):
+        self.time += dt
+        heap = self._heap
+        while heap and heap[0][0] <= self.time and not self.paused:
+            wake, number, obj, due = heapq.heappop(heap)
+            if self._entries.get(obj) == number:
+                del self._entries[obj]
+                if obj.endless_animation and not self.is_visible(obj):
+                    self._hidden[obj] = due
+                else:
+                    obj._animate(self.time - due)
+        if not self._entries:
+            del heap[:]
+            if not self._hidden:
+                self._running = False
+                return False
+
+
+ticker = AnimationTicker()
+
 
 def set_global_pause(val):
     global GLOBAL_PAUSE
     GLOBAL_PAUSE = val
+    if val:
+        ticker.pause()
+    else:
+        ticker.resume()
     
     
-def reset_animations():
-    global _ANIMATIONS
-    for a in _ANIMATIONS:
-        a.reset()
-        
+def flip_coords(coords):
+    """ Texture coordinates of horizontally flipped texture """
+    x1, y1, x2, y2, x3, y3, x4, y4 = coords
+    return (x2, y2, x1, y1, x4, y4, x3, y3)
+
+
+def texture_coords(texture):
+    """ Get (normal, flipped) texture coordinates of texture """
+    coords = tuple(texture.tex_coords)
+    return coords, flip_coords(coords)
+
 
 class Animation(object):
     """
-    Generic interface. Override __init__ in inherited class
+    Clip which is never changed after creation, so it is shared by all
+    sprites: position of sprite in the clip is kept by its Playhead.
+    Override __init__ in inherited class
     
-    each frame in the list '_frames' is tuple (texture, time_to_show)
+    each frame in the tuple 'frames' is tuple (texture, time_to_show),
+    'coords' are texture_coords of each frame
     """
     
-    def __init__(self, *args, **kw):
-        global _ANIMATIONS
-        _ANIMATIONS.append(self)
-        self.current_frame = 0
-    
-    def set_frames(self, frames):
-        self._frames = frames
-    
+    def __init__(self, frames):
+        self.frames = tuple(frames)
+        self.duration = sum(_time for texture, _time in self.frames)
+        self.coords = tuple(texture_coords(texture) for texture, _time in self.frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class Playhead(object):
+    """ Index of the next frame of clip shown by sprite and time when it is due """
+
+    __slots__ = ('clip', 'frame', 'due')
+
+    def __init__(self, clip):
+        self.clip = clip
+        self.frame = 0
+        self.due = None
+
     def next(self):
-        if self.current_frame < len(self._frames):
-            texture, _time = self._frames[self.current_frame]
-            self.current_frame += 1
-            return texture, _time
-        else:
-            self.current_frame = 0
-            raise StopIteration
-        
-    def is_first_call(self):
-        return self.current_frame == 0
-    
-    def reset(self):
-        self.current_frame = 0
+        """ Get the next frame, None when all frames are shown and playhead is rewound """
+        if self.frame < len(self.clip.frames):
+            self.frame += 1
+            return self.clip.frames[self.frame - 1]
+        self.frame = 0
+        return None
+
+    def rewind(self):
+        self.frame = 0
+        self.due = None
+
 
 class AnimationMixin(object):
-    
+    """
+    Shows animations with the sprite instruction of object (self.sprite),
+    if h_flipped is set, textures are shown horizontally flipped
+    """
+
+    h_flipped = False
     
     def __new__(cls, *args, **kw):
         
         self = super(AnimationMixin, cls).__new__(cls)
         
-        self.current_animation = None
+        self.playhead = None
         self.animations = {}
         self.endless_animation = False
         self.animation_callback = None
@@ -63,85 +222,87 @@ class AnimationMixin(object):
         return self
         
     
-    def redraw(self):
-        assert not self.widget is None
-        
-        for obj in self.widget.canvas.children:
-            if isinstance(obj, VertexInstruction):
-                obj.texture = self.texture
-        
-        if hasattr(self, 'post_redraw_hook'):
-            self.post_redraw_hook()
+    def bbox(self):
+        """ (x, y, width, height) of object on scene, None if it should be always animated """
+        widget = self.widget
+        return widget.x, widget.y, widget.width, widget.height
+
+    def redraw(self, coords=None):
+        """ Show self.texture, coords are its texture_coords if they are known """
+        if coords is None:
+            coords = texture_coords(self.texture)
+        self.sprite.texture = self.texture
+        self.sprite.tex_coords = coords[self.h_flipped]
+
+    @property
+    def current_animation(self):
+        return self.playhead.clip if self.playhead else None
                             
     def set_animation(self, animation, stop=False):
         """ Here you can set animation directly or give key of predefined animation """
         if stop:
             self.stop_animation()
-        if isinstance(animation, Animation):
-            self.current_animation = animation
-        else:
-            self.current_animation = self.animations[animation]
+        if not isinstance(animation, Animation):
+            animation = self.animations[animation]
+        if animation is not self.current_animation:
+            self.playhead = Playhead(animation)
     
     def animate(self, endless=False):
         self.endless_animation = endless
-        self._animate()
-    
-    def _animate(self, *largs):
-
-        global GLOBAL_PAUSE
-        
         if GLOBAL_PAUSE:
-            Clock.schedule_once(self._animate, 0.1)
-            return
+            # the first frame is shown when game is resumed
+            ticker.schedule(self, 0)
+        else:
+            self._animate()
+    
+    def _animate(self, lag=0.):
+        """ Show the next frame, frames which had to be shown during lag seconds are skipped """
 
-        animation = self.current_animation
-        if animation.is_first_call():
+        playhead = self.playhead
+        if playhead.frame == 0:
             # backup texture:
             self.original_texture = self.texture
-        next_frame = next(animation, None)
-        if next_frame is None: # all frames are shown
-            if callable(self.animation_callback):
-                self.callback()
-            if not self.endless_animation:
-                # restore texture
-                if self.restore_original:
-                    self.texture = self.original_texture
-                    self.redraw()
-                return
-            else:
-                next_frame = next(animation, None)
-        texture, _time = next_frame
+        if self.endless_animation and playhead.clip.duration:
+            # skip whole cycles
+            lag %= playhead.clip.duration
+        while True:
+            next_frame = playhead.next()
+            if next_frame is None: # all frames are shown
+                if callable(self.animation_callback):
+                    self.callback()
+                if not self.endless_animation:
+                    # restore texture
+                    if self.restore_original:
+                        self.texture = self.original_texture
+                        self.redraw()
+                    return
+                else:
+                    next_frame = playhead.next()
+            texture, _time = next_frame
+            if _time > lag:
+                break
+            lag -= _time
         self.texture = texture
-        self.redraw()
-        Clock.schedule_once(self._animate, _time)
+        self.redraw(playhead.clip.coords[playhead.frame - 1])
+        playhead.due = ticker.schedule(self, _time - lag)
     
     def stop_animation(self):
-        if self.current_animation:
-            self.current_animation.reset()
-        Clock.unschedule(self._animate)
+        if self.playhead:
+            self.playhead.rewind()
+        ticker.unschedule(self)
         
 
 # implementation
 class SimpleAnimation(Animation):
-    def __init__(self, frames):
-        self._frames = frames
-        super(SimpleAnimation, self).__init__()
+    pass
         
 
 class ReverseAnimation(Animation):
     def __init__(self, frames):
-        frames.reverse()
-        self._frames = frames
-        super(ReverseAnimation, self).__init__()
+        super(ReverseAnimation, self).__init__(reversed(frames))
 
 
 class ReturningAnimation(Animation):
     def __init__(self, frames):
-        
-        back_frames = copy(frames)
-        back_frames.reverse()
-        self._frames = frames
-        self._frames.extend(back_frames)
-        super(ReturningAnimation, self).__init__()
-    
-
+        frames = list(frames)
+        super(ReturningAnimation, self).__init__(frames + frames[::-1])
@@ -0,0 +1,21 @@
+""" Kivy classes used by game logic """
+import os
+
+# if MOONRABBIT_HEADLESS environment variable is set, stand-ins from
+# headless module are used instead of Kivy ones (see simulate.py)
+HEADLESS = bool(os.environ.get('MOONRABBIT_HEADLESS'))
+
+if HEADLESS:
+    from headless import Clock, Widget, Image, ImageLoader, Texture, \
+                         Fbo, Canvas, RenderContext, VertexInstruction, Color, Rectangle, \
+                         Ellipse, Mesh, ClearColor, ClearBuffers, PushMatrix, PopMatrix, \
+                         Translate, Rotate
+else:
+    from kivy.clock import Clock
+    from kivy.uix.widget import Widget
+    from kivy.core.image import Image, ImageLoader
+    from kivy.graphics.texture import Texture
+    from kivy.graphics.fbo import Fbo
+    from kivy.graphics import Canvas, RenderContext, VertexInstruction, Color, Rectangle, \
+                              Ellipse, Mesh, ClearColor, ClearBuffers, PushMatrix, PopMatrix, \
+                              Translate, Rotate
@@ -0,0 +1,138 @@
+"""
+Compositing of static layers: parts of scene which never move are rendered
+once to Fbo tiles and drawn as textured quads
+"""
+from backend import Clock, Fbo, Rectangle, Mesh, ClearColor, ClearBuffers, Translate
+from landscape import Terrain, VERTEX_SHADER, FRAGMENT_SHADER
+from settings import BLOCK_SIZE, CULL_CHUNK
+
+
+class Baker(object):
+    """
+    Bakes terrain by chunks of culler and static objects by rows of those
+    chunks (see BAKE_STATICS setting). Terrain of chunk is baked except
+    meshes with animated textures, it's drawn in place of baked meshes.
+
+    Objects are baked only if they are never animated (see
+    StaticObject.bakeable). Tile of objects holds those of them which
+    have the same bottom y in the same column of chunks, so its quad is
+    kept in bucket of that y in ZOrder and is drawn in y-order with other
+    static objects. Tiles stick out of chunk by MARGIN at the sides and
+    are ROW_HEIGHT high for parts of sprites above their bottom.
+
+    Tile is re-baked on the next frame after its content is changed, see
+    invalidate
+    """
+
+    MARGIN = BLOCK_SIZE[0]
+    ROW_HEIGHT = 3 * BLOCK_SIZE[1]
+
+    def __init__(self, canvas, culler, terrain, zorder, block_size=BLOCK_SIZE):
+        # canvas where widgets of objects are added by game
+        self.canvas = canvas
+        self.culler = culler
+        self.terrain = terrain
+        self.zorder = zorder
+        self.chunk_size = CULL_CHUNK * block_size[0], CULL_CHUNK * block_size[1]
+        # chunk: Fbo with terrain, keys of meshes which are baked there
+        self._ground = {}
+        self._meshes = {}
+        # (column of chunk, y): Fbo with objects, objects which are baked there
+        self._tiles = {}
+        self._objs = {}
+        self._dirty = set()
+        self._scheduled = False
+        terrain.on_change = self._mesh_changed
+        self._bake_terrain()
+
+    def _origin(self, chunk):
+        return chunk[0] * self.chunk_size[0], chunk[1] * self.chunk_size[1]
+
+    def _row_origin(self, key):
+        return key[0] * self.chunk_size[0] - self.MARGIN, key[1]
+
+    def _ground_quad(self, chunk, texture):
+        """
+        Quad of baked terrain, it's drawn by shader of Terrain which takes
+        color of vertices, so they are white
+        """
+        x, y = self._origin(chunk)
+        w, h = self.chunk_size
+        u = texture.tex_coords
+        vertices = [x, y, u[0], u[1], 1., 1., 1., 1.,
+                    x + w, y, u[2], u[3], 1., 1., 1., 1.,
+                    x + w, y + h, u[4], u[5], 1., 1., 1., 1.,
+                    x, y + h, u[6], u[7], 1., 1., 1., 1.]
+        return Mesh(vertices=vertices, indices=[0, 1, 2, 2, 3, 0], fmt=Terrain.FMT,
+                    mode='triangles', texture=texture)
+
+    def _bake_terrain(self):
+        meshes = {}
+        for key, mesh in self.terrain.static_meshes():
+            meshes.setdefault(key[0], []).append((key, mesh))
+        for chunk, items in meshes.iteritems():
+            fbo = Fbo(size=self.chunk_size, clear_color=(0., 0., 0., 0.))
+            fbo.shader.vs = VERTEX_SHADER
+            fbo.shader.fs = FRAGMENT_SHADER
+            canvas = self.culler.chunks[chunk]
+            for key, mesh in items:
+                canvas.remove(mesh)
+            self._ground[chunk] = fbo
+            self._meshes[chunk] = [mesh for key, mesh in items]
+            self.terrain.baked.update(key for key, mesh in items)
+            canvas.insert(0, self._ground_quad(chunk, fbo.texture))
+            self._invalidate(fbo)
+
+    def add(self, obj):
+        """ Take widget canvas of just added object to its tile """
+        y = obj.widget.pos[1]
+        key = int(obj.pos[0]) / self.chunk_size[0], y
+        if key not in self._tiles:
+            size = self.chunk_size[0] + 2 * self.MARGIN, self.ROW_HEIGHT
+            fbo = self._tiles[key] = Fbo(size=size, clear_color=(0., 0., 0., 0.))
+            self._objs[fbo] = []
+            self.zorder.bucket(y).add(Rectangle(pos=self._row_origin(key), size=size,
+                                                texture=fbo.texture))
+        fbo = self._tiles[key]
+        self.canvas.remove(obj.widget.canvas)
+        self._objs[fbo].append(obj)
+        obj.baked = fbo
+        self._invalidate(fbo)
+
+    def invalidate(self, obj):
+        """ Re-bake tile of object, call it when its look is changed """
+        fbo = getattr(obj, 'baked', None)
+        if fbo is not None:
+            self._invalidate(fbo)
+
+    def _mesh_changed(self, key):
+        if key in self.terrain.baked:
+            self._invalidate(self._ground[key[0]])
+
+    def _invalidate(self, fbo):
+        self._dirty.add(fbo)
+        if not self._scheduled:
+            self._scheduled = True
+            Clock.schedule_once(self.bake, 0)
+
+    def bake(self, dt=None):
+        """ Render changed tiles """
+        self._scheduled = False
+        for chunk, fbo in self._ground.iteritems():
+            if fbo in self._dirty:
+                self._render(fbo, self._origin(chunk), self._meshes[chunk])
+        for key, fbo in self._tiles.iteritems():
+            if fbo in self._dirty:
+                self._render(fbo, self._row_origin(key),
+                             [obj.widget.canvas for obj in self._objs[fbo]])
+        self._dirty.clear()
+
+    def _render(self, fbo, origin, instructions):
+        fbo.clear()
+        with fbo:
+            ClearColor(0., 0., 0., 0.)
+            ClearBuffers()
+            Translate(-origin[0], -origin[1])
+        for instruction in instructions:
+            fbo.add(instruction)
+        fbo.draw()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Offline packer of game sprites into texture atlases. Run it each time
+images in resources are changed:
+
+    python build_atlas.py
+
+All PNG images of SPRITE_DIRS are packed on pages of at most PAGE_SIZE
+pixels (resources/atlas/game-N.png) and regions of them are written to
+JSON index resources/atlas/game.json:
+
+    {"pages": ["game-0.png", ...],
+     "regions": {"hero/hero-idle-side-01.png": [page, x, y, width, height], ...}}
+
+where y is counted from the bottom of the page as in Kivy textures.
+Requires PIL (Pillow).
+"""
+import os
+import json
+from os.path import join, relpath
+from PIL import Image
+
+from resources import RESOURCES_DIR, ATLAS_DIR, ATLAS_INDEX, SPRITE_DIRS
+
+PAGE_SIZE = 2048
+PADDING = 2
+
+
+def collect_images():
+    images = []
+    for dirname in SPRITE_DIRS:
+        for root, dirs, files in os.walk(join(RESOURCES_DIR, dirname)):
+            for fname in sorted(files):
+                if fname.endswith('.png'):
+                    path = join(root, fname)
+                    key = relpath(path, RESOURCES_DIR).replace(os.sep, '/')
+                    images.append((key, Image.open(path).convert('RGBA')))
+    return images
+
+
+def pack(images):
+    """
+    Place images on pages with simple shelf algorithm, returns list of
+    pages, where each page is list of (key, image, x, y) with y counted
+    from the top
+    """
+    # the highest images first, so shelves are filled tighter
+    images = sorted(images, key=lambda item: (-item[1].size[1], item[0]))
+    pages = []
+    page = shelf_y = shelf_h = x = None
+    for key, image in images:
+        w, h = image.size
+        if w + PADDING > PAGE_SIZE or h + PADDING > PAGE_SIZE:
+            raise ValueError('Image %s is too big for atlas' % key)
+        if page is not None and x + w + PADDING > PAGE_SIZE:
+            # next shelf
+            shelf_y += shelf_h
+            shelf_h = 0
+            x = 0
+        if page is None or shelf_y + h + PADDING > PAGE_SIZE:
+            page = []
+            pages.append(page)
+            shelf_y = shelf_h = x = 0
+        page.append((key, image, x, shelf_y))
+        x += w + PADDING
+        shelf_h = max(shelf_h, h + PADDING)
+    return pages
+
+
+def page_size(page):
+    """ Get the smallest power of two size which fits all images """
+    w = max(x + image.size[0] for key, image, x, y in page)
+    h = max(y + image.size[1] for key, image, x, y in page)
+    size = [1, 1]
+    while size[0] < w:
+        size[0] *= 2
+    while size[1] < h:
+        size[1] *= 2
+    return size
+
+
+def build():
+    if not os.path.exists(ATLAS_DIR):
+        os.makedirs(ATLAS_DIR)
+    index = {'pages': [], 'regions': {}}
+    for n, page in enumerate(pack(collect_images())):
+        width, height = page_size(page)
+        canvas = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        for key, image, x, y in page:
+            canvas.paste(image, (x, y))
+            w, h = image.size
+            index['regions'][key] = [n, x, height - y - h, w, h]
+        fname = 'game-%d.png' % n
+        canvas.save(join(ATLAS_DIR, fname))
+        index['pages'].append(fname)
+        print '%s: %dx%d, %d images' % (fname, width, height, len(page))
+    with open(ATLAS_INDEX, 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    build()
@@ -1,12 +1,13 @@
 import random
 import math
-from kivy.clock import Clock
+from backend import Clock
 from physics import phy
 from gamecontext import GameContext
 from settings import HERO_SPEED, OBJECT_MASS, CHARACTER_MASS
 from landscape import Grass, Sand, Water
 from settings import BLOCK_SIZE, GAME_AREA_SIZE
 from utils.astar import AStar, SQ_MapHandler, SQ_Location
+from utils.dstarlite import DStarLite
 
 def wait_counter(func):
     " Wait counter decorator "
@@ -100,6 +101,14 @@ class BaseCharacterController(BaseController):
     
     IDLE_TIME = 15
     _fail_to_find_path = 0
+    # path planner of the character:
+    #  'astar' - fresh A* search each time,
+    #  'dstar' - incremental D* Lite search of the character,
+    #  'flowfield' - distance field shared by all characters with the same goal
+    #  'hpastar' - hierarchical search over abstract graph shared by all
+    #              characters with the same mask (for large maps)
+    #  'jps' - A* with jump point search over shared jump tables
+    PLANNER = 'flowfield'
         
     def __init__(self, *args):
 
@@ -121,6 +130,15 @@ class BaseCharacterController(BaseController):
         self.swim_mode = False
         self._prev_swim_mode = False
         self.vision = VisionVector((-1, 0), 36)
+
+        # version of the walk map and goal cell current path depends on
+        self._path_version = None
+        self._path_goal = None
+        # path finding statistics
+        self.replans = 0
+        self.replans_avoided = 0
+        self._planner = None
+        self._planner_version = 0
         
         self.vision_vectors = {'l': VisionVector((-1, 0), BLOCK_SIZE[0]),
                                'u': VisionVector((0, 1), BLOCK_SIZE[1]),
@@ -148,41 +166,59 @@ class BaseCharacterController(BaseController):
             self.swim_mode = False
         super(BaseCharacterController, self).__call__()
     
+    def get_cell(self, pos):
+        return int(pos.x) / BLOCK_SIZE[0], int(pos.y) / BLOCK_SIZE[1]
+
     def get_path_to_goal(self):
-        body = phy.Body()
-        shape = phy.Poly.create_box(body, (BLOCK_SIZE[0] / 2, BLOCK_SIZE[1] / 2))
-        game_map = []
-        dx, dy = BLOCK_SIZE[0] / 2., BLOCK_SIZE[1] / 2. 
-        for y in xrange(GAME_AREA_SIZE[1]):
-            for x in xrange(GAME_AREA_SIZE[0]):
-                body.position = x*BLOCK_SIZE[0] + dx, y*BLOCK_SIZE[1] + dy
-                shape_list = GameContext.space.shape_query(shape)
-                if not shape_list: 
-                    game_map.append(1)
-                else:
-                    rigid = 1
-                    for _s in shape_list:
-                        if hasattr(_s.body, 'data') and not isinstance(_s, (phy.Segment)) and \
-                            _s.body.data.__class__.__name__ not in self.MAY_GO_THROUGH:
-                            rigid = -1
-                            
-                    game_map.append(rigid)
+        walkmap = self.context.walkmap
+        self.replans += 1
         # define start position
         start_pos = self.obj.body.position
         start_x, start_y = int(start_pos.x) / BLOCK_SIZE[0], int(start_pos.y) / BLOCK_SIZE[1]
         start = SQ_Location(start_x, start_y)
         # define end position
-        game_map[GAME_AREA_SIZE[0]*start_y + start_x] = 1
         end_pos = self.get_goal_obj().body.position
         end_x, end_y = int(end_pos.x) / BLOCK_SIZE[0], int(end_pos.y) / BLOCK_SIZE[1]
         end = SQ_Location(end_x, end_y)
-        game_map[GAME_AREA_SIZE[0]*end_y + end_x] = 1
-        astar = AStar(SQ_MapHandler(game_map, GAME_AREA_SIZE[0], GAME_AREA_SIZE[1]))
+        if self.PLANNER == 'flowfield':
+            mask = walkmap.mask_for(self.MAY_GO_THROUGH)
+            return self.context.flowfields.get((end_x, end_y), mask).findPath(start)
+        if self.PLANNER == 'dstar':
+            return self.get_planner().findPath(start, end)
+        if self.PLANNER == 'hpastar':
+            mask = walkmap.mask_for(self.MAY_GO_THROUGH)
+            return self.context.hpagraphs.get(mask).findPath(start, end)
+        # start and end cells are always passable
+        open_cells = (walkmap.index(start_x, start_y), walkmap.index(end_x, end_y))
+        if self.PLANNER == 'jps':
+            jumps = self.context.jumpmaps.get(walkmap.mask_for(self.MAY_GO_THROUGH))
+            jumps.openCells(open_cells)
+            return AStar(jumps).findPath(start, end)
+        game_map = walkmap.view(walkmap.mask_for(self.MAY_GO_THROUGH), open_cells)
+        astar = AStar(SQ_MapHandler(game_map, walkmap.w, walkmap.h))
         return astar.findPath(start,end)
     
+    def get_planner(self):
+        """ Get incremental planner synchronized with the walk map """
+        walkmap = self.context.walkmap
+        if self._planner is None:
+            game_map = walkmap.view(walkmap.mask_for(self.MAY_GO_THROUGH))
+            self._planner = DStarLite(SQ_MapHandler(game_map, walkmap.w, walkmap.h))
+        else:
+            walkmap.flush()
+            changes = walkmap.changes_since(self._planner_version)
+            if changes is None:
+                self._planner.reset()
+            else:
+                self._planner.updateCells(changes)
+        self._planner_version = walkmap.version
+        return self._planner
+
     def load_path(self):
         self.check_points = [] # reset check point
         self.next_point = None
+        self._path_version = self.context.walkmap.version
+        self._path_goal = self.get_cell(self.get_goal_obj().body.position)
         start_pos = self.obj.body.position
         start_x, start_y = int(start_pos.x) / BLOCK_SIZE[0], int(start_pos.y) / BLOCK_SIZE[1]
         _prev_point = (start_x, start_y)
@@ -198,6 +234,38 @@ class BaseCharacterController(BaseController):
             x, y = (x + 0.5)*BLOCK_SIZE[0], (y + 0.5)*BLOCK_SIZE[1]
             self.check_points.insert(0, (d, (x, y)))
             node = self._path.get_next_node()
+
+    def invalidate_path(self):
+        self._path_version = None
+
+    def path_is_valid(self):
+        """
+        Check if rest of loaded path is still actual: goal stays in the same
+        cell and no cell on the rest of path has become rigid since path
+        was computed
+        """
+        if self._path_version is None:
+            return False
+        if not self.check_points and not self.next_point:
+            return False
+        goal = self.get_cell(self.get_goal_obj().body.position)
+        if goal != self._path_goal:
+            return False
+        walkmap = self.context.walkmap
+        walkmap.flush()
+        if walkmap.version == self._path_version:
+            return True
+        points = list(self.check_points)
+        if self.next_point:
+            points.append(self.next_point)
+        game_map = walkmap.view(walkmap.mask_for(self.MAY_GO_THROUGH),
+                                (walkmap.index(*goal),))
+        for d, (x, y) in points:
+            idx = walkmap.index(int(x) / BLOCK_SIZE[0], int(y) / BLOCK_SIZE[1])
+            if walkmap.changed_since(idx, self._path_version) and game_map[idx] == -1:
+                return False
+        self._path_version = walkmap.version
+        return True
     
     @property
     def _dir_opposite(self):
@@ -247,7 +315,7 @@ class BaseCharacterController(BaseController):
             if self.meet_something():
                 return
             self.next_point = None
-            self.switch_to_moving()
+            self.switch_to_moving(checkpoint=True)
     
     def switch_animation(self, animation, endless=False):
         #if self._state == 'SAWING':
@@ -255,17 +323,27 @@ class BaseCharacterController(BaseController):
         self.obj.set_animation(animation, True)
         self.obj.animate(endless=endless)
     
-    def switch_to_moving(self):
-        self._path = self.get_path_to_goal()
-        if not self._path:
-            self.set_state('IDLE', self.IDLE_TIME)
-            if self.swim_mode:
-                animation = 'swim_idle'
-            else:
-                animation = 'idle'
-            self.switch_animation(animation, True)
-            return
-        self.load_path()
+    def switch_to_moving(self, checkpoint=False):
+        """
+        Go to the next check point of the path, path is found again if it
+        isn't valid anymore. checkpoint is True when character has just
+        reached check point, only then kept path counts as avoided replan
+        """
+        if self.path_is_valid():
+            if checkpoint:
+                self.replans_avoided += 1
+        else:
+            self._path = self.get_path_to_goal()
+            if not self._path:
+                self.invalidate_path()
+                self.set_state('IDLE', self.IDLE_TIME)
+                if self.swim_mode:
+                    animation = 'swim_idle'
+                else:
+                    animation = 'idle'
+                self.switch_animation(animation, True)
+                return
+            self.load_path()
         
         if not self.next_point:
             if self.check_points:
@@ -394,7 +472,8 @@ class HeroRabbitController(BaseCharacterController):
         self._steps_counter += 1
         if self._steps_counter > 5:
             self._steps += 1
-            self.context.ui.toolbar.steps.text = "STEPS:%s" % self._steps
+            if self.context.ui:
+                self.context.ui.toolbar.steps.text = "STEPS:%s" % self._steps
             self._steps_counter = 0
 
     def meet_callback(self, some):
@@ -411,6 +490,9 @@ class HareController(BaseCharacterController):
     
     MAY_GO_THROUGH = ['Tree', 'Hare',]
     IDLE_TIME = 0
+    # Hare chases moving hero and replans often, D* Lite reuses its
+    # search when the goal moves
+    PLANNER = 'dstar'
     
     _sawing_steps = 0
     
@@ -474,6 +556,7 @@ class HareController(BaseCharacterController):
         pos = self._sawn_tree.body.position
         self.next_point = self._direction, (pos.x, pos.y)
         self.check_points = []
+        self.invalidate_path()
         
     @wait_counter
     def do_sawing(self):
@@ -523,6 +606,6 @@ class HareController(BaseCharacterController):
             self.switch_to_sawing()
             self.faced = False
             
-    def switch_to_moving(self):
-        super(HareController, self).switch_to_moving()
+    def switch_to_moving(self, checkpoint=False):
+        super(HareController, self).switch_to_moving(checkpoint)
             
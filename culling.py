@@ -0,0 +1,90 @@
+""" Drawing of only those parts of the scene which are visible """
+from backend import Canvas
+from gamecontext import GameContext
+from settings import BLOCK_SIZE, CULL_CHUNK, CULL_MARGIN
+
+
+def _intersects(x, y, w, h, view):
+    x0, y0, x1, y1 = view
+    return x < x1 and x + w > x0 and y < y1 and y + h > y0
+
+
+class Culler(object):
+    """
+    Keeps on game canvas only instructions which intersect visible part of
+    scene plus CULL_MARGIN pixels.
+
+    Landscape blocks are grouped in chunks of CULL_CHUNK x CULL_CHUNK
+    blocks, chunks are attached to or detached from landscape layer.
+    Canvases of objects are detached and attached back in z-order by
+    zorder (without it objects aren't culled). All objects are checked when
+    view is changed, dynamic ones - also in frames when they are moved
+    """
+
+    def __init__(self, zorder=None):
+        self.zorder = zorder
+        # canvas which holds all chunks of landscape
+        self.landscape = Canvas()
+        self.view = None
+        self.chunks = {}
+        self._attached = set()
+        self._hidden = set()
+
+    def chunk_key(self, i, j):
+        """ Get key of chunk which contains block (i, j) """
+        return i / CULL_CHUNK, j / CULL_CHUNK
+
+    def chunk(self, i, j):
+        """ Get canvas of chunk which contains block (i, j) """
+        key = self.chunk_key(i, j)
+        if key not in self.chunks:
+            self.chunks[key] = Canvas()
+            self._attach(key)
+        return self.chunks[key]
+
+    def _attach(self, key):
+        self.landscape.add(self.chunks[key])
+        self._attached.add(key)
+
+    def _detach(self, key):
+        self.landscape.remove(self.chunks[key])
+        self._attached.discard(key)
+
+    def set_view(self, view):
+        """ Set visible rectangle of scene (x0, y0, x1, y1), None if all is visible """
+        if view is not None:
+            x0, y0, x1, y1 = view
+            view = (x0 - CULL_MARGIN, y0 - CULL_MARGIN, x1 + CULL_MARGIN, y1 + CULL_MARGIN)
+        self.view = view
+        size = CULL_CHUNK * BLOCK_SIZE[0], CULL_CHUNK * BLOCK_SIZE[1]
+        for key in self.chunks:
+            visible = view is None or _intersects(key[0] * size[0], key[1] * size[1],
+                                                   size[0], size[1], view)
+            if visible and key not in self._attached:
+                self._attach(key)
+            elif not visible and key in self._attached:
+                self._detach(key)
+        self.update_objects(GameContext._objs)
+
+    def update_objects(self, objs):
+        """ Show or hide canvases of objects """
+        if self.zorder is None:
+            return
+        view = self.view
+        hidden = self._hidden
+        for obj in objs:
+            widget = getattr(obj, 'widget', None)
+            if widget is None or getattr(obj, 'baked', None):
+                continue
+            if view is None or _intersects(widget.x, widget.y, widget.width, widget.height, view):
+                if obj in hidden:
+                    hidden.discard(obj)
+                    self.zorder.show(obj)
+            elif obj not in hidden:
+                hidden.add(obj)
+                self.zorder.hide(obj)
+
+    def update_dynamic(self, objs):
+        """ Called each frame with dynamic objects which were moved """
+        if self.view is not None or self._hidden:
+            self.update_objects(objs)
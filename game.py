@@ -1,25 +1,20 @@
 from os.path import dirname, join
 import random
-from kivy.graphics import Color, Rectangle, Mesh
-from kivy.core.image import Image
-from kivy.clock import Clock
-from kivy.properties import DictProperty, ListProperty
-from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.button import Button
-from kivy.uix.label import Label
-from kivy.uix.popup import Popup
-
-from kivy.uix.widget import Widget
-from kivy.core.window import Window
 import sys
+from backend import Color, Rectangle, Clock, Widget
 from landscape import *
 from physics import phy, init_physics, StaticBox, Circle, Box, PhysicalObject
 from gamecontext import GameContext
 from gameobjects import Rock, Rock2, HeroRabbit, Hare, \
                         Mountain, Wood, Bush, Character, HolyCarrot, Tree
-from settings import BLOCK_SIZE, GAME_AREA_SIZE
+from settings import BLOCK_SIZE, GAME_AREA_SIZE, SIMULATION_FPS, RENDER_FPS, \
+                     MAX_CATCHUP_STEPS, DEFAULT_MAP, BAKE_STATICS
 from resources import read_map
-from animation import set_global_pause
+from animation import set_global_pause, ticker
+from walkmap import WalkMap, FlowFields, HPAGraphs, JumpMaps
+from culling import Culler
+from zorder import ZOrder
+from baking import Baker
 
 
 class BodyDragMgr():
@@ -44,12 +39,15 @@ class BodyDragMgr():
 
         # add Physical object as dragged to context
         GameContext.dragged[body.data].append(self)
+        body.activate()
 
     def update(self):
         #print self.touch.dx, self.touch.dy
         pos = self.controller.position.x + self.touch.dx, \
                 self.controller.position.y + self.touch.dy
         self.controller.position = pos
+        # moving of controller body doesn't wake up dragged one
+        self.controlled.activate()
 
     def release(self):
         if not self.touch.bodydragmgr:
@@ -59,6 +57,8 @@ class BodyDragMgr():
         self.controlled.angular_velocity = 0.
         self.touch.bodydragmgr = None
         GameContext.dragged[self.controlled.data].remove(self)
+        if GameContext.walkmap:
+            GameContext.walkmap.invalidate(self.controlled.data)
 
 
 class MoonRabbitGame(Widget):
@@ -71,26 +71,35 @@ class MoonRabbitGame(Widget):
     block_height = BLOCK_SIZE[1]
     game_area_size = BLOCK_SIZE[0]*GAME_AREA_SIZE[0],\
                      BLOCK_SIZE[1]*GAME_AREA_SIZE[1]
-    spf = 1 / 30.
+    spf = 1. / SIMULATION_FPS # fixed time of simulation step
 
     def __init__(self, **kwargs):
         # setup game context
         self.context = GameContext
         self.context.game = self
         #self._touches = [] # container for touches
+        self.map_file = kwargs.pop('map_file', DEFAULT_MAP)
+        self.render_fps = kwargs.pop('render_fps', RENDER_FPS)
+        # game time which is not simulated yet
+        self._accumulator = 0.
+        # number of sprites moved in the last frame and in all frames
+        self.updated_sprites = 0
+        self.total_updated_sprites = 0
         super(MoonRabbitGame, self).__init__(**kwargs)
         self.num_of_blocks_X = GAME_AREA_SIZE[0]
         self.num_of_blocks_Y = GAME_AREA_SIZE[1]
         
         self._touches = []
 
-        # create 2-dimensional array to store blocks
-        self.blocks = [[0 for j in xrange(self.num_of_blocks_Y)]
-                       for i in xrange(self.num_of_blocks_X)]
-
-        self.init_physics()
+        # map is read before physics, options of map configure it
+        map_data = read_map(self.map_file)
+        self.init_physics(map_data[0])
         #self.load_resources()
-        self.setup_scene()
+        self.zorder = ZOrder(self.canvas)
+        self.culler = Culler(self.zorder)
+        # compositing of static layers, see BAKE_STATICS
+        self.baker = None
+        self.setup_scene(map_data)
         self.create_bounds()
 
         self.space.add_collision_handler(0, 0, post_solve=self.collision_handler)
@@ -100,13 +109,14 @@ class MoonRabbitGame(Widget):
         self.folding_screen = None
         self.paused = False
         self.win = False
+        self.finished = False
         
     def start_round(self):
         self.context.ui.greeting()
     
     def start(self):
 
-        Clock.schedule_interval(self.update, self.spf)
+        Clock.schedule_interval(self.update, 1. / self.render_fps)
 
     def collision_handler(self, space, arbiter, *args, **kw):
         
@@ -117,6 +127,10 @@ class MoonRabbitGame(Widget):
 
             if isinstance(phyobj, Character):
                 phyobj.controller.handle_collision(arbiter)
+                # wake up objects which are pushed by character
+                for other in arbiter.shapes:
+                    if other.body.is_sleeping:
+                        other.body.activate()
             
             if not phyobj or not phyobj.draggable:
                 continue
@@ -127,8 +141,13 @@ class MoonRabbitGame(Widget):
                         Clock.schedule_once(lambda dt: dragmgr.release(), -1)
         return True
 
-    def init_physics(self):
-        self.space = init_physics()
+    def init_physics(self, options):
+        keys = 'iterations', 'sleep_time_threshold', 'idle_speed_threshold'
+        self.space = init_physics(**dict((key, options[key]) for key in keys if key in options))
+        self.context.walkmap = WalkMap(self.space, *GAME_AREA_SIZE)
+        self.context.flowfields = FlowFields(self.context.walkmap)
+        self.context.hpagraphs = HPAGraphs(self.context.walkmap)
+        self.context.jumpmaps = JumpMaps(self.context.walkmap)
 
     def create_bounds(self):
         """ Make bounds of the game space """
@@ -148,29 +167,22 @@ class MoonRabbitGame(Widget):
             b.elasticity = 0.5
         self.space.add(borders)
 
-    def setup_scene(self):
-        """ Create here and add to scene all game objects """
+    def setup_scene(self, map_data):
+        """ Create here and add to scene all game objects of map """
 
-        # read map
-        options, landscapes, statics, dynamics, trees, hero, hare = read_map('test.map')
+        options, landscapes, statics, dynamics, trees, hero, hare = map_data
         self.num_of_blocks_X, self.num_of_blocks_Y = options['size']
-        with self.canvas:
-            # init landscapes
-            block_x = 0
-            for i in xrange(self.num_of_blocks_X):
-                block_y = 0
-                for j in xrange(self.num_of_blocks_Y):
-                    class_name = landscapes[i][j]
-                    if class_name is not None:
-                        clazz = eval(class_name.capitalize())
-                    else:
-                        clazz = Grass
-                    block = clazz(pos=(block_x, block_y),
-                                  size=(self.block_width, self.block_height), border=(0, 0))
-                    self.blocks[i][j] = block
-                    block_y += self.block_height 
-                block_x += self.block_width
+        # init landscapes, blocks are drawn by chunks of culler
+        self.terrain = Terrain(landscapes, self.culler, (self.block_width, self.block_height))
+        self.canvas.add(self.terrain.canvas)
+        if BAKE_STATICS:
+            self.baker = Baker(self.canvas, self.culler, self.terrain, self.zorder,
+                               (self.block_width, self.block_height))
+        # objects moved to bottom are drawn just above landscape
+        self.canvas.add(self.zorder.bottom)
+        self.canvas.add(self.zorder.dynamic)
 
+        with self.canvas:
             # init dynamics
             for x, y, class_name in dynamics:
                 if 'dynamics_as_blocks' in options and options['dynamics_as_blocks']:
@@ -227,43 +239,65 @@ class MoonRabbitGame(Widget):
                 Mountain(*pos, type=type)
 
         HolyCarrot(13.5*self.block_width, 7.5*self.block_height)
-        # This should be called at the end
-        self.reindex_graphics()
+        # static objects are drawn over all others
+        self.canvas.add(self.zorder.layer)
 
     def update(self, dt):
+        """
+        Called each frame: runs as many fixed simulation steps as time
+        passed and then shows objects between the last two states
+        """
+        self._accumulator += dt
+        steps = 0
+        while self._accumulator >= self.spf and not self.finished:
+            if steps == MAX_CATCHUP_STEPS:
+                # too slow device, let the game slow down instead of
+                # spending all the time for catching up
+                self._accumulator = 0.
+                break
+            self.step()
+            self._accumulator -= self.spf
+            steps += 1
+        alpha = self._accumulator / self.spf
+        # objects at rest keep their sprites as they are
+        moved = [obj for obj in self.context.dynamic_objects if obj.render(alpha)]
+        self.culler.update_dynamic(moved)
+        ticker.update_dynamic(moved)
+        self.updated_sprites = len(moved)
+        self.total_updated_sprites += len(moved)
+
+    def step(self):
+        """ Simulate one fixed step of the game """
+        # sleeping bodies don't move, their saved states are still actual
+        objs = self.context.dynamic_objects
+        awake = set(obj for obj in objs if not obj.body.is_sleeping)
+        for obj in awake:
+            obj.save_state()
         self.context.space.step(self.spf)
-        for obj in self.context.dynamic_objects:
-            obj.update()
+        # bodies woken by collisions during the step are updated too, saved
+        # state of such body is where it fell asleep, so it's still actual
+        for obj in objs:
+            if obj in awake or not obj.body.is_sleeping:
+                obj.update()
         
         for obj in self.context.characters:
+            # characters are moved by controllers, they never sleep
+            obj.body.activate()
             obj.controller()
     
-    def reindex_graphics(self):
-        """ Update z-index of all objects on the scene.
-        """
-        for obj in self.context.static_objects:
-            self.canvas.children.remove(obj.widget.canvas)
-        # fill _objects_z_index
-        _objects_z_index = {}
-        for obj in self.context.static_objects:
-            y = obj.widget.pos[1]
-            if not y in _objects_z_index:
-                _objects_z_index[y] = []
-            _objects_z_index[y].append(obj)
-        _keys = _objects_z_index.keys()
-        _keys.sort()
-        _keys.reverse()
-        for k in _keys:
-            objs = _objects_z_index[k]
-            for obj in objs:
-                self.canvas.add(obj.widget.canvas)
-    
+    def add_static(self, obj):
+        """ Put canvas of just added static object to its layer """
+        if self.baker and obj.bakeable:
+            self.baker.add(obj)
+        else:
+            self.zorder.add(obj)
+
+    def add_dynamic(self, obj):
+        """ Put canvas of just added dynamic object to its layer """
+        self.zorder.add_dynamic(obj)
+
     def move_to_bottom(self, obj):
-        canvas = obj.widget.canvas
-        last_block = self.blocks[GAME_AREA_SIZE[0] - 1][GAME_AREA_SIZE[1] - 1]
-        block_index = self.canvas.children.index(last_block)
-        self.canvas.children.remove(canvas)
-        self.canvas.children.insert(block_index + 1, canvas)
+        self.zorder.move_to_bottom(obj)
 
     def on_touch_down(self, touch):
         
@@ -316,12 +350,16 @@ class MoonRabbitGame(Widget):
         i, j = self.get_indices_by_coord(x, y)
         if i >= self.num_of_blocks_X or j >= self.num_of_blocks_Y or x < 0 or y < 0:
             raise ValueError("Coordinates out of playground")
-        return self.blocks[i][j]
+        return self.terrain.get(i, j)
 
     def game_over(self, win=False, text=None):
         # stop timer
         self.win = win
+        self.finished = True
         Clock.unschedule(self.update)
+        if self.context.app is None:
+            # headless simulation, nothing to show
+            return
         if self.context.ui:
             self.context.ui.toolbar.disable()
         cb = self.context.app.finish_round
@@ -355,21 +393,24 @@ class MoonRabbitGame(Widget):
                     obj = shape.body.data
                     obj.color_mask.rgba = (1, 0, 0, 1) # color it to red
                     objs.append(obj)
+                    if self.baker:
+                        self.baker.invalidate(obj)
             def _rid_color_mask(objs):
                 for obj in objs:
                     obj.color_mask.rgba = 1, 1, 1, 1
+                    if self.baker:
+                        self.baker.invalidate(obj)
             Clock.schedule_once(lambda dt: _rid_color_mask(objs), 0.2)
             can_plant_tree = False
-        block = self.get_block(touch.x, touch.y)
-        if isinstance(block, Water):
-            block.set_color_mask(1, 0, 0, 1)
-            Clock.schedule_once(lambda dt: block.set_color_mask(1, 1, 1, 1), 0.2)
+        i, j = self.get_indices_by_coord(touch.x, touch.y)
+        if isinstance(self.get_block(touch.x, touch.y), Water):
+            self.terrain.set_color_mask(i, j, 1, 0, 0, 1)
+            Clock.schedule_once(lambda dt: self.terrain.set_color_mask(i, j, 1, 1, 1, 1), 0.2)
             can_plant_tree = False
         
         if can_plant_tree:
             Tree(x, y, growing=True)
             self.trees_count -= 1
-            self.reindex_graphics()
                     
         if self.context.ui:
             self.context.ui.toolbar.button_trees.disabled = False
@@ -394,7 +435,8 @@ class MoonRabbitGame(Widget):
     
     def resume(self, btn=None):
         self.paused = False
-        Clock.schedule_interval(self.update, self.spf)
+        self._accumulator = 0.
+        Clock.schedule_interval(self.update, 1. / self.render_fps)
         set_global_pause(False)
         if btn:
             btn.set_resumed()
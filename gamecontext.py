@@ -1,7 +1,6 @@
 
 from settings import BLOCK_SIZE, GAME_AREA_SIZE
-from animation import set_global_pause, reset_animations
-from resources import load_resources
+from animation import set_global_pause, ticker
 
 class _GameContext(object):
     """ Should be singletone """
@@ -18,15 +17,26 @@ class _GameContext(object):
     def __init__(self):
         self.app = None
         self.resources = {}
-        load_resources(self)
+        self.resources_loaded = False
+        self._assets = None
+        self._resource_loader = None
         self.reset()
         self.scene_width = BLOCK_SIZE[0]*GAME_AREA_SIZE[0]
         self.scene_height = BLOCK_SIZE[1]*GAME_AREA_SIZE[1]
         
     def reset(self):
-        reset_animations()
         set_global_pause(False)
+        # there is no viewport until the next round
+        ticker.set_view(None)
         self.space = None
+        self.walkmap = None
+        self.flowfields = None
+        self.hpagraphs = None
+        self.jumpmaps = None
+        # it shows texture of current resources, see Water
+        if getattr(self, 'water_animation', None):
+            self.water_animation.stop_animation()
+        self.water_animation = None
         if hasattr(self, 'dynamic_objects'):
             _objs = self.dynamic_objects
             for obj in _objs:
@@ -56,24 +66,76 @@ class _GameContext(object):
         from physics import DynamicObject, StaticObject
         from gameobjects import Character
         
-        # if object support some widget - add it to main game widget
+        # if object support some widget - add its canvas to main game widget
         if hasattr(obj, 'widget'):
-            self.game.add_widget(obj.widget)
+            self.game.canvas.add(obj.widget.canvas)
 
         self._objs.append(obj)
         if isinstance(obj, DynamicObject):
             self.dynamic_objects.append(obj)
             if obj.draggable:
                 self.dragged[obj] = []
+            if hasattr(obj, 'widget'):
+                self.game.add_dynamic(obj)
         
         if isinstance(obj, Character):
             self.characters.append(obj)
                 
         if isinstance(obj, StaticObject):
             self.static_objects.append(obj)
+            if hasattr(obj, 'widget'):
+                self.game.add_static(obj)
+
+        if self.walkmap:
+            self.walkmap.track(obj)
     
     def set_game(self, game):
         self.game = game
+
+    def load_resources(self, map_file=None, background=False):
+        """
+        Load textures and animations used by map (all of them if map_file
+        is None), resources of previous map which are not needed are
+        released. In background mode images are decoded in threads while
+        main loop keeps running, see on_resources_loaded
+        """
+        # resources are set up only when they are requested
+        import resources
+
+        if map_file is None:
+            assets = resources.all_assets()
+        else:
+            assets = resources.map_assets(resources.read_map(map_file))
+        if assets == self._assets and (self.resources_loaded or self._resource_loader):
+            return
+        if self._resource_loader:
+            # resources of other map are loading
+            self._resource_loader.cancel()
+            self._resource_loader = None
+        self._assets = assets
+        self.resources_loaded = False
+        if not background:
+            resources.load_resources(self, assets)
+            self.resources_loaded = True
+        else:
+            self._resource_loader = resources.ResourceLoader(self, assets)
+            self._resource_loader.bind(on_complete=self._set_resources_loaded)
+            self._resource_loader.start()
+
+    def _set_resources_loaded(self):
+        self._resource_loader = None
+        self.resources_loaded = True
+
+    def on_resources_loaded(self, callback, progress=None, map_file=None):
+        """
+        Load resources of map in background and call callback() when they
+        are loaded and progress(loaded, total) while they are loading
+        """
+        self.load_resources(map_file, background=True)
+        if self.resources_loaded:
+            callback()
+            return
+        self._resource_loader.bind(on_complete=callback, on_progress=progress)
     
 
 GameContext = _GameContext()
\ No newline at end of file
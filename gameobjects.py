@@ -1,17 +1,13 @@
 
 """ Here should be Game objects, based on Physical objects """
 import math
-from kivy.graphics import VertexInstruction, Rectangle, Color
-from kivy.uix.scatter import ScatterPlane
-from kivy.graphics import Rectangle, Color, Ellipse
-from kivy.clock import Clock
+from backend import Rectangle, Clock
 from physics import Circle, DynamicObject, Box, phy, StaticBox
-from animation import AnimationMixin
+from animation import AnimationMixin, flip_coords
 from gamecontext import GameContext
 from controller import HeroRabbitController, HareController
 from settings import BLOCK_SIZE, OBJECT_MASS, CHARACTER_MASS
 from random import choice
-from copy import copy
 
 
 class Rock(Circle):
@@ -83,23 +79,12 @@ class FlipMixin(object):
         flip its texture
     """
 
-    # TODO: for optimization it should be
-    # rewritten with Cython
-
     h_flipped = False
 
     def flip_h(self):
         """ Flip sprite in horizontal direction """
         self.h_flipped = not self.h_flipped
-        for obj in self.widget.canvas.children:
-            if isinstance(obj, VertexInstruction):
-                x1, x2, x3, x4, x5, x6, x7, x8 = obj.tex_coords
-                obj.tex_coords = [x3, x4, x1, x2, x7, x8, x5, x6]
-    
-    def post_redraw_hook(self):
-        if self.h_flipped:
-            self.flip_h()
-            self.h_flipped = True
+        self.sprite.tex_coords = flip_coords(self.sprite.tex_coords)
 
 
 class Character(Box, FlipMixin):
@@ -218,6 +203,8 @@ class Hare(Character, AnimationMixin):
 
 class Mountain(StaticBox):
 
+    bakeable = True
+
     mountain_texture_names = {
         'vertical': {
             'top': [
@@ -294,6 +281,9 @@ class Mountain(StaticBox):
 
 
 class Bush(StaticBox):
+
+    bakeable = True
+
     def __init__(self, *pos, **kw):
         texture = GameContext.resources['textures']['bush']
         self.body_size = [BLOCK_SIZE[0]-4,BLOCK_SIZE[1]-4]
@@ -326,12 +316,14 @@ class Tree(StaticBox, AnimationMixin):
     def __init__(self, *pos, **kw):
         growing = kw.pop('growing', False)
         texture = GameContext.resources['textures']['tree']
-        self.animations['blow'] = copy(GameContext.resources['animations']['tree_blow'])
-        self.animations['grow'] = copy(GameContext.resources['animations']['tree_grow'])
+        self.animations['blow'] = GameContext.resources['animations']['tree_blow']
+        self.animations['grow'] = GameContext.resources['animations']['tree_grow']
         super(Tree, self).__init__(pos=pos, size=texture.size, texture=texture, **kw)
         if growing:
             # rid shape from emulation
             self.space.remove(self.shape)
+            if GameContext.walkmap:
+                GameContext.walkmap.invalidate(self)
             self.start_grow()
         self._destroyed = False
             
@@ -347,11 +339,13 @@ class Tree(StaticBox, AnimationMixin):
                     return
         
         self.space.add(self.shape)
+        if GameContext.walkmap:
+            GameContext.walkmap.invalidate(self)
         self._destroyed = False
         self.set_animation('grow', True)
         self.animate()
         if GameContext.game:
-            GameContext.game.reindex_graphics()
+            GameContext.game.zorder.restore(self)
     
     def start_grow_deffered(self, dt=4):
         Clock.schedule_once(self.start_grow, dt)
@@ -361,6 +355,8 @@ class Tree(StaticBox, AnimationMixin):
         if not self._destroyed:
             self._destroyed = True
             self.space.remove(self.shape)
+            if GameContext.walkmap:
+                GameContext.walkmap.invalidate(self)
             #then set blow animation
             self.set_animation('blow', True)
             self.animation_callback = self.start_grow_deffered()
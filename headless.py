@@ -0,0 +1,336 @@
+""" Stand-ins of Kivy classes for running game logic without a window """
+import struct
+
+
+class _Event(object):
+    __slots__ = ('due', 'callback', 'interval', 'last')
+
+    def __init__(self, due, callback, interval, last):
+        self.due = due
+        self.callback = callback
+        self.interval = interval
+        self.last = last
+
+
+class ManualClock(object):
+    """
+    Clock which calls scheduled callbacks only when tick is called, so
+    game time may run as fast as CPU allows
+    """
+
+    def __init__(self):
+        self.time = 0.
+        self.frames = 0
+        self._events = []
+
+    def get_time(self):
+        return self.time
+
+    def schedule_once(self, callback, timeout=0):
+        # negative timeout means "before next frame" in Kivy
+        self._events.append(_Event(self.time + max(timeout, 0), callback, None, self.time))
+
+    def schedule_interval(self, callback, timeout):
+        self._events.append(_Event(self.time + timeout, callback, timeout, self.time))
+
+    def unschedule(self, callback):
+        self._events = [e for e in self._events if e.callback != callback]
+
+    def tick(self, dt):
+        """ Advance time by dt and call all callbacks which are due """
+        self.time += dt
+        self.frames += 1
+        now = self.time
+        for event in [e for e in self._events if e.due <= now]:
+            if event not in self._events:
+                # unscheduled by one of previous callbacks
+                continue
+            if event.interval is None:
+                self._events.remove(event)
+            else:
+                event.due += event.interval
+            elapsed = now - event.last
+            event.last = now
+            if event.callback(elapsed) is False and event.interval is not None:
+                self.unschedule(event.callback)
+
+    def reset(self):
+        self.time = 0.
+        self.frames = 0
+        self._events = []
+
+
+Clock = ManualClock()
+
+
+class Texture(object):
+
+    def __init__(self, size, uvpos=(0., 0.), uvsize=(1., 1.)):
+        self.size = tuple(size)
+        self.uvpos = uvpos
+        self.uvsize = uvsize
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    @property
+    def tex_coords(self):
+        u, v = self.uvpos
+        w, h = self.uvsize
+        return [u, v, u + w, v, u + w, v + h, u, v + h]
+
+    def get_region(self, x, y, width, height):
+        w = float(self.width) or 1.
+        h = float(self.height) or 1.
+        uvpos = (self.uvpos[0] + x / w * self.uvsize[0],
+                 self.uvpos[1] + y / h * self.uvsize[1])
+        uvsize = (width / w * self.uvsize[0], height / h * self.uvsize[1])
+        return Texture((width, height), uvpos, uvsize)
+
+    @classmethod
+    def create(cls, size=(128, 128), colorfmt='rgba', **kw):
+        return cls(size)
+
+    def blit_buffer(self, pbuffer, **kw):
+        pass
+
+    def flip_vertical(self):
+        self.uvpos = (self.uvpos[0], self.uvpos[1] + self.uvsize[1])
+        self.uvsize = (self.uvsize[0], -self.uvsize[1])
+
+
+def _image_size(filename):
+    """ Read size of PNG image from its header """
+    with open(filename, 'rb') as f:
+        header = f.read(24)
+    if header[:8] != '\x89PNG\r\n\x1a\n':
+        raise ValueError('Unsupported image: %s' % filename)
+    return struct.unpack('>II', header[16:24])
+
+
+class ImageData(object):
+
+    def __init__(self, width, height, fmt, data, flip_vertical=True, rowlength=0):
+        self.width = width
+        self.height = height
+        self.fmt = fmt
+        self.data = data
+        self.flip_vertical = flip_vertical
+        self.rowlength = rowlength
+
+
+class Image(object):
+    """ Image which knows only its size, pixels are never decoded """
+
+    def __init__(self, filename, **kw):
+        self.filename = filename
+        width, height = _image_size(filename)
+        self._data = [ImageData(width, height, 'rgba', None)]
+        self.texture = Texture((width, height))
+
+
+class ImageLoader(object):
+
+    @staticmethod
+    def load(filename, **kw):
+        return Image(filename, **kw)
+
+
+# canvas which collects instructions created in "with canvas:" block
+_current = []
+
+
+class Instruction(object):
+
+    def __init__(self, **kw):
+        self.group = kw.get('group')
+        if _current:
+            _current[-1].add(self)
+
+
+class Color(Instruction):
+
+    def __init__(self, *rgba, **kw):
+        self.rgba = list(rgba) if rgba else [1, 1, 1, 1]
+        super(Color, self).__init__(**kw)
+
+
+class VertexInstruction(Instruction):
+
+    def __init__(self, **kw):
+        self.pos = kw.get('pos', (0, 0))
+        self.size = kw.get('size', (100, 100))
+        self.texture = kw.get('texture')
+        if 'tex_coords' in kw:
+            self.tex_coords = kw['tex_coords']
+        elif self.texture is not None:
+            self.tex_coords = self.texture.tex_coords
+        else:
+            self.tex_coords = [0, 0, 1, 0, 1, 1, 0, 1]
+        super(VertexInstruction, self).__init__(**kw)
+
+
+class Rectangle(VertexInstruction):
+    pass
+
+
+class Ellipse(VertexInstruction):
+    pass
+
+
+class ClearColor(Color):
+    pass
+
+
+class ClearBuffers(Instruction):
+    pass
+
+
+class Translate(Instruction):
+
+    def __init__(self, x=0, y=0, z=0, **kw):
+        self.xy = x, y
+        super(Translate, self).__init__(**kw)
+
+
+class PushMatrix(Instruction):
+    pass
+
+
+class PopMatrix(Instruction):
+    pass
+
+
+class Rotate(Instruction):
+
+    def __init__(self, angle=0, axis=(0, 0, 1), **kw):
+        self.angle = angle
+        self.axis = axis
+        super(Rotate, self).__init__(**kw)
+
+
+class Mesh(Instruction):
+
+    def __init__(self, **kw):
+        self.vertices = list(kw.get('vertices', []))
+        self.indices = list(kw.get('indices', []))
+        self.fmt = kw.get('fmt')
+        self.mode = kw.get('mode', 'points')
+        self.texture = kw.get('texture')
+        super(Mesh, self).__init__(**kw)
+
+
+class CanvasBase(object):
+
+    def __init__(self):
+        self.children = []
+
+    def __enter__(self):
+        _current.append(self)
+        return self
+
+    def __exit__(self, *args):
+        _current.pop()
+
+    def add(self, instruction):
+        self.children.append(instruction)
+
+    def insert(self, index, instruction):
+        self.children.insert(index, instruction)
+
+    def remove(self, instruction):
+        self.children.remove(instruction)
+
+    def clear(self):
+        del self.children[:]
+
+
+class Canvas(CanvasBase):
+
+    def __init__(self):
+        super(Canvas, self).__init__()
+        self.opacity = 1.
+        self.before = CanvasBase()
+        self.after = CanvasBase()
+
+
+class Shader(object):
+
+    def __init__(self):
+        self.vs = self.fs = ''
+
+
+class RenderContext(Canvas):
+
+    def __init__(self, **kw):
+        super(RenderContext, self).__init__()
+        self.shader = Shader()
+
+
+class Fbo(RenderContext):
+
+    def __init__(self, size=(100, 100), **kw):
+        super(Fbo, self).__init__()
+        self.size = size
+        self.texture = Texture(size)
+        self.draws = 0
+
+    def draw(self):
+        self.draws += 1
+
+
+class Widget(object):
+
+    def __init__(self, **kw):
+        self.canvas = Canvas()
+        self.children = []
+        self.parent = None
+        self.pos = tuple(kw.pop('pos', (0, 0)))
+        self.size = tuple(kw.pop('size', (100, 100)))
+
+    @property
+    def x(self):
+        return self.pos[0]
+
+    @property
+    def y(self):
+        return self.pos[1]
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def _get_center(self):
+        return (self.pos[0] + self.size[0] / 2., self.pos[1] + self.size[1] / 2.)
+
+    def _set_center(self, center):
+        self.pos = (center[0] - self.size[0] / 2., center[1] - self.size[1] / 2.)
+
+    center = property(_get_center, _set_center)
+
+    def add_widget(self, widget):
+        # as in Kivy, canvas of the new child is drawn over others
+        widget.parent = self
+        self.children.insert(0, widget)
+        self.canvas.add(widget.canvas)
+
+    def remove_widget(self, widget):
+        if widget in self.children:
+            self.children.remove(widget)
+            self.canvas.remove(widget.canvas)
+            widget.parent = None
+
+    def bind(self, **kw):
+        pass
+
+    def unbind(self, **kw):
+        pass
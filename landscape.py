@@ -1,64 +1,179 @@
-from kivy.graphics import Color, Rectangle
-from kivy.core.image import Image
-from kivy.graphics.fbo import Fbo
+from array import array
+
+from backend import Rectangle, Fbo, Mesh, RenderContext
 from gamecontext import GameContext
 from animation import AnimationMixin
 from settings import BLOCK_SIZE
 
 
 class WaterAnimation(AnimationMixin):
-    
+
     class DummyWidget(object):
         pass
-    
+
     def __init__(self):
-        self.widget = self.DummyWidget() 
-        self.widget.canvas = Fbo(size=BLOCK_SIZE, clear_color=(0., 0., 0., 0.))  
+        self.widget = self.DummyWidget()
+        self.widget.canvas = Fbo(size=BLOCK_SIZE, clear_color=(0., 0., 0., 0.))
         self.texture = GameContext.resources['textures']['water']
         self.set_animation(GameContext.resources['animations']['water'])
         with self.widget.canvas:
-            Rectangle(pos=(0, 0), size=BLOCK_SIZE, texture=self.texture)
+            self.sprite = Rectangle(pos=(0, 0), size=BLOCK_SIZE, texture=self.texture)
 
-class Landscape(Rectangle):
+    def bbox(self):
+        # texture is shown by all water blocks
+        return None
+
+
+class Landscape(object):
+    """
+    Type of block of game area. There is only one instance of each type
+    (see TERRAIN), blocks themselves are just codes in Terrain
+    """
     velocity_coefficient = 1.0
-    
-    def __init__(self, *args, **kw):
-        self.color_mask = Color(1, 1, 1, 1)
-        super(Landscape, self).__init__(*args, **kw)
-        
-    def set_color_mask(self, *rgba):
-        self.color_mask.rgba = rgba
+    texture_name = None
+    animated = False
 
+    def get_texture(self):
+        if self.texture_name is None:
+            return None
+        return GameContext.resources['textures'][self.texture_name]
 
-class Grass(Landscape):
 
-    def __init__(self, *args, **kw):
-        kw['texture'] = GameContext.resources['textures']['grass']
-        super(Grass, self).__init__(*args, **kw)
+class Grass(Landscape):
+    texture_name = 'grass'
 
 
 class Water(Landscape):
-    _animation = None
     velocity_coefficient = 1.5
+    animated = True
 
-    def __init__(self, *args, **kw):
-        if not Water._animation:
-            Water._animation = WaterAnimation()
-            Water._animation.animate(endless=True)
-        kw['texture'] = self._animation.widget.canvas.texture
-        super(Water, self).__init__(*args, **kw)
+    def get_texture(self):
+        # animation is shared by all water blocks of round
+        if not GameContext.water_animation:
+            GameContext.water_animation = WaterAnimation()
+            GameContext.water_animation.animate(endless=True)
+        return GameContext.water_animation.widget.canvas.texture
 
 
 class Sand(Landscape):
     velocity_coefficient = 0.5
-    def __init__(self, *args, **kw):
-        kw['texture'] = GameContext.resources['textures']['sand']
-        super(Sand, self).__init__(*args, **kw)
+    texture_name = 'sand'
+
 
-    
 class Hole(Landscape):
     velocity_coefficient = 0.0
 
 
 class Carrot(Landscape):
     velocity_coefficient = 0.0
+
+
+# code of block type is its index
+TERRAIN = [Grass(), Water(), Sand(), Hole(), Carrot()]
+TERRAIN_CODES = dict((block.__class__.__name__.lower(), code)
+                     for code, block in enumerate(TERRAIN))
+
+
+# default shader of Kivy with color of each vertex
+VERTEX_SHADER = """
+$HEADER$
+attribute vec4 vColor;
+
+void main(void) {
+    frag_color = vColor * color * vec4(1., 1., 1., opacity);
+    tex_coord0 = vTexCoords0;
+    gl_Position = projection_mat * modelview_mat * vec4(vPosition.xy, 0., 1.);
+}
+"""
+
+FRAGMENT_SHADER = """
+$HEADER$
+
+void main(void) {
+    gl_FragColor = frag_color * texture2D(texture0, tex_coord0);
+}
+"""
+
+
+class Terrain(object):
+    """
+    Landscape of game area: 2d array of block codes, drawn by meshes. Each
+    chunk of culler has one mesh per type of block which is there, color
+    mask of block is a color of its vertices
+    """
+
+    FMT = [('vPosition', 2, 'float'), ('vTexCoords0', 2, 'float'), ('vColor', 4, 'float')]
+    VERTEX_SIZE = 8
+
+    def __init__(self, landscapes, culler, block_size=BLOCK_SIZE):
+        """ landscapes is 2d array of names of block types, None is grass """
+        self.num_X, self.num_Y = len(landscapes), len(landscapes[0])
+        self.block_size = block_size
+        self.codes = array('B', [TERRAIN_CODES[name or 'grass']
+                                 for column in landscapes for name in column])
+        self.canvas = RenderContext(use_parent_projection=True, use_parent_modelview=True)
+        self.canvas.shader.vs = VERTEX_SHADER
+        self.canvas.shader.fs = FRAGMENT_SHADER
+        self.canvas.add(culler.landscape)
+        # (chunk, code): mesh and its vertices
+        self._meshes = {}
+        self._vertices = {}
+        # index of block: (chunk, code) of its mesh and offset of its vertices
+        self._cells = [None] * len(self.codes)
+        # keys of meshes which are rendered to Fbo (see baking)
+        self.baked = set()
+        # called with key of mesh when its vertices are changed
+        self.on_change = None
+        self._build(culler)
+
+    def _build(self, culler):
+        w, h = self.block_size
+        # resources of map have textures only of its block types
+        codes = set(self.codes)
+        textures = [block.get_texture() if code in codes else None
+                    for code, block in enumerate(TERRAIN)]
+        tex_coords = [t.tex_coords if t is not None else (0, 0, 1, 0, 1, 1, 0, 1)
+                      for t in textures]
+        # first block of each mesh, it defines chunk of culler
+        first = {}
+        for i in xrange(self.num_X):
+            for j in xrange(self.num_Y):
+                index = i * self.num_Y + j
+                code = self.codes[index]
+                key = culler.chunk_key(i, j), code
+                first.setdefault(key, (i, j))
+                vertices = self._vertices.setdefault(key, [])
+                self._cells[index] = key, len(vertices)
+                u = tex_coords[code]
+                x, y = i * w, j * h
+                vertices.extend((x, y, u[0], u[1], 1., 1., 1., 1.,
+                                 x + w, y, u[2], u[3], 1., 1., 1., 1.,
+                                 x + w, y + h, u[4], u[5], 1., 1., 1., 1.,
+                                 x, y + h, u[6], u[7], 1., 1., 1., 1.))
+        for key, vertices in self._vertices.iteritems():
+            indices = []
+            for n in xrange(0, len(vertices) / self.VERTEX_SIZE, 4):
+                indices.extend((n, n + 1, n + 2, n + 2, n + 3, n))
+            with culler.chunk(*first[key]):
+                self._meshes[key] = Mesh(vertices=vertices, indices=indices, fmt=self.FMT,
+                                         mode='triangles', texture=textures[key[1]])
+
+    def static_meshes(self):
+        """ Get (key, mesh) of meshes with textures which are never changed """
+        return [(key, mesh) for key, mesh in self._meshes.iteritems()
+                if not TERRAIN[key[1]].animated]
+
+    def get(self, i, j):
+        """ Get type of block (i, j) """
+        return TERRAIN[self.codes[i * self.num_Y + j]]
+
+    def set_color_mask(self, i, j, *rgba):
+        key, offset = self._cells[i * self.num_Y + j]
+        vertices = self._vertices[key]
+        for n in xrange(4):
+            start = offset + n * self.VERTEX_SIZE + 4
+            vertices[start:start + 4] = rgba
+        # mesh is updated on assignment only
+        self._meshes[key].vertices = vertices
+        if self.on_change is not None:
+            self.on_change(key)
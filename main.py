@@ -14,11 +14,9 @@ from kivy.uix.widget import Widget
 from kivy.core.window import Window
 from kivy.lang import Builder
 from kivy.graphics import Rectangle, Color
-from viewport import Viewport
-from game import MoonRabbitGame
 from gamecontext import GameContext
 from ui import UI, Menu, Loader, WinPicture, LosePicture 
-from settings import BLOCK_SIZE, GAME_AREA_SIZE
+from settings import BLOCK_SIZE, GAME_AREA_SIZE, DEFAULT_MAP
 from msgbox import MsgBox
 
 
@@ -104,22 +102,28 @@ class MoonRabbitApp(App):
         self.context.loader = loader
         self.root.add_widget(loader)
         def _launch_game_round(dt=None):
+            # game modules are imported here to not slow down start of app
+            from viewport import Viewport
+            from game import MoonRabbitGame
+
             width = BLOCK_SIZE[0]*GAME_AREA_SIZE[0]
             height = BLOCK_SIZE[1]*GAME_AREA_SIZE[1]
             game_scene = Viewport(width=width, height=height)
-            game = MoonRabbitGame()
+            game = MoonRabbitGame(map_file=DEFAULT_MAP)
             game_scene.add_widget(game)
             self.context.scene = game_scene
             Clock.schedule_once(game_scene.fit_to_window, -1)
-            
-        Clock.schedule_once(_launch_game_round, 0.5)
-        
-        def _emulate_loader(dt=None):
-            loader.set_progress(loader.percents + 20)
-            if loader.percents != 100:
-                Clock.schedule_once(_emulate_loader, 0.1)
-        
-        _emulate_loader()
+            loader.set_progress(100)
+
+        def _on_progress(loaded, total):
+            # the rest is left for building of game round
+            loader.set_progress(90 * loaded / total)
+
+        def _on_loaded():
+            # let loader show the last progress before heavy round setup
+            Clock.schedule_once(_launch_game_round, 0)
+
+        self.context.on_resources_loaded(_on_loaded, _on_progress, DEFAULT_MAP)
 
     def on_pause(self):
         return True
@@ -15,7 +15,8 @@ from kivy.properties import ListProperty, NumericProperty, StringProperty,\
 from kivy.uix.button import Button
 
 
-Builder.load_string('''
+# rules are loaded with the first message box, see load_rules
+RULES = '''
 #place kivy notation of app here
 
 <MsgBox_Separator>:
@@ -38,7 +39,15 @@ Builder.load_string('''
 <MsgBox_ButtonsBar>:
     size_hint: 1, None
     size: 0, '60dp'
-''')
+'''
+_rules_loaded = False
+
+
+def load_rules():
+    global _rules_loaded
+    if not _rules_loaded:
+        Builder.load_string(RULES)
+        _rules_loaded = True
 
 
 class MsgBox(ModalView):
@@ -93,6 +102,7 @@ class MsgBox(ModalView):
 
         kw.setdefault('size_hint', (0.5, 0.5))
         kw.setdefault('autodismiss', False)
+        load_rules()
         super(MsgBox, self).__init__(*args, **kw)
         self.canvas.clear()
         self.build_layout()
@@ -2,12 +2,10 @@
 import math
 import sys
 
-from kivy.utils import platform
-from kivy.uix.widget import Widget
-from kivy.uix.scatter import ScatterPlane
-from kivy.graphics import Rectangle, Color, Ellipse
-from kivy.clock import Clock
+from backend import Rectangle, Color, Ellipse
 from gamecontext import GameContext
+from sprite import Sprite
+from settings import SLEEP_TIME_THRESHOLD, IDLE_SPEED_THRESHOLD
 
 #if platform() in ('ios', 'android'):
 if sys.platform in ('win32', ): 
@@ -32,6 +30,12 @@ def init_physics(**kw):
     space.gravity = kw.pop('gravity', (0, 0))
     space.collision_slop = kw.pop('collision_slop', 0.5)
     space.damping = 0.0005
+    # bodies which are at rest for sleep_time_threshold seconds are not
+    # simulated until something touches them, None disables sleeping
+    sleep_time = kw.pop('sleep_time_threshold', SLEEP_TIME_THRESHOLD)
+    if sleep_time is not None:
+        space.sleep_time_threshold = sleep_time
+        space.idle_speed_threshold = kw.pop('idle_speed_threshold', IDLE_SPEED_THRESHOLD)
     return space
 
 
@@ -49,6 +53,8 @@ class PhysicalObject(object):
         self.friction = kw.pop('friction', 1.0)
         self.draggable = kw.pop('draggable', False)
         self._shapes = []
+        # instruction which shows texture of object
+        self.sprite = None
         self.body = self.body_factory()
         self.widget = self.widget_factory()
         with self.widget.canvas.before:
@@ -85,7 +91,11 @@ class PhysicalObject(object):
         self._shapes = val
     
     def widget_factory(self):
-        return Widget()
+        """
+        Create widget of object, it's Sprite (not Kivy widget), instruction
+        which shows texture should be kept in self.sprite
+        """
+        return Sprite()
     
     def body_factory(self):
         raise NotImplemented
@@ -101,6 +111,9 @@ class PhysicalObject(object):
 
 class StaticObject(PhysicalObject):
     
+    bakeable = False # object is never animated, so it may be baked (see baking)
+    baked = None # Fbo tile where object is baked
+
     def body_factory(self):
         # create static body
         return phy.Body()
@@ -124,13 +137,41 @@ class DynamicObject(PhysicalObject):
         self.moment = moment # define moment of inertia(inertia for rotation)
         self.pos = pos
         self.angular_velocity_limit = kw.pop('angular_velocity_limit', None)
+        # (x, y, angle) shown by widget
+        self._shown = None
         super(DynamicObject, self).__init__(**kw)
+        self.save_state()
+
+    def save_state(self):
+        """ Remember state of body before the next simulation step """
+        pos = self.body.position
+        self._prev_state = pos.x, pos.y, self.body.angle
 
     def update(self):
-        new_pos = self.body.position.x, self.body.position.y
-        self.widget.center = new_pos
-        if hasattr(self.widget, 'rotation'):
-            self.widget.rotation = math.degrees(self.body.angle)
+        """ Called after each simulation step """
+        if GameContext.walkmap:
+            GameContext.walkmap.track(self)
+
+    def render(self, alpha=1.):
+        """
+        Move widget to the state between the last two simulation steps,
+        alpha is the part of step passed since the last one. Widget is
+        changed only if this state differs from shown one, returns True then
+        """
+        if self.body.is_sleeping:
+            # body is at rest in its current state
+            alpha = 1.
+        pos = self.body.position
+        x, y, angle = self._prev_state
+        state = (x + (pos.x - x)*alpha, y + (pos.y - y)*alpha,
+                 angle + (self.body.angle - angle)*alpha)
+        if state == self._shown:
+            return False
+        self._shown = state
+        self.widget.center = state[:2]
+        if self.widget.rotatable:
+            self.widget.rotation = math.degrees(state[2])
+        return True
 
 
 class StaticBox(StaticObject):
@@ -139,14 +180,14 @@ class StaticBox(StaticObject):
         self.shape = phy.Poly.create_box(self.body, self.size)
   
     def widget_factory(self):
-        widget = Widget(size=self.size)
+        widget = Sprite(size=self.size)
         widget.center = self.pos
         with widget.canvas:
             if self.texture:
-                Rectangle(pos=widget.pos, texture=self.texture, size=self.size)
+                self.sprite = Rectangle(pos=widget.pos, texture=self.texture, size=self.size)
             else:
                 Color(0, 1, 0, 1)
-                Rectangle(pos=widget.pos, size=self.size)
+                self.sprite = Rectangle(pos=widget.pos, size=self.size)
         return widget
     
     def __init__(self, pos=(0, 0), size=(100, 100), **kw):
@@ -167,14 +208,14 @@ class Circle(DynamicObject):
         self.shape = phy.Circle(self.body, self.radius)
         
     def widget_factory(self):
-        widget = ScatterPlane(size=self.size)
+        widget = Sprite(size=self.size, rotatable=True)
         widget.center = self.pos
         with widget.canvas:
             if not self.texture:
                 Color(1, 0, 1, 1)
-                Ellipse(pos=(0, 0), size=self.size)
+                self.sprite = Ellipse(pos=(0, 0), size=self.size)
             else:
-                Ellipse(pos=(0, 0), texture=self.texture, size=self.size)
+                self.sprite = Ellipse(pos=(0, 0), texture=self.texture, size=self.size)
         return widget
 
 
@@ -189,14 +230,14 @@ class Box(DynamicObject):
         self.shape = phy.Poly.create_box(self.body, self.size)
   
     def widget_factory(self):
-        widget = ScatterPlane(size=self.size)
+        widget = Sprite(size=self.size, rotatable=True)
         widget.center = self.pos
         with widget.canvas:
             if self.texture:
-                Rectangle(pos=(0, 0), texture=self.texture, size=self.size)
+                self.sprite = Rectangle(pos=(0, 0), texture=self.texture, size=self.size)
             else:
                 Color(0, 0, 1, 1)
-                Rectangle(pos=(0, 0), size=self.size)
+                self.sprite = Rectangle(pos=(0, 0), size=self.size)
         return widget
         
     
@@ -0,0 +1,197 @@
+"""
+On-disk cache of decoded images. Pixels of each image are stored as raw
+buffer in cache directory, so on the next launch they are memory mapped
+and blitted to texture without decoding of PNG:
+
+    <cache dir>/index.json - {path: {"mtime", "size", "digest", "width",
+                                     "height", "fmt", "flip", "rowlength"}}
+    <cache dir>/<digest>.raw - pixels of image
+
+Files are identified by SHA-1 of their content: if mtime or size of file
+is changed, digest is recalculated and image is decoded again only when
+content is changed too. Files with the same content share one entry, see
+canonical.
+"""
+import os
+import mmap
+import json
+import hashlib
+import threading
+from os.path import join, exists
+
+from backend import ImageLoader, Texture
+
+
+class PixelData(object):
+    """
+    Decoded pixels of image, data is string or mmap. Rows of pixels may be
+    padded, rowlength is their length in pixels then (0 - no padding).
+    If image couldn't be decoded to pixels, only its filename is known
+    """
+
+    def __init__(self, width, height, fmt, data, flip=False, rowlength=0, filename=None):
+        self.width = width
+        self.height = height
+        self.fmt = fmt
+        self.data = data
+        self.flip = flip
+        self.rowlength = rowlength
+        self.filename = filename
+
+
+def _digest(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _decode(filename):
+    # loader has no public accessor of its ImageData, only of texture
+    # which can't be made out of main thread
+    data = getattr(ImageLoader.load(filename), '_data', None)
+    if not data:
+        # Kivy without _data, image isn't cached and is loaded by make_texture
+        return PixelData(0, 0, None, None, filename=filename)
+    data = data[0]
+    return PixelData(data.width, data.height, data.fmt, data.data,
+                     getattr(data, 'flip_vertical', True), getattr(data, 'rowlength', 0))
+
+
+def make_texture(pixels):
+    """ Create texture from decoded pixels (on main thread only) """
+    if pixels.filename is not None:
+        return ImageLoader.load(pixels.filename).texture
+    texture = Texture.create(size=(pixels.width, pixels.height), colorfmt=pixels.fmt)
+    if pixels.data is not None:
+        kw = dict(colorfmt=pixels.fmt, bufferfmt='ubyte', rowlength=pixels.rowlength)
+        try:
+            texture.blit_buffer(pixels.data, **kw)
+        except (TypeError, ValueError):
+            # Kivy build which doesn't accept mmap as buffer
+            texture.blit_buffer(pixels.data[:], **kw)
+    if pixels.flip:
+        texture.flip_vertical()
+    return texture
+
+
+# fields of index entry which describe pixels
+PIXEL_KEYS = 'width', 'height', 'fmt', 'flip', 'rowlength'
+
+
+class PixelCache(object):
+    """
+    Cache of decoded images with paths relative to root directory. It may
+    be used from several threads. If cache directory isn't writable,
+    images are just decoded
+    """
+
+    INDEX = 'index.json'
+
+    def __init__(self, root, directory):
+        self.root = root
+        self.directory = directory
+        self._index = None
+        # digest: path of the first file with such content
+        self._canonical = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        try:
+            with open(join(self.directory, self.INDEX)) as f:
+                self._index = json.load(f)
+        except (IOError, ValueError):
+            pass
+        for path in sorted(self._index):
+            self._canonical.setdefault(self._index[path]['digest'], path)
+
+    def _entry(self, path):
+        """ Get actual index entry of file, digest is calculated if file was changed """
+        with self._lock:
+            self._load_index()
+            filename = join(self.root, path)
+            stat = os.stat(filename)
+            entry = self._index.get(path)
+            if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                return entry
+            digest = _digest(filename)
+            if not entry or entry['digest'] != digest:
+                entry = {'digest': digest}
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            self._index[path] = entry
+            self._canonical.setdefault(digest, path)
+            self._dirty = True
+            return entry
+
+    def canonical(self, path):
+        """ Get path of the first known file which has the same content """
+        digest = self._entry(path)['digest']
+        with self._lock:
+            canonical = self._canonical[digest]
+            if self._index[canonical]['digest'] != digest:
+                # content of that file was changed
+                canonical = self._canonical[digest] = path
+            return canonical
+
+    def load(self, path):
+        """ Get PixelData of image, it is decoded only if it isn't in cache """
+        entry = self._entry(path)
+        raw = join(self.directory, entry['digest'] + '.raw')
+        with self._lock:
+            same = self._index.get(self._canonical[entry['digest']])
+            if ('rowlength' not in entry and same.get('digest') == entry['digest'] and
+                    'rowlength' in same):
+                # file with the same content is already decoded
+                entry.update((key, same[key]) for key in PIXEL_KEYS)
+        # entries of older versions without rowlength are decoded again
+        if 'rowlength' in entry and exists(raw):
+            with open(raw, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    data = ''
+            return PixelData(entry['width'], entry['height'], entry['fmt'], data,
+                             entry['flip'], entry['rowlength'])
+        pixels = _decode(join(self.root, path))
+        if pixels.data is not None and self._store(raw, pixels.data):
+            with self._lock:
+                fields = [(key, getattr(pixels, key)) for key in PIXEL_KEYS]
+                entry.update(fields)
+                # other files with the same content look for them there
+                if same.get('digest') == entry['digest']:
+                    same.update(fields)
+                self._dirty = True
+        return pixels
+
+    def _makedirs(self):
+        if not exists(self.directory):
+            os.makedirs(self.directory)
+
+    def _store(self, raw, data):
+        try:
+            self._makedirs()
+            # file is renamed to be never read half written
+            tmp = '%s.%d' % (raw, threading.current_thread().ident)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.rename(tmp, raw)
+            return True
+        except (IOError, OSError):
+            return False
+
+    def flush(self):
+        """ Write index of cache if it was changed """
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                self._makedirs()
+                tmp = join(self.directory, self.INDEX + '.tmp')
+                with open(tmp, 'w') as f:
+                    json.dump(self._index, f)
+                os.rename(tmp, join(self.directory, self.INDEX))
+                self._dirty = False
+            except (IOError, OSError):
+                pass
@@ -1,18 +1,214 @@
-
-from kivy.core.image import Image
-#from gamecontext import GameContext
-from animation import SimpleAnimation, ReverseAnimation, ReturningAnimation
-from os.path import join, dirname
-from settings import BLOCK_SIZE, GAME_AREA_SIZE
-from copy import copy
+import os
 import json
+import Queue
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from backend import Clock
+from pixelcache import PixelCache, make_texture
+from animation import SimpleAnimation, ReverseAnimation, ReturningAnimation
+from os.path import join, dirname, exists, relpath
+from settings import BLOCK_SIZE, GAME_AREA_SIZE, TEXTURE_BUDGET
 
 RESOURCES_DIR = 'resources'
+# atlases built with build_atlas.py
+ATLAS_DIR = join(RESOURCES_DIR, 'atlas')
+ATLAS_INDEX = join(ATLAS_DIR, 'game.json')
+# decoded images, see pixelcache
+PIXEL_CACHE_DIR = join(RESOURCES_DIR, '.pixels')
+
+# directories with sprites of the game scene
+SPRITE_DIRS = ['grass', 'terrain', 'one-cell-snags', 'tree', 'hero', 'hare',
+               'mountains', 'holy-carrot']
+
+# pages and regions of loaded atlas, see load_atlas
+_atlas = None
+# size in bytes of images loaded with load_image, used by memory_report
+_image_sizes = {}
+
+
+def _frames(pattern, numbers):
+    return [pattern.format(i) for i in numbers]
+
+def _flipped(path):
+    """ Frame which shows horizontally flipped image """
+    return (path, True)
+
+def _mirrored(path):
+    """ Frames of run animation which shows image and its mirror """
+    return [path, _flipped(path)]
+
+BLOCK_REGION = (0, 0, BLOCK_SIZE[0], BLOCK_SIZE[1])
+
+# key: (path of image, region of image or None)
+TEXTURES = {
+    'grass': ('grass/grass-01.png', BLOCK_REGION),
+    'water': ('terrain/water-01.png', BLOCK_REGION),
+    'sand': ('terrain/sand-01.png', BLOCK_REGION),
+    'rock': ('one-cell-snags/stone-01.png', None),
+    'rock2': ('one-cell-snags/stone-02.png', None),
+    'wood': ('one-cell-snags/log-01.png', None),
+    'bush': ('one-cell-snags/bush-01.png', None),
+    'tree': ('tree/tree-01.png', None),
+    'rabbit_hero': ('hero/hero-idle-side-01.png', None),
+    'hare': ('hare/hare-idle-side-01.png', None),
+    'mountain_horizontal_bottom1': ('mountains/mountain-horizontal-bottom-01.png', None),
+    'mountain_horizontal_bottom2': ('mountains/mountain-horizontal-bottom-02.png', None),
+    'mountain_horizontal_bottom3': ('mountains/mountain-horizontal-bottom-03.png', None),
+    'mountain_horizontal_top1': ('mountains/mountain-horizontal-top-01.png', None),
+    'mountain_horizontal_top2': ('mountains/mountain-horizontal-top-02.png', None),
+    'mountain_horizontal_top3': ('mountains/mountain-horizontal-top-03.png', None),
+    'mountain_horizontal_left_end_top': ('mountains/mountain-horizontal-left-end-top-01.png', None),
+    'mountain_horizontal_left_end_bottom': ('mountains/mountain-horizontal-left-end-bottom-01.png', None),
+    'mountain_horizontal_right_end_top': ('mountains/mountain-horizontal-right-end-top-01.png', None),
+    'mountain_horizontal_right_end_bottom': ('mountains/mountain-horizontal-right-end-bottom-01.png', None),
+    'mountain_vertical1': ('mountains/mountain-vertical-01.png', None),
+    'mountain_vertical2': ('mountains/mountain-vertical-02.png', None),
+    'mountain_vertical_top_start': ('mountains/mountain-vertical-top-start-01.png', None),
+    'mountain_vertical_top_end': ('mountains/mountain-vertical-top-end-01.png', None),
+    'mountain_vertical_bottom_start': ('mountains/mountain-vertical-down-start-01.png', None),
+    'mountain_vertical_bottom_end': ('mountains/mountain-vertical-down-end-01.png', None),
+    'mountain_central': ('mountains/mountain-center-center-01.png', None),
+    'mountain_central_top': ('mountains/mountain-center-top-01.png', None),
+    'holy_carrot': ('holy-carrot/holy-carrot-01.png', None),
+    'toolbar_bg': ('interface/background.png', None),
+}
+
+# key: (animation class, time of each frame in seconds, frames), where
+# frame is path of image or _flipped(path)
+ANIMATIONS = {
+    'tree_blow': (SimpleAnimation, 0.25,
+                  _frames('tree/tree-blow-0{}.png', xrange(1, 5)) + ['tree/tree-place-01.png']),
+    'tree_grow': (SimpleAnimation, 1.25,
+                  _frames('tree/tree-grow-0{}.png', xrange(1, 5)) + [TEXTURES['tree'][0]]),
+    'holy_carrot': (ReturningAnimation, 0.25, _frames('holy-carrot/holy-carrot-0{}.png', [3, 1, 2])),
+    'water': (SimpleAnimation, 0.2, _frames('terrain/water-0{}.png', xrange(1, 6))),
+
+    # hero
+    'hero_run_down': (SimpleAnimation, 0.1, _mirrored('hero/hero-run-down-01.png')),
+    'hero_run_up': (SimpleAnimation, 0.1, _mirrored('hero/hero-run-up-01.png')),
+    'hero_idle': (SimpleAnimation, 0.25, _frames('hero/hero-idle-side-0{}.png', xrange(1, 3))),
+    'hero_rotate_top': (SimpleAnimation, 0.25,
+                        _frames('hero/hero-rotate-top-and-side-0{}.png', xrange(1, 3))),
+    'hero_rotate_top_r': (ReverseAnimation, 0.25,
+                          _frames('hero/hero-rotate-top-and-side-0{}.png', xrange(1, 3))),
+    'hero_rotate_down': (SimpleAnimation, 0.25, _frames('hero/hero-rotate-down-0{}.png', xrange(1, 3))),
+    'hero_rotate_down_r': (ReverseAnimation, 0.25, _frames('hero/hero-rotate-down-0{}.png', xrange(1, 3))),
+    'hero_run': (SimpleAnimation, 0.25, _frames('hero/hero-run-side-0{}.png', xrange(1, 10))),
+    'hero_swim_idle': (SimpleAnimation, 0.25, _frames('hero/hero-swim-idle-side-0{}.png', xrange(1, 3))),
+    'hero_swim': (SimpleAnimation, 0.25, _frames('hero/hero-swim-run-side-0{}.png', xrange(1, 3))),
+    'hero_swim_down': (SimpleAnimation, 0.1, _mirrored('hero/hero-swim-run-down-01.png')),
+    'hero_swim_up': (SimpleAnimation, 0.1, _mirrored('hero/hero-swim-run-up-01.png')),
+    'hero_swim_rotate_top': (SimpleAnimation, 0.25,
+                             _frames('hero/hero-swim-rotate-top-0{}.png', xrange(1, 3))),
+    'hero_swim_rotate_top_r': (ReverseAnimation, 0.25,
+                               _frames('hero/hero-swim-rotate-top-0{}.png', xrange(1, 3))),
+    'hero_swim_rotate_down': (SimpleAnimation, 0.25,
+                              _frames('hero/hero-swim-rotate-down-0{}.png', xrange(1, 3))),
+    'hero_swim_rotate_down_r': (ReverseAnimation, 0.25,
+                                _frames('hero/hero-swim-rotate-down-0{}.png', xrange(1, 3))),
+
+    # hare
+    'hare_run_down': (SimpleAnimation, 0.1, _mirrored('hare/hare-run-down-01.png')),
+    'hare_run_up': (SimpleAnimation, 0.1, _mirrored('hare/hare-run-up-01.png')),
+    'hare_idle': (SimpleAnimation, 0.25, _frames('hare/hare-idle-side-0{}.png', xrange(1, 3))),
+    'hare_rotate_top': (SimpleAnimation, 0.25,
+                        _frames('hare/hare-rotate-top-and-side-0{}.png', xrange(1, 3))),
+    'hare_rotate_top_r': (ReverseAnimation, 0.25,
+                          _frames('hare/hare-rotate-top-and-side-0{}.png', xrange(1, 3))),
+    'hare_rotate_down': (SimpleAnimation, 0.25, _frames('hare/hare-rotate-down-0{}.png', xrange(1, 3))),
+    'hare_rotate_down_r': (ReverseAnimation, 0.25, _frames('hare/hare-rotate-down-0{}.png', xrange(1, 3))),
+    'hare_run': (SimpleAnimation, 0.25, _frames('hare/hare-run-side-0{}.png', xrange(1, 9))),
+    'hare_swim_idle': (SimpleAnimation, 0.25, _frames('hare/hare-swim-idle-side-0{}.png', xrange(1, 3))),
+    'hare_swim': (SimpleAnimation, 0.25, _frames('hare/hare-swim-run-side-0{}.png', xrange(1, 3))),
+    'hare_swim_down': (SimpleAnimation, 0.25, _mirrored('hare/hare-swim-run-down-01.png')),
+    'hare_swim_up': (SimpleAnimation, 0.25, _mirrored('hare/hare-swim-rotate-02.png')),
+    'hare_swim_rotate_top': (SimpleAnimation, 0.25, _frames('hare/hare-swim-rotate-0{}.png', xrange(1, 3))),
+    'hare_swim_rotate_top_r': (ReverseAnimation, 0.25,
+                               _frames('hare/hare-swim-rotate-0{}.png', xrange(1, 3))),
+    'hare_swim_rotate_down': (SimpleAnimation, 0.25,
+                              _frames('hare/hare-swim-rotate-down-0{}.png', xrange(1, 3))),
+    'hare_swim_rotate_down_r': (ReverseAnimation, 0.25,
+                                _frames('hare/hare-swim-rotate-down-0{}.png', xrange(1, 3))),
+    'hare_rage_run': (SimpleAnimation, 0.15, _frames('hare/hare-rage-run-side-0{}.png', xrange(1, 3))),
+    'hare_rage_run_down': (SimpleAnimation, 0.15, _mirrored('hare/hare-rage-run-down-01.png')),
+    'hare_rage_run_up': (SimpleAnimation, 0.15, _mirrored('hare/hare-rage-run-up-01.png')),
+}
+
+# resources used by objects of each type of map (see read_map):
+# type: (texture keys, animation keys)
+ASSETS = {
+    'grass': (['grass'], []),
+    'water': (['water'], ['water']),
+    'sand': (['sand'], []),
+    'hole': ([], []),
+    'carrot': ([], []),
+    'mountain': ([key for key in TEXTURES if key.startswith('mountain_')], []),
+    'bush': (['bush'], []),
+    'rock': (['rock'], []),
+    'rock2': (['rock2'], []),
+    'wood': (['wood'], []),
+    'tree': (['tree'], ['tree_blow', 'tree_grow']),
+    'hero': (['rabbit_hero'], [key for key in ANIMATIONS if key.startswith('hero_')]),
+    'hare': (['rabbit_hero'], [key for key in ANIMATIONS if key.startswith('hare_')]),
+    'holy_carrot': (['holy_carrot'], ['holy_carrot']),
+    'interface': (['toolbar_bg'], []),
+}
+# objects which are in each round: default landscape, trees planted by
+# player, characters, holy carrot and toolbar
+COMMON_ASSETS = ['grass', 'tree', 'hero', 'hare', 'holy_carrot', 'interface']
+
+
+def texture_size(texture):
+    """ Size of RGBA texture in video memory in bytes """
+    return texture.width * texture.height * 4
+
+
+class TextureCache(object):
+    """
+    Textures of whole images (or atlas pages) by their paths relative to
+    resources directory. When cache is trimmed, textures which were not
+    used for the longest time are evicted until size of cache fits budget
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self._textures = OrderedDict()
+
+    def __contains__(self, path):
+        return path in self._textures
+
+    def put(self, path, texture):
+        if path in self._textures:
+            self.size -= texture_size(self._textures.pop(path))
+        self._textures[path] = texture
+        self.size += texture_size(texture)
+
+    def get(self, path):
+        texture = self._textures.pop(path, None)
+        if texture is None:
+            self.put(path, make_texture(pixel_cache.load(path)))
+        else:
+            # move to the end as recently used
+            self._textures[path] = texture
+        return self._textures[path]
+
+    def trim(self, keep=()):
+        """ Evict least recently used textures except ones with paths in keep """
+        for path in list(self._textures):
+            if self.size <= self.budget:
+                break
+            if path not in keep:
+                self.size -= texture_size(self._textures.pop(path))
+
+    def clear(self):
+        self._textures.clear()
+        self.size = 0
+
+
+pixel_cache = PixelCache(RESOURCES_DIR, PIXEL_CACHE_DIR)
+texture_cache = TextureCache(TEXTURE_BUDGET)
 
-def loader_cb(percents):
-    pass
-    #if GameContext.loader:
-    #    GameContext.loader.set_progress(percents)
 
 def flip_horizontal(tex):
     #x1, x2, x3, x4, x5, x6, x7, x8 = tex.tex_coords
@@ -21,372 +217,212 @@ def flip_horizontal(tex):
     tex.uvsize = (-tex.uvsize[0], tex.uvsize[1])
     return tex
 
-def load_resources(context):
-    
-    textures = context.resources['textures'] = {}
-    animations = context.resources['animations'] = {}
-    
-    def load_texture(key, path, region=None, mipmap=False, wrap=None):
-        texture_path = join(RESOURCES_DIR, path)
-        texture = Image(texture_path, mipmap=mipmap).texture
-        if region:
-            texture = texture.get_region(*region)
-    
-        textures[key] = texture
-
-    load_texture('grass', 'grass/grass-01.png', (0, 0, BLOCK_SIZE[0], BLOCK_SIZE[1]))
-    load_texture('water', 'terrain/water-01.png', (0, 0, BLOCK_SIZE[0], BLOCK_SIZE[1]))
-    load_texture('sand', 'terrain/sand-01.png', (0, 0, BLOCK_SIZE[0], BLOCK_SIZE[1]))
-    load_texture('rock', 'one-cell-snags/stone-01.png')
-    loader_cb(5)
-    load_texture('rock2', 'one-cell-snags/stone-02.png')
-    load_texture('wood', 'one-cell-snags/log-01.png')
-    load_texture('bush', 'one-cell-snags/bush-01.png')
-    load_texture('tree', 'tree/tree-01.png')
-    loader_cb(10)
-    load_texture('rabbit_hero', 'hero/hero-idle-side-01.png')
-    load_texture('hare', 'hare/hare-idle-side-01.png')
-    load_texture('mountain_horizontal_bottom1', 'mountains/mountain-horizontal-bottom-01.png')
-    load_texture('mountain_horizontal_bottom2', 'mountains/mountain-horizontal-bottom-02.png')
-    load_texture('mountain_horizontal_bottom3', 'mountains/mountain-horizontal-bottom-03.png')
-    load_texture('mountain_horizontal_top1', 'mountains/mountain-horizontal-top-01.png')
-    loader_cb(20)
-    load_texture('mountain_horizontal_top2', 'mountains/mountain-horizontal-top-02.png')
-    load_texture('mountain_horizontal_top3', 'mountains/mountain-horizontal-top-03.png')
-    load_texture('mountain_horizontal_left_end_top', 'mountains/mountain-horizontal-left-end-top-01.png')
-    load_texture('mountain_horizontal_left_end_bottom', 'mountains/mountain-horizontal-left-end-bottom-01.png')
-    load_texture('mountain_horizontal_right_end_top', 'mountains/mountain-horizontal-right-end-top-01.png')
-    load_texture('mountain_horizontal_right_end_bottom', 'mountains/mountain-horizontal-right-end-bottom-01.png')
-    loader_cb(30)
-    load_texture('mountain_vertical1', 'mountains/mountain-vertical-01.png')
-    load_texture('mountain_vertical2', 'mountains/mountain-vertical-02.png')
-    load_texture('mountain_vertical_top_start', 'mountains/mountain-vertical-top-start-01.png')
-    load_texture('mountain_vertical_top_end', 'mountains/mountain-vertical-top-end-01.png')
-    load_texture('mountain_vertical_bottom_start', 'mountains/mountain-vertical-down-start-01.png')
-    load_texture('mountain_vertical_bottom_end', 'mountains/mountain-vertical-down-end-01.png')
-    loader_cb(40)
-    load_texture('mountain_central', 'mountains/mountain-center-center-01.png')
-    load_texture('mountain_central_top', 'mountains/mountain-center-top-01.png')
-    load_texture('holy_carrot', 'holy-carrot/holy-carrot-01.png')
-    load_texture('toolbar_bg', 'interface/background.png')
-    loader_cb(50)
-    
-    ##########################################################################
-    # All tree animation
-    ##########################################################################
-    
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 5):
-        texture = Image(join(RESOURCES_DIR, 'tree/tree-blow-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'tree/tree-place-01.png')).texture
-    frames.append((texture, frame_time))
-    
-    animations['tree_blow'] = SimpleAnimation(frames)
-    
-    frames = []
-    frame_time = 1.25  # sec
-    for i in xrange(1, 5):
-        texture = Image(join(RESOURCES_DIR, 'tree/tree-grow-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    frames.append((textures['tree'], frame_time))
-    
-    animations['tree_grow'] = SimpleAnimation(frames)
-    loader_cb(55)
-    
-    ##########################################################################
-    # Holly carrot animation
-    ##########################################################################
-    
-    
-    frames = []
-    frame_time = 0.25  # sec
-    for i in [3, 1, 2]:
-        texture = Image(join(RESOURCES_DIR, 'holy-carrot/holy-carrot-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    
-    animations['holy_carrot'] = ReturningAnimation(frames)
+def load_atlas():
+    """ Read atlas index if atlas was built, otherwise images are loaded one by one """
+    global _atlas
+    if not exists(ATLAS_INDEX):
+        _atlas = None
+        return
+    with open(ATLAS_INDEX) as f:
+        index = json.load(f)
+    pages = [relpath(join(ATLAS_DIR, fname), RESOURCES_DIR).replace(os.sep, '/')
+             for fname in index['pages']]
+    _atlas = pages, index['regions']
 
-    # load water animation
-    frames = []
-    frame_time = 0.2  # sec
-    for i in xrange(1, 6):
-        texture = Image(join(RESOURCES_DIR, 'terrain/water-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['water'] = SimpleAnimation(frames)
-    
-    frame_time = 0.1
-    
-    # hero run down animation
-    frames = []
-    texture = Image(join(RESOURCES_DIR, 'hero/hero-run-down-01.png'), nocache=True).texture
-    frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'hero/hero-run-down-01.png')).texture
-    texture = flip_horizontal(texture)
-    frames.append((texture, frame_time))
-    animations['hero_run_down'] = SimpleAnimation(frames)
-    
-    frames = []
-    texture = Image(join(RESOURCES_DIR, 'hero/hero-run-up-01.png'), nocache=True).texture
-    frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'hero/hero-run-up-01.png')).texture
-    texture = flip_horizontal(texture)
-    frames.append((texture, frame_time))
-    animations['hero_run_up'] = SimpleAnimation(frames)
-    
-    loader_cb(60)
-    
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hero/hero-idle-side-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hero_idle'] = SimpleAnimation(frames)
-    
-    
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hero/hero-rotate-top-and-side-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hero_rotate_top'] = SimpleAnimation(frames)
-    animations['hero_rotate_top_r'] = ReverseAnimation(copy(frames))
+def _source(path):
+    """
+    Get path of texture in cache which contains image and region of image
+    in it. Images with the same content share one texture
+    """
+    if _atlas is not None:
+        pages, regions = _atlas
+        if path in regions:
+            page, x, y, w, h = regions[path]
+            return pages[page], (x, y, w, h)
+    return pixel_cache.canonical(path), None
 
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hero/hero-rotate-down-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hero_rotate_down'] = SimpleAnimation(frames)
-    animations['hero_rotate_down_r'] = ReverseAnimation(copy(frames))
-    
-    
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 10):
-        texture = Image(join(RESOURCES_DIR, 'hero/hero-run-side-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hero_run'] = SimpleAnimation(frames)
-    
-    loader_cb(65)
-    ##########################################################################
-    # Hero swim animations goes here
-    ##########################################################################
-    
-    # hero swim run side
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hero/hero-swim-idle-side-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hero_swim_idle'] = SimpleAnimation(frames)
-    
-    # hero swim run side
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hero/hero-swim-run-side-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hero_swim'] = SimpleAnimation(frames)
-    
-    # hero swim up-down
-    
-    frame_time = 0.1
-    
-    # hero swim down 
-    frames = []
-    texture = Image(join(RESOURCES_DIR, 'hero/hero-swim-run-down-01.png'), nocache=True).texture
-    frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'hero/hero-swim-run-down-01.png')).texture
-    texture = flip_horizontal(texture)
-    frames.append((texture, frame_time))
-    animations['hero_swim_down'] = SimpleAnimation(frames)
-    
-    # hero swim down 
-    frames = []
-    texture = Image(join(RESOURCES_DIR, 'hero/hero-swim-run-up-01.png'), nocache=True).texture
-    frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'hero/hero-swim-run-up-01.png')).texture
-    texture = flip_horizontal(texture)
-    frames.append((texture, frame_time))
-    animations['hero_swim_up'] = SimpleAnimation(frames)
-    
-    loader_cb(70)
-    # hero swim rotate top
-    
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hero/hero-swim-rotate-top-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hero_swim_rotate_top'] = SimpleAnimation(frames)
-    animations['hero_swim_rotate_top_r'] = ReverseAnimation(copy(frames))
+def load_image(path):
+    """
+    Get texture of image with path relative to resources directory. New
+    region of cached texture is returned, so it can be changed (e.g.
+    flipped) independently
+    """
+    source, region = _source(path)
+    texture = texture_cache.get(source)
+    if region is None:
+        region = (0, 0, texture.width, texture.height)
+    texture = texture.get_region(*region)
+    _image_sizes[path] = texture_size(texture)
+    return texture
 
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hero/hero-swim-rotate-down-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hero_swim_rotate_down'] = SimpleAnimation(frames)
-    animations['hero_swim_rotate_down_r'] = ReverseAnimation(copy(frames))
-    
-    loader_cb(75)
-    
-    ##########################################################################
-    ##########################################################################
-    #
-    # Load Hare animation here
-    #
-    ##########################################################################
-    ##########################################################################
+def all_assets():
+    return frozenset(TEXTURES), frozenset(ANIMATIONS)
 
-    frames = []
-    frame_time = 0.2  # sec
-    for i in xrange(1, 6):
-        texture = Image(join(RESOURCES_DIR, 'terrain/water-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['water'] = SimpleAnimation(frames)
-    
-    frame_time = 0.1
-    
-    # hare run down animation
-    frames = []
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-run-down-01.png'), nocache=True).texture
-    frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-run-down-01.png')).texture
-    texture = flip_horizontal(texture)
-    frames.append((texture, frame_time))
-    animations['hare_run_down'] = SimpleAnimation(frames)
-    
-    frames = []
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-run-up-01.png'), nocache=True).texture
-    frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-run-up-01.png')).texture
-    texture = flip_horizontal(texture)
-    frames.append((texture, frame_time))
-    animations['hare_run_up'] = SimpleAnimation(frames)
-    loader_cb(80)
-    
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hare/hare-idle-side-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hare_idle'] = SimpleAnimation(frames)
-    
-    
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hare/hare-rotate-top-and-side-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hare_rotate_top'] = SimpleAnimation(frames)
-    animations['hare_rotate_top_r'] = ReverseAnimation(copy(frames))
-    
-    loader_cb(85)
+def map_assets(map_data):
+    """
+    Get (texture keys, animation keys) of resources which are used by
+    objects of map, map_data is result of read_map
+    """
+    options, landscapes, statics, dynamics, trees, hero, hare = map_data
+    types = set(COMMON_ASSETS)
+    for column in landscapes + statics:
+        types.update(column)
+    types.update(_type for x, y, _type in dynamics)
+    types.discard(None)
+    texture_keys, animation_keys = set(), set()
+    for _type in types:
+        textures, animations = ASSETS[_type]
+        texture_keys.update(textures)
+        animation_keys.update(animations)
+    return frozenset(texture_keys), frozenset(animation_keys)
 
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hare/hare-rotate-down-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hare_rotate_down'] = SimpleAnimation(frames)
-    animations['hare_rotate_down_r'] = ReverseAnimation(copy(frames))
-    
-    
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 9):
-        texture = Image(join(RESOURCES_DIR, 'hare/hare-run-side-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hare_run'] = SimpleAnimation(frames)
-    
-    loader_cb(90)
-    ##########################################################################
-    # Hare swim animations goes here
-    ##########################################################################
-
-    # hero swim run side
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hare/hare-swim-idle-side-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hare_swim_idle'] = SimpleAnimation(frames)
+def asset_images(assets):
+    """ Get paths of images which are used by textures and animations of assets """
+    texture_keys, animation_keys = assets
+    paths = set(TEXTURES[key][0] for key in texture_keys)
+    for key in animation_keys:
+        for frame in ANIMATIONS[key][2]:
+            paths.add(frame[0] if isinstance(frame, tuple) else frame)
+    return paths
 
-    # hare swim run side
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hare/hare-swim-run-side-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hare_swim'] = SimpleAnimation(frames)
-    
-    # hare swim up-down
-    
-    frame_time = 0.25
-    
-    # hare swim down 
-    frames = []
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-swim-run-down-01.png'), nocache=True).texture
-    frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-swim-run-down-01.png')).texture
-    texture = flip_horizontal(texture)
-    frames.append((texture, frame_time))
-    animations['hare_swim_down'] = SimpleAnimation(frames)
-    
-    # hare swim down 
-    frames = []
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-swim-rotate-02.png'), nocache=True).texture
-    frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-swim-rotate-02.png')).texture
-    texture = flip_horizontal(texture)
-    frames.append((texture, frame_time))
-    animations['hare_swim_up'] = SimpleAnimation(frames)
-    
-    # hare swim rotate top
-    
-    loader_cb(95)
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hare/hare-swim-rotate-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hare_swim_rotate_top'] = SimpleAnimation(frames)
-    animations['hare_swim_rotate_top_r'] = ReverseAnimation(copy(frames))
+def asset_sources(assets):
+    """ Get paths of textures in cache (images or atlas pages) used by assets """
+    return set(_source(path)[0] for path in asset_images(assets))
 
-    frames = []
-    frame_time = 0.25  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hare/hare-swim-rotate-down-0{}.png'.format(i))).texture
-        frames.append((texture, frame_time))
-    animations['hare_swim_rotate_down'] = SimpleAnimation(frames)
-    animations['hare_swim_rotate_down_r'] = ReverseAnimation(copy(frames))
+def build_texture(key):
+    path, region = TEXTURES[key]
+    texture = load_image(path)
+    if region:
+        texture = texture.get_region(*region)
+    return texture
 
-    frames = []
-    frame_time = 0.15  # sec
-    for i in xrange(1, 3):
-        texture = Image(join(RESOURCES_DIR, 'hare/hare-rage-run-side-0{}.png'.format(i))).texture
+def build_animation(key):
+    animation_class, frame_time, paths = ANIMATIONS[key]
+    frames = []
+    for path in paths:
+        if isinstance(path, tuple):
+            texture = flip_horizontal(load_image(path[0]))
+        else:
+            texture = load_image(path)
         frames.append((texture, frame_time))
-    animations['hare_rage_run'] = SimpleAnimation(frames)
-    
-    frames = []
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-rage-run-down-01.png'), nocache=True).texture
-    frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-rage-run-down-01.png')).texture
-    texture = flip_horizontal(texture)
-    frames.append((texture, frame_time))
-    animations['hare_rage_run_down'] = SimpleAnimation(frames)
-    
-    frames = []
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-rage-run-up-01.png'), nocache=True).texture
-    frames.append((texture, frame_time))
-    texture = Image(join(RESOURCES_DIR, 'hare/hare-rage-run-up-01.png')).texture
-    texture = flip_horizontal(texture)
-    frames.append((texture, frame_time))
-    animations['hare_rage_run_up'] = SimpleAnimation(frames)
-    loader_cb(100)
+    return animation_class(frames)
+
+def load_resources(context, assets=None):
+    """
+    Build textures and animations of assets (all of them by default) to
+    context.resources. Resources which are not in assets are released and
+    cached textures are trimmed to the budget, so it should be called
+    between rounds
+    """
+    if assets is None:
+        assets = all_assets()
+    texture_keys, animation_keys = assets
+    textures = context.resources.setdefault('textures', {})
+    animations = context.resources.setdefault('animations', {})
+    load_atlas()
+
+    for key in set(textures) - texture_keys:
+        del textures[key]
+    for key in set(animations) - animation_keys:
+        del animations[key]
+
+    for key in texture_keys:
+        if key not in textures:
+            textures[key] = build_texture(key)
+    for key in animation_keys:
+        if key not in animations:
+            animations[key] = build_animation(key)
+
+    texture_cache.trim(keep=asset_sources(assets))
+    pixel_cache.flush()
+
+def memory_report(context):
+    """
+    Get texture memory used by loaded resources in bytes: dict with
+    {key: size} of 'textures' and 'animations' (each image is counted
+    once per key), 'cached' - size of all textures in cache and 'budget'
+    """
+    report = {'textures': {}, 'animations': {},
+              'cached': texture_cache.size, 'budget': texture_cache.budget}
+    for key, texture in context.resources.get('textures', {}).iteritems():
+        report['textures'][key] = texture_size(texture)
+    for key in context.resources.get('animations', {}):
+        paths = asset_images((frozenset(), [key]))
+        report['animations'][key] = sum(_image_sizes.get(path, 0) for path in paths)
+    return report
+
+def _decode(path):
+    try:
+        return path, pixel_cache.load(path)
+    except Exception:
+        # image will be loaded on demand
+        return path, None
+
+class ResourceLoader(object):
+    """
+    Loads resources of assets in background. Images which are not cached
+    yet are read from pixel cache (or decoded) in thread pool, textures are
+    created from them on main thread (which owns GL context) by batches of
+    UPLOADS_PER_FRAME per frame. When all images are loaded load_resources
+    is called, so textures and animations are built from cached images.
+    """
+
+    WORKERS = 4
+    UPLOADS_PER_FRAME = 4
+
+    def __init__(self, context, assets=None):
+        self.context = context
+        self.assets = assets if assets is not None else all_assets()
+        load_atlas()
+        self.paths = sorted(path for path in asset_sources(self.assets)
+                            if path not in texture_cache)
+        # the last step is building of textures and animations
+        self.total = len(self.paths) + 1
+        self.loaded = 0
+        self.done = False
+        self._decoded = Queue.Queue()
+        self._on_complete = []
+        self._on_progress = []
+
+    def start(self):
+        pool = ThreadPool(self.WORKERS)
+        for path in self.paths:
+            pool.apply_async(_decode, (path, ), callback=self._decoded.put)
+        pool.close()
+        Clock.schedule_interval(self._upload, 0)
+
+    def cancel(self):
+        Clock.unschedule(self._upload)
+
+    def bind(self, on_complete=None, on_progress=None):
+        """
+        on_complete() is called when all resources are loaded,
+        on_progress(loaded, total) - after each batch of textures
+        """
+        if on_complete:
+            self._on_complete.append(on_complete)
+        if on_progress:
+            self._on_progress.append(on_progress)
+
+    def _upload(self, dt):
+        for i in xrange(self.UPLOADS_PER_FRAME):
+            try:
+                path, pixels = self._decoded.get_nowait()
+            except Queue.Empty:
+                break
+            if pixels is not None:
+                texture_cache.put(path, make_texture(pixels))
+            self.loaded += 1
+        if self.loaded == len(self.paths):
+            load_resources(self.context, self.assets)
+            self.loaded += 1
+            self.done = True
+        for callback in self._on_progress:
+            callback(self.loaded, self.total)
+        if self.done:
+            for callback in self._on_complete:
+                callback()
+            return False
 
 def read_map(fname):
     """
@@ -394,7 +430,9 @@ def read_map(fname):
 
     format of file:
     global dict which contains the next keys
-        options: { "size": [num_of_blocks_X, num_of_blocks_Y], ...}
+        options: { "size": [num_of_blocks_X, num_of_blocks_Y], ...}, physics is
+                 configured by "iterations", "sleep_time_threshold" and
+                 "idle_speed_threshold" options (see init_physics)
         landscapes: [(i,j,type), ...], where type is in ['grass', 'water', 'sand', 'hole', 'carrot']
         statics: [(i,j,type), ...], where type is in ['mountain', 'bush']
         dynamics: [(x,y,type), ...], where type is in ['wood', 'rock', 'rock2']
@@ -4,4 +4,27 @@ GAME_AREA_SIZE = 14, 10
 
 OBJECT_MASS = 1e10
 CHARACTER_MASS = 1e20
-HERO_SPEED = 6 # Normal hero speed
\ No newline at end of file
+HERO_SPEED = 6 # Normal hero speed
+
+SIMULATION_FPS = 30 # rate of physics and controllers steps
+RENDER_FPS = 60 # rate of screen updates, e.g. 30, 60 or 120
+MAX_CATCHUP_STEPS = 5 # max number of simulation steps per frame
+
+# physics bodies at rest (slower than IDLE_SPEED_THRESHOLD pixels per second)
+# for SLEEP_TIME_THRESHOLD seconds sleep until they are touched or dragged,
+# None disables sleeping. Both may be overridden by options of map
+SLEEP_TIME_THRESHOLD = 0.5
+IDLE_SPEED_THRESHOLD = 5.
+
+TEXTURE_BUDGET = 16 * 1024 * 1024 # bytes of cached textures kept between rounds
+DEFAULT_MAP = 'test.map'
+
+# sprites smaller on screen (in pixels) are animated with lower frame rate
+LOD_SMALL_SIZE = 40
+LOD_SMALL_DELAY = 0.2 # min time between their frames in seconds
+
+CULL_CHUNK = 4 # landscape is culled by chunks of CULL_CHUNK x CULL_CHUNK blocks
+CULL_MARGIN = BLOCK_SIZE[0] # pixels around visible part of scene which are drawn too
+
+# render terrain, mountains and bushes once to Fbo tiles instead of each frame
+BAKE_STATICS = False
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Headless simulation of game rounds. Game logic runs with stand-ins of Kivy
+classes (see headless module) and rounds are stepped by manual clock as fast
+as CPU allows, so it may be used for benchmarks of AI and physics or for
+checking maps in bulk on a machine without GPU:
+
+    python simulate.py [--time SECONDS] [--memory] [map_file ...]
+"""
+import os
+import sys
+import time
+import argparse
+
+# should be set before any game module is imported
+os.environ['MOONRABBIT_HEADLESS'] = '1'
+
+from backend import Clock
+from resources import memory_report
+from animation import ticker
+from settings import DEFAULT_MAP
+from gamecontext import GameContext
+from game import MoonRabbitGame
+
+
+def simulate(map_file=DEFAULT_MAP, duration=120.):
+    """ Play one round for at most duration seconds of game time """
+    Clock.reset()
+    ticker.reset()
+    GameContext.reset()
+    GameContext.load_resources(map_file)
+    started = time.time()
+    game = MoonRabbitGame(map_file=map_file)
+    game.start()
+    while not game.finished and Clock.time < duration:
+        Clock.tick(game.spf)
+    real_time = time.time() - started
+    return {
+        'map': map_file,
+        'finished': game.finished,
+        'win': game.win,
+        'game_time': Clock.time,
+        'frames': Clock.frames,
+        'real_time': real_time,
+        'speedup': Clock.time / real_time if real_time else 0.,
+        'replans': sum(c.controller.replans for c in GameContext.characters),
+        'sprites': len(GameContext.dynamic_objects),
+        'updated_sprites': float(game.total_updated_sprites) / (Clock.frames or 1),
+    }
+
+
+def print_memory_report():
+    """ Print texture memory used by resources of the last round """
+    report = memory_report(GameContext)
+    for kind in ('textures', 'animations'):
+        for key, size in sorted(report[kind].items(), key=lambda item: -item[1]):
+            print '  %-10s %-40s %8.1f KB' % (kind[:-1], key, size / 1024.)
+    print '  cached textures: %.1f of %.1f MB' % (report['cached'] / 1048576.,
+                                                  report['budget'] / 1048576.)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate game rounds without window')
+    parser.add_argument('maps', nargs='*', default=[DEFAULT_MAP])
+    parser.add_argument('--time', type=float, default=120.,
+                        help='max game time of the round in seconds')
+    parser.add_argument('--memory', action='store_true',
+                        help='print texture memory used by each resource')
+    args = parser.parse_args(argv)
+    for map_file in args.maps:
+        result = simulate(map_file, args.time)
+        print '%(map)s: finished=%(finished)s win=%(win)s game time %(game_time).1fs ' \
+              '(%(frames)d frames) in %(real_time).2fs, x%(speedup).0f, ' \
+              '%(replans)d replans, %(updated_sprites).1f of %(sprites)d sprites ' \
+              'updated per frame' % result
+        if args.memory:
+            print_memory_report()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,71 @@
+""" Lightweight replacement of widgets for game objects """
+from backend import Canvas, PushMatrix, PopMatrix, Translate, Rotate
+
+
+class Sprite(object):
+    """
+    Canvas of game object with its position and size. Unlike widget it has
+    no properties, events and touch dispatching. Instructions of static
+    sprite are in scene coordinates, instructions of rotatable one are
+    relative to its left bottom corner (as in ScatterPlane), it is moved and
+    rotated with Translate and Rotate instructions
+    """
+
+    __slots__ = ('canvas', 'size', '_pos', '_translate', '_rotate')
+
+    def __init__(self, pos=(0, 0), size=(100, 100), rotatable=False):
+        self.canvas = Canvas()
+        self.size = tuple(size)
+        self._pos = tuple(pos)
+        self._translate = self._rotate = None
+        if rotatable:
+            w, h = self.size
+            with self.canvas.before:
+                PushMatrix()
+                self._translate = Translate(self._pos[0] + w / 2., self._pos[1] + h / 2.)
+                self._rotate = Rotate(angle=0, axis=(0, 0, 1))
+                Translate(-w / 2., -h / 2.)
+            with self.canvas.after:
+                PopMatrix()
+
+    @property
+    def pos(self):
+        return self._pos
+
+    @property
+    def x(self):
+        return self._pos[0]
+
+    @property
+    def y(self):
+        return self._pos[1]
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    @property
+    def rotatable(self):
+        return self._rotate is not None
+
+    def _get_center(self):
+        return self._pos[0] + self.size[0] / 2., self._pos[1] + self.size[1] / 2.
+
+    def _set_center(self, center):
+        self._pos = center[0] - self.size[0] / 2., center[1] - self.size[1] / 2.
+        if self._translate is not None:
+            self._translate.xy = center
+
+    center = property(_get_center, _set_center)
+
+    def _get_rotation(self):
+        return self._rotate.angle
+
+    def _set_rotation(self, angle):
+        self._rotate.angle = angle
+
+    rotation = property(_get_rotation, _set_rotation)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Measures startup of the game and fails if it is slower than budget:
+
+    import - import of main module,
+    menu - from start of process to the first frame with menu,
+    game - from start of process to the first frame of game scene, game
+           is started as if START was pressed when menu is shown.
+
+Each measure is made in new process, median of runs is compared with
+budget, exit status is 1 if any of them is exceeded:
+
+    python startup_bench.py [--runs N] [--baseline FILE] [--tolerance 0.2]
+    python startup_bench.py --save FILE
+
+Budgets are BUDGET (in seconds) or times saved with --save on the same
+machine plus tolerance.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import subprocess
+
+STARTED = time.time()
+
+BUDGET = {'import': 1.5, 'menu': 4., 'game': 10.}
+MEASURES = ['import', 'menu', 'game']
+
+
+def measure():
+    """ Run the app, print times of startup stages as JSON and exit """
+    result = {}
+    import main
+    result['import'] = time.time() - STARTED
+    from kivy.clock import Clock
+
+    class BenchApp(main.MoonRabbitApp):
+
+        def build(self):
+            root = super(BenchApp, self).build()
+            Clock.schedule_once(self.on_menu, 0)
+            return root
+
+        def on_menu(self, dt):
+            result['menu'] = time.time() - STARTED
+            self.start_game()
+
+        def switch_to_scene(self):
+            super(BenchApp, self).switch_to_scene()
+            Clock.schedule_once(self.on_game, 0)
+
+        def on_game(self, dt):
+            result['game'] = time.time() - STARTED
+            self.stop()
+
+    BenchApp().run()
+    sys.stdout.write('STARTUP %s\n' % json.dumps(result))
+
+
+def run(runs):
+    """ Get median times of runs """
+    times = dict((key, []) for key in MEASURES)
+    for i in xrange(runs):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child'])
+        for line in output.splitlines():
+            if line.startswith('STARTUP '):
+                result = json.loads(line[len('STARTUP '):])
+                break
+        else:
+            raise RuntimeError('Game was not started')
+        for key in MEASURES:
+            times[key].append(result[key])
+    return dict((key, sorted(values)[len(values) / 2]) for key, values in times.iteritems())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check startup time of the game')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--baseline', help='JSON file with times saved by --save')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown relative to baseline')
+    parser.add_argument('--save', help='save measured times as baseline')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        # game uses paths relative to its directory
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        measure()
+        return 0
+
+    times = run(args.runs)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(times, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            budget = dict((key, value * (1 + args.tolerance))
+                          for key, value in json.load(f).iteritems())
+    else:
+        budget = BUDGET
+
+    failed = False
+    for key in MEASURES:
+        ok = times[key] <= budget[key]
+        failed = failed or not ok
+        print '%-7s %6.2fs (budget %.2fs) %s' % (key, times[key], budget[key],
+                                                  'ok' if ok else 'SLOW')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
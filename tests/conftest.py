@@ -0,0 +1,4 @@
+import os
+
+# game modules are tested with stand-ins of Kivy classes (see headless)
+os.environ['MOONRABBIT_HEADLESS'] = '1'
@@ -0,0 +1,89 @@
+""" Random square maps and reference path costs for planner tests """
+import heapq
+import random
+
+from utils.astar import SQ_Location
+
+
+def random_grid(seed, width=24, height=18, rigid=0.25, costly=0.0):
+    """
+    Get map data: list of move costs of cells row by row, -1 for rigid
+    cells, part of passable cells costs 2
+    """
+    rnd = random.Random(seed)
+    grid = []
+    for lid in xrange(width * height):
+        r = rnd.random()
+        if r < rigid:
+            grid.append(-1)
+        elif r < rigid + costly:
+            grid.append(2)
+        else:
+            grid.append(1)
+    return grid
+
+
+def free_cells(grid):
+    return [lid for lid, cost in enumerate(grid) if cost != -1]
+
+
+def location(lid, width):
+    y, x = divmod(lid, width)
+    return SQ_Location(x, y)
+
+
+def neighbours(lid, width, height):
+    y, x = divmod(lid, width)
+    if x + 1 < width:
+        yield lid + 1
+    if x > 0:
+        yield lid - 1
+    if y + 1 < height:
+        yield lid + width
+    if y > 0:
+        yield lid - width
+
+
+def shortest_cost(grid, width, height, start, goal):
+    """
+    Cost of the shortest path by Dijkstra in the same units as AStar
+    counts it (costs of all cells including start), None if goal can't
+    be reached
+    """
+    costs = {start: grid[start]}
+    heap = [(grid[start], start)]
+    while heap:
+        cost, lid = heapq.heappop(heap)
+        if lid == goal:
+            return cost
+        if cost > costs[lid]:
+            continue
+        for n in neighbours(lid, width, height):
+            if grid[n] == -1:
+                continue
+            ncost = cost + grid[n]
+            if ncost < costs.get(n, ncost + 1):
+                costs[n] = ncost
+                heapq.heappush(heap, (ncost, n))
+    return None
+
+
+def path_cost(path, grid, width, height, start):
+    """ Check that path goes by passable neighbour cells and get its cost """
+    lid = start
+    cost = grid[start]
+    for node in path.getNodes():
+        if node.lid == start:
+            continue
+        assert node.lid in neighbours(lid, width, height)
+        assert grid[node.lid] != -1
+        cost += grid[node.lid]
+        lid = node.lid
+    return lid, cost
+
+
+def pairs(seed, grid, count=20):
+    """ Random (start, goal) pairs of distinct passable cells """
+    rnd = random.Random(seed)
+    cells = free_cells(grid)
+    return [tuple(rnd.sample(cells, 2)) for n in xrange(count)]
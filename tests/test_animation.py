@@ -0,0 +1,169 @@
+""" Ticker of sprite animations """
+import pytest
+
+from backend import Clock, Texture
+from animation import ticker, AnimationMixin, SimpleAnimation
+from settings import LOD_SMALL_DELAY
+
+
+class Quad(object):
+    """ Sprite instruction which only keeps what it shows """
+
+    texture = None
+    tex_coords = None
+
+
+class Animated(AnimationMixin):
+    """ Object of size x size at pos which records lags of its frames """
+
+    def __init__(self, pos=(0, 0), size=100, endless=False):
+        self.pos = pos
+        self.size = size
+        self.endless_animation = endless
+        self.lags = []
+
+    def bbox(self):
+        return self.pos[0], self.pos[1], self.size, self.size
+
+    def _animate(self, lag=0.):
+        self.lags.append(lag)
+
+
+class Shown(AnimationMixin):
+    """ Object which shows frames with its sprite """
+
+    restore_original = True
+
+    def __init__(self, texture):
+        self.texture = texture
+        self.sprite = Quad()
+
+    def bbox(self):
+        return None
+
+
+@pytest.fixture(autouse=True)
+def clock():
+    Clock.reset()
+    ticker.reset()
+    yield Clock
+    ticker.reset()
+
+
+def test_objects_are_animated_when_due():
+    first, second = Animated(), Animated()
+    ticker.schedule(first, 0.3)
+    ticker.schedule(second, 0.1)
+    Clock.tick(0.2)
+    assert first.lags == [] and second.lags == [pytest.approx(0.1)]
+    Clock.tick(0.2)
+    assert first.lags == [pytest.approx(0.1)]
+    # nothing is scheduled, ticker leaves the clock
+    assert len(ticker) == 0
+    assert Clock._events == []
+
+
+def test_unschedule_and_reschedule():
+    obj, other = Animated(), Animated()
+    ticker.schedule(obj, 0.1)
+    ticker.schedule(obj, 0.5)
+    ticker.schedule(other, 0.1)
+    ticker.unschedule(other)
+    Clock.tick(0.2)
+    assert obj.lags == [] and other.lags == []
+    Clock.tick(0.4)
+    assert obj.lags == [pytest.approx(0.1)] and other.lags == []
+
+
+def test_time_stops_while_paused():
+    obj = Animated()
+    ticker.schedule(obj, 0.1)
+    ticker.pause()
+    Clock.tick(1.)
+    assert obj.lags == []
+    ticker.resume()
+    Clock.tick(0.05)
+    assert obj.lags == []
+    Clock.tick(0.05)
+    assert obj.lags == [pytest.approx(0.)]
+
+
+def test_hidden_endless_animations_are_suspended():
+    ticker.set_view((0, 0, 200, 200))
+    visible = Animated(endless=True)
+    hidden = Animated(pos=(500, 0), endless=True)
+    once = Animated(pos=(500, 0))
+    for obj in (visible, hidden, once):
+        ticker.schedule(obj, 0.1)
+    Clock.tick(0.5)
+    assert len(visible.lags) == len(once.lags) == 1
+    assert hidden.lags == []
+    assert len(ticker) == 1
+    # frame catches up when object is shown
+    ticker.set_view((300, 0, 600, 200))
+    Clock.tick(0.1)
+    assert hidden.lags == [pytest.approx(0.5)]
+
+
+def test_moved_objects_are_resumed():
+    ticker.set_view((0, 0, 200, 200))
+    obj = Animated(pos=(500, 0), endless=True)
+    ticker.schedule(obj, 0.1)
+    Clock.tick(0.2)
+    assert obj.lags == [] and len(ticker) == 1
+    # objects which are still out of view stay suspended
+    ticker.update_dynamic([obj])
+    Clock.tick(0.1)
+    assert obj.lags == []
+    # view is the same, object comes into it
+    obj.pos = (150, 0)
+    ticker.update_dynamic([obj])
+    Clock.tick(0.1)
+    assert obj.lags == [pytest.approx(0.3)]
+
+
+def test_small_objects_are_throttled():
+    small, big = Animated(size=10), Animated()
+    assert ticker.schedule(small, 0.1) == ticker.schedule(big, 0.1) == pytest.approx(0.1)
+    Clock.tick(0.15)
+    assert small.lags == [] and big.lags == [pytest.approx(0.05)]
+    # lag is counted from due time, so small object skips missed frames
+    Clock.tick(0.1)
+    assert small.lags == [pytest.approx(0.15)]
+    # the same object is big when scene is zoomed in
+    ticker.set_view(None, scale=10.)
+    assert ticker.min_delay(small) == 0.
+
+
+class Small(Shown):
+
+    def bbox(self):
+        return 0, 0, 10, 10
+
+
+def test_small_objects_play_at_the_same_speed():
+    frames = [Texture((10, 10)) for n in xrange(4)]
+    obj = Small(frames[0])
+    obj.set_animation(SimpleAnimation([(texture, 0.1) for texture in frames]))
+    obj.animate(endless=True)
+    shown = []
+    for n in xrange(4):
+        Clock.tick(0.27)
+        shown.append(frames.index(obj.sprite.texture))
+    # frame of time 0.27, 0.54, 0.81 and 1.08 seconds since start
+    assert shown == [2, 1, 0, 2]
+
+
+def test_clip_frames():
+    original = Texture((10, 10))
+    frames = [Texture((10, 10)), Texture((10, 10))]
+    obj = Shown(original)
+    obj.set_animation(SimpleAnimation([(frames[0], 0.1), (frames[1], 0.2)]))
+    obj.animate()
+    assert obj.sprite.texture is frames[0]
+    Clock.tick(0.15)
+    assert obj.sprite.texture is frames[1]
+    # texture is restored when all frames are shown
+    Clock.tick(0.2)
+    assert obj.sprite.texture is original
+    assert obj.playhead.frame == 0 and len(ticker) == 0
@@ -0,0 +1,48 @@
+""" A* with binary heap and closed bitmap """
+from utils.astar import AStar, SQ_MapHandler, SQ_Location
+
+from tests.grids import random_grid, location, shortest_cost, path_cost, pairs
+
+W, H = 24, 18
+
+
+def check(grid, start, goal):
+    path = AStar(SQ_MapHandler(grid, W, H)).findPath(location(start, W), location(goal, W))
+    expected = shortest_cost(grid, W, H, start, goal)
+    if expected is None:
+        assert path is None
+        return
+    assert path is not None
+    end, cost = path_cost(path, grid, W, H, start)
+    assert end == goal
+    assert cost == expected == path.getTotalMoveCost()
+
+
+def test_uniform_costs():
+    for seed in xrange(5):
+        grid = random_grid(seed)
+        for start, goal in pairs(seed, grid):
+            check(grid, start, goal)
+
+
+def test_move_costs():
+    for seed in xrange(5):
+        grid = random_grid(seed, rigid=0.2, costly=0.3)
+        for start, goal in pairs(seed, grid):
+            check(grid, start, goal)
+
+
+def test_rigid_goal():
+    grid = [1] * (W * H)
+    grid[W + 1] = -1
+    mh = SQ_MapHandler(grid, W, H)
+    assert AStar(mh).findPath(SQ_Location(0, 0), SQ_Location(1, 1)) is None
+    assert AStar(mh).findPath(SQ_Location(0, 0), SQ_Location(W, 0)) is None
+
+
+def test_walled_goal():
+    grid = [1] * (W * H)
+    for lid in (1, W, W + 2, 2 * W + 1):
+        grid[lid] = -1
+    check(grid, 0, W + 1)
+    check(grid, W + 1, 5 * W)
@@ -0,0 +1,79 @@
+""" Baking of static objects into tiles """
+from backend import Canvas, Clock, Mesh
+from baking import Baker
+from landscape import Terrain as GameTerrain
+from sprite import Sprite
+from zorder import ZOrder
+
+
+class Terrain(object):
+    """ Terrain with given (key, mesh) of meshes which could be baked """
+
+    def __init__(self, meshes=()):
+        self.meshes = list(meshes)
+        self.baked = set()
+        self.on_change = None
+
+    def static_meshes(self):
+        return self.meshes
+
+
+class Culler(object):
+
+    def __init__(self, chunks=None):
+        self.chunks = chunks or {}
+
+
+class Static(object):
+
+    def __init__(self, canvas, x, y):
+        self.pos = x, y
+        self.widget = Sprite(pos=(x, y))
+        canvas.add(self.widget.canvas)
+
+
+def test_tiles_keep_y_order():
+    Clock.reset()
+    canvas = Canvas()
+    zorder = ZOrder(canvas)
+    baker = Baker(canvas, Culler(), Terrain(), zorder)
+    upper, lower = Static(canvas, 0, 164), Static(canvas, 0, 64)
+    baker.add(upper)
+    baker.add(lower)
+    # object which isn't baked, it's between baked ones
+    tree = Static(canvas, 10, 94)
+    zorder.add(tree)
+    assert canvas.children == []
+    rows = zorder.layer.children
+    assert len(rows) == 3
+    assert rows[1].children == [tree.widget.canvas]
+    assert rows[0].children[0].texture is upper.baked.texture
+    assert rows[2].children[0].texture is lower.baked.texture
+    Clock.tick(0.)
+    assert upper.baked.draws == lower.baked.draws == 1
+    assert upper.baked.children[-1] is upper.widget.canvas
+    # tile is baked again when the object is changed
+    baker.invalidate(upper)
+    Clock.tick(0.)
+    assert upper.baked.draws == 2 and lower.baked.draws == 1
+
+
+def test_ground_is_drawn_with_white_vertices():
+    Clock.reset()
+    grass = Mesh(vertices=[], fmt=GameTerrain.FMT)
+    chunk = Canvas()
+    chunk.add(grass)
+    terrain = Terrain([(((1, 0), 0), grass)])
+    canvas = Canvas()
+    baker = Baker(canvas, Culler({(1, 0): chunk}), terrain, ZOrder(canvas))
+    assert terrain.baked == set([((1, 0), 0)])
+    quad, = chunk.children
+    # chunk is drawn by shader of terrain, which multiplies texture by vColor
+    assert isinstance(quad, Mesh) and quad.fmt == GameTerrain.FMT
+    assert quad.texture is baker._ground[(1, 0)].texture
+    size = GameTerrain.VERTEX_SIZE
+    vertices = [quad.vertices[n:n + size] for n in xrange(0, len(quad.vertices), size)]
+    assert [v[:2] for v in vertices] == [[288, 0], [576, 0], [576, 288], [288, 288]]
+    assert all(v[4:] == [1., 1., 1., 1.] for v in vertices)
+    Clock.tick(0.)
+    assert baker._ground[(1, 0)].children[-1] is grass
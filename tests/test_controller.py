@@ -0,0 +1,90 @@
+""" Path following of characters """
+from collections import defaultdict
+
+import pytest
+
+phy = pytest.importorskip('cymunk')
+
+from controller import BaseCharacterController
+from gamecontext import GameContext
+from settings import BLOCK_SIZE
+from walkmap import WalkMap
+
+
+def center(i, j):
+    return (i + 0.5) * BLOCK_SIZE[0], (j + 0.5) * BLOCK_SIZE[1]
+
+
+class Character(object):
+    """ Body which is moved by controller, animations are only remembered """
+
+    def __init__(self, cell):
+        self.body = phy.Body(1, 1)
+        self.body.position = center(*cell)
+        self.animations = defaultdict(str)
+        self.current_animation = None
+
+    def set_animation(self, animation, stop=False):
+        self.current_animation = animation
+
+    def animate(self, endless=False):
+        pass
+
+
+class Walker(BaseCharacterController):
+    PLANNER = 'astar'
+    MAY_GO_THROUGH = []
+
+    def get_goal_obj(self):
+        return self.goal
+
+    def define_velocity(self):
+        # check point of the next cell is reached in three steps
+        return BLOCK_SIZE[0] / 3.
+
+
+@pytest.fixture
+def walker(monkeypatch):
+    space = phy.Space()
+    monkeypatch.setattr(GameContext, 'space', space)
+    monkeypatch.setattr(GameContext, 'walkmap', WalkMap(space, 6, 3))
+    walker = Walker(Character((0, 1)))
+    walker.goal = Character((4, 1))
+    walker._direction = 'r'
+    walker._counter = 0
+    return walker
+
+
+def run(walker, steps):
+    for n in xrange(steps):
+        walker._state_handlers[walker._state]()
+
+
+def block(walkmap, *cells):
+    """ Put rocks to cells """
+    rock = walkmap.bit('Rock')
+    rigid = set(walkmap.index(*cell) for cell in cells)
+    walkmap._query = lambda idx: rock if idx in rigid else 0
+    walkmap._dirty.update(xrange(walkmap.w * walkmap.h))
+
+
+def test_kept_path_is_counted_at_check_points(walker):
+    run(walker, 1)
+    # path which was just found isn't an avoided replan
+    assert walker.replans == 1 and walker.replans_avoided == 0
+    assert walker._state == 'MOVING'
+    run(walker, 6)
+    assert walker.get_cell(walker.obj.body.position) == (2, 1)
+    assert walker.replans == 1 and walker.replans_avoided == 2
+    # the last check point is next to the goal, path is over there
+    run(walker, 3)
+    assert walker.replans == 2 and walker.replans_avoided == 2
+
+
+def test_blocked_path_is_found_again(walker):
+    run(walker, 4)
+    assert walker.replans == 1 and walker.replans_avoided == 1
+    block(GameContext.walkmap, (3, 1))
+    run(walker, 3)
+    assert walker.replans == 2 and walker.replans_avoided == 1
+    assert (3, 1) not in [walker.get_cell(phy.Vec2d(*point)) for d, point in walker.check_points]
@@ -0,0 +1,52 @@
+""" Culling of invisible parts of scene """
+from backend import Canvas
+from culling import Culler
+from gamecontext import GameContext
+from settings import BLOCK_SIZE, CULL_CHUNK, CULL_MARGIN
+from sprite import Sprite
+from zorder import ZOrder
+
+CHUNK = CULL_CHUNK * BLOCK_SIZE[0]
+
+
+class Obj(object):
+
+    def __init__(self, canvas, x, y):
+        self.widget = Sprite(pos=(x, y), size=(10, 10))
+        canvas.add(self.widget.canvas)
+
+
+def test_chunks_out_of_view_are_detached():
+    culler = Culler()
+    chunks = [culler.chunk(i * CULL_CHUNK, 0) for i in xrange(3)]
+    assert culler.landscape.children == chunks
+    culler.set_view((0, 0, CHUNK - CULL_MARGIN, CHUNK))
+    assert culler.landscape.children == chunks[:1]
+    culler.set_view((2 * CHUNK + CULL_MARGIN, 0, 3 * CHUNK, CHUNK))
+    assert culler.landscape.children == chunks[2:]
+    culler.set_view(None)
+    assert set(culler.landscape.children) == set(chunks)
+
+
+def test_objects_out_of_view_are_detached(monkeypatch):
+    canvas = Canvas()
+    zorder = ZOrder(canvas)
+    near, far = Obj(canvas, 0, 0), Obj(canvas, 3 * CHUNK, 0)
+    zorder.add(near)
+    zorder.add_dynamic(far)
+    monkeypatch.setattr(GameContext, '_objs', [near, far])
+    culler = Culler(zorder)
+    culler.set_view((0, 0, CHUNK, CHUNK))
+    assert zorder.dynamic.children == []
+    assert zorder.bucket(0).children == [near.widget.canvas]
+    # dynamic object is shown when it comes into view
+    far.widget.center = CHUNK, 0
+    culler.update_dynamic([far])
+    assert zorder.dynamic.children == [far.widget.canvas]
+    near.widget.center = far.widget.center = 3 * CHUNK, 0
+    culler.update_dynamic([far])
+    assert zorder.dynamic.children == []
+    # static objects are checked only when view is changed
+    assert zorder.bucket(0).children == [near.widget.canvas]
+    culler.set_view(None)
+    assert zorder.dynamic.children == [far.widget.canvas]
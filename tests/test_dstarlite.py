@@ -0,0 +1,79 @@
+""" Incremental D* Lite planner against plain A* """
+import random
+
+from utils.astar import AStar, SQ_MapHandler
+from utils.dstarlite import DStarLite
+
+from tests.grids import random_grid, free_cells, location, path_cost, pairs
+
+W, H = 24, 18
+
+
+def astar_cost(grid, start, goal):
+    path = AStar(SQ_MapHandler(grid, W, H)).findPath(location(start, W), location(goal, W))
+    return path and path.getTotalMoveCost()
+
+
+def check(planner, grid, start, goal):
+    path = planner.findPath(location(start, W), location(goal, W))
+    expected = astar_cost(grid, start, goal)
+    if expected is None:
+        assert path is None
+        return None
+    assert path is not None
+    end, cost = path_cost(path, grid, W, H, start)
+    assert end == goal
+    assert cost == expected == path.getTotalMoveCost()
+    return path
+
+
+def change_cells(rnd, grid, start, goal, count=6):
+    """ Toggle some cells between rigid and passable ones """
+    cells = [lid for lid in rnd.sample(xrange(W * H), count) if lid not in (start, goal)]
+    for lid in cells:
+        grid[lid] = rnd.choice((1, 2)) if grid[lid] == -1 else -1
+    return cells
+
+
+def test_fixed_ends():
+    for seed in xrange(5):
+        grid = random_grid(seed, costly=0.2)
+        for start, goal in pairs(seed, grid, 10):
+            check(DStarLite(SQ_MapHandler(grid, W, H)), grid, start, goal)
+
+
+def test_cell_updates():
+    for seed in xrange(5):
+        rnd = random.Random(seed)
+        grid = random_grid(seed, costly=0.2)
+        start, goal = pairs(seed, grid, 1)[0]
+        planner = DStarLite(SQ_MapHandler(grid, W, H))
+        check(planner, grid, start, goal)
+        for n in xrange(10):
+            planner.updateCells(change_cells(rnd, grid, start, goal))
+            check(planner, grid, start, goal)
+
+
+def test_moving_ends():
+    for seed in xrange(5):
+        rnd = random.Random(seed)
+        grid = random_grid(seed, rigid=0.2)
+        start, goal = pairs(seed, grid, 1)[0]
+        planner = DStarLite(SQ_MapHandler(grid, W, H))
+        for n in xrange(15):
+            path = check(planner, grid, start, goal)
+            if path is not None and len(path.getNodes()) > 1:
+                # hunter makes a step along its path, the goal runs away
+                start = path.getNodes()[0].lid
+            goal = rnd.choice([lid for lid in free_cells(grid) if lid != start])
+            planner.updateCells(change_cells(rnd, grid, start, goal, 3))
+
+
+def test_reset():
+    grid = random_grid(1)
+    start, goal = pairs(1, grid, 1)[0]
+    planner = DStarLite(SQ_MapHandler(grid, W, H))
+    check(planner, grid, start, goal)
+    planner.reset()
+    assert planner.expanded > 0
+    check(planner, grid, goal, start)
@@ -0,0 +1,79 @@
+""" Distance fields against plain A* """
+import random
+
+import pytest
+
+from utils import flowfield
+from utils.astar import AStar, SQ_MapHandler
+from utils.flowfield import FlowField
+
+from tests.grids import random_grid, free_cells, location, path_cost, pairs
+
+W, H = 24, 18
+
+
+def make_field(grid, goal):
+    return FlowField([int(cost != -1) for cost in grid], W, H, goal)
+
+
+def check(grid, start, goal):
+    path = make_field(grid, goal).findPath(location(start, W))
+    expected = AStar(SQ_MapHandler(grid, W, H)).findPath(location(start, W), location(goal, W))
+    if expected is None:
+        assert path is None
+        return
+    assert path is not None
+    end, cost = path_cost(path, grid, W, H, start)
+    assert end == goal
+    assert cost == expected.getTotalMoveCost() == path.getTotalMoveCost()
+
+
+def test_paths():
+    for seed in xrange(5):
+        grid = random_grid(seed)
+        for start, goal in pairs(seed, grid):
+            check(grid, start, goal)
+
+
+def test_cell_updates():
+    # field isn't updated, the new one is built for changed map
+    for seed in xrange(5):
+        rnd = random.Random(seed)
+        grid = random_grid(seed)
+        start, goal = pairs(seed, grid, 1)[0]
+        for n in xrange(10):
+            for lid in rnd.sample(xrange(W * H), 6):
+                if lid not in (start, goal):
+                    grid[lid] = 1 if grid[lid] == -1 else -1
+            check(grid, start, goal)
+
+
+def test_shared_field():
+    grid = random_grid(2)
+    goal = free_cells(grid)[0]
+    field = make_field(grid, goal)
+    for start, _goal in pairs(2, grid):
+        path = field.findPath(location(start, W))
+        expected = AStar(SQ_MapHandler(grid, W, H)).findPath(location(start, W),
+                                                             location(goal, W))
+        if expected is None or start == goal:
+            assert path is None
+        else:
+            assert path.getTotalMoveCost() == expected.getTotalMoveCost()
+
+
+def test_rigid_goal_and_start():
+    grid = [1] * (W * H)
+    grid[0] = grid[W + 1] = -1
+    field = make_field(grid, W + 1)
+    path = field.findPath(location(0, W))
+    assert path.getTotalMoveCost() == 3
+    assert path.getNodes()[-1].lid == W + 1
+
+
+@pytest.mark.skipif(flowfield.numpy is None, reason='numpy is not installed')
+def test_numpy_wave():
+    for seed in xrange(5):
+        grid = random_grid(seed)
+        field = make_field(grid, free_cells(grid)[seed])
+        assert field._build_numpy() == field._build_python()
@@ -0,0 +1,115 @@
+""" Simulation steps with sleeping bodies """
+import pytest
+
+pytest.importorskip('cymunk')
+
+from game import MoonRabbitGame
+from gameobjects import Character
+
+
+class Body(object):
+
+    def __init__(self, sleeping=False):
+        self.is_sleeping = sleeping
+
+    def activate(self):
+        self.is_sleeping = False
+
+
+class Obj(object):
+    """ Dynamic object which counts calls of the game """
+
+    draggable = False
+
+    def __init__(self, sleeping=False):
+        self.body = Body(sleeping)
+        self.saved = self.updated = 0
+
+    def save_state(self):
+        self.saved += 1
+
+    def update(self):
+        self.updated += 1
+
+
+class Space(object):
+    """ Space where some bodies are woken (or fall asleep) during the step """
+
+    def __init__(self, wake=(), sleep=()):
+        self.wake = wake
+        self.sleep = sleep
+
+    def step(self, dt):
+        for body in self.wake:
+            body.activate()
+        for body in self.sleep:
+            body.is_sleeping = True
+
+
+class Context(object):
+
+    def __init__(self, objs, space):
+        self.dynamic_objects = objs
+        self.characters = []
+        self.space = space
+
+
+class Game(object):
+    spf = 1. / 30
+
+    def __init__(self, objs, space):
+        self.context = Context(objs, space)
+
+    step = MoonRabbitGame.step.__func__
+    collision_handler = MoonRabbitGame.collision_handler.__func__
+
+
+def test_sleeping_bodies_are_skipped():
+    awake, asleep = Obj(), Obj(sleeping=True)
+    Game([awake, asleep], Space()).step()
+    assert (awake.saved, awake.updated) == (1, 1)
+    assert (asleep.saved, asleep.updated) == (0, 0)
+
+
+def test_bodies_woken_during_step_are_updated():
+    woken, falling_asleep = Obj(sleeping=True), Obj()
+    space = Space(wake=[woken.body], sleep=[falling_asleep.body])
+    Game([woken, falling_asleep], space).step()
+    # saved state of woken body is where it fell asleep
+    assert (woken.saved, woken.updated) == (0, 1)
+    assert (falling_asleep.saved, falling_asleep.updated) == (1, 1)
+
+
+class Shape(object):
+
+    def __init__(self, data):
+        self.body = data.body
+        self.body.data = data
+
+
+class Arbiter(object):
+    total_ke = 0.
+
+    def __init__(self, *objs):
+        self.shapes = [Shape(obj) for obj in objs]
+
+
+class Controller(object):
+    collisions = 0
+
+    def handle_collision(self, arbiter):
+        self.collisions += 1
+
+
+def test_character_wakes_pushed_bodies():
+    character = Character.__new__(Character)
+    character.body = Body()
+    character.controller = Controller()
+    character.draggable = False
+    box = Obj(sleeping=True)
+    game = Game([box], Space())
+    assert game.collision_handler(game.context.space, Arbiter(character, box))
+    assert character.controller.collisions == 1
+    assert not box.body.is_sleeping
+    game.step()
+    assert (box.saved, box.updated) == (1, 1)
@@ -0,0 +1,62 @@
+""" Hierarchical path finding against plain A* """
+import random
+
+from utils.astar import AStar, SQ_MapHandler
+from utils.hpastar import HPAStar
+
+from tests.grids import random_grid, location, path_cost, pairs
+
+W, H = 24, 18
+
+
+def find(planner, start, goal):
+    return planner.findPath(location(start, W), location(goal, W))
+
+
+def check(planner, grid, start, goal):
+    """ HPA* finds the same paths as A* does, but they could be a bit longer """
+    path = find(planner, start, goal)
+    expected = AStar(SQ_MapHandler(grid, W, H)).findPath(location(start, W), location(goal, W))
+    if expected is None:
+        assert path is None
+        return None
+    assert path is not None
+    end, cost = path_cost(path, grid, W, H, start)
+    assert end == goal
+    assert cost == path.getTotalMoveCost() >= expected.getTotalMoveCost()
+    return cost
+
+
+def test_paths():
+    for seed in xrange(5):
+        grid = random_grid(seed, rigid=0.2, costly=0.2)
+        planner = HPAStar(SQ_MapHandler(grid, W, H), 6)
+        for start, goal in pairs(seed, grid):
+            check(planner, grid, start, goal)
+
+
+def test_cell_updates():
+    """ Updated graph gives the same paths as the one built from scratch """
+    for seed in xrange(5):
+        rnd = random.Random(seed)
+        grid = random_grid(seed, rigid=0.2, costly=0.2)
+        planner = HPAStar(SQ_MapHandler(grid, W, H), 6)
+        for n in xrange(10):
+            start, goal = pairs(seed * 100 + n, grid, 1)[0]
+            cost = check(planner, grid, start, goal)
+            fresh = find(HPAStar(SQ_MapHandler(grid, W, H), 6), start, goal)
+            assert cost == (fresh and fresh.getTotalMoveCost())
+            cells = rnd.sample(xrange(W * H), 8)
+            for lid in cells:
+                grid[lid] = rnd.choice((1, 2)) if grid[lid] == -1 else -1
+            planner.updateCells(cells)
+
+
+def test_rebuild():
+    grid = random_grid(3, rigid=0.2)
+    planner = HPAStar(SQ_MapHandler(grid, W, H), 6)
+    for lid in xrange(0, W * H, 5):
+        grid[lid] = 1
+    planner.rebuild()
+    for start, goal in pairs(3, grid):
+        check(planner, grid, start, goal)
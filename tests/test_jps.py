@@ -0,0 +1,70 @@
+""" Jump Point Search map handler against plain A* """
+import random
+
+from utils.astar import AStar, SQ_MapHandler, SQ_JumpMapHandler
+
+from tests.grids import random_grid, location, path_cost, pairs
+
+W, H = 24, 18
+
+
+def check(jumps, grid, start, goal):
+    """ grid is map data of jumps with open cells made passable """
+    path = AStar(jumps).findPath(location(start, W), location(goal, W))
+    expected = AStar(SQ_MapHandler(grid, W, H)).findPath(location(start, W), location(goal, W))
+    if expected is None:
+        assert path is None
+        return
+    assert path is not None
+    end, cost = path_cost(path, grid, W, H, start)
+    assert end == goal
+    assert cost == path.getTotalMoveCost() == expected.getTotalMoveCost()
+
+
+def test_uniform_costs():
+    for seed in xrange(5):
+        grid = random_grid(seed)
+        jumps = SQ_JumpMapHandler(grid, W, H)
+        for start, goal in pairs(seed, grid):
+            check(jumps, grid, start, goal)
+
+
+def test_move_costs():
+    for seed in xrange(5):
+        grid = random_grid(seed, rigid=0.2, costly=0.15)
+        jumps = SQ_JumpMapHandler(grid, W, H)
+        for start, goal in pairs(seed, grid):
+            check(jumps, grid, start, goal)
+
+
+def test_cell_updates():
+    for seed in xrange(5):
+        rnd = random.Random(seed)
+        grid = random_grid(seed, costly=0.1)
+        jumps = SQ_JumpMapHandler(grid, W, H)
+        for n in xrange(10):
+            cells = rnd.sample(xrange(W * H), 6)
+            for lid in cells:
+                grid[lid] = rnd.choice((1, 1, 2)) if grid[lid] == -1 else -1
+            jumps.updateCells(cells)
+            # jump tables are the same as the ones built from scratch
+            assert jumps._jumps == SQ_JumpMapHandler(grid, W, H)._jumps
+            for start, goal in pairs(seed * 100 + n, grid, 5):
+                check(jumps, grid, start, goal)
+
+
+def test_open_cells():
+    for seed in xrange(5):
+        rnd = random.Random(seed)
+        grid = random_grid(seed)
+        jumps = SQ_JumpMapHandler(grid, W, H)
+        rigid = [lid for lid, cost in enumerate(grid) if cost == -1]
+        for n in xrange(5):
+            start, goal = rnd.sample(rigid, 2)
+            jumps.openCells((start, goal))
+            opened = list(grid)
+            opened[start] = opened[goal] = 1
+            check(jumps, opened, start, goal)
+            assert jumps._jumps == SQ_JumpMapHandler(opened, W, H)._jumps
+        jumps.openCells(())
+        assert jumps._jumps == SQ_JumpMapHandler(grid, W, H)._jumps
@@ -0,0 +1,44 @@
+""" Terrain of game area """
+import os
+
+import pytest
+
+import resources
+from culling import Culler
+from gamecontext import GameContext
+from landscape import Terrain, Sand, TERRAIN_CODES
+from pixelcache import PixelCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def load(tmpdir, monkeypatch):
+    """ Load resources only of map with given landscapes """
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(resources, 'pixel_cache', PixelCache(resources.RESOURCES_DIR, str(tmpdir)))
+    monkeypatch.setattr(GameContext, 'resources', {})
+    monkeypatch.setattr(GameContext, 'water_animation', None)
+
+    def load(landscapes):
+        map_data = {}, landscapes, [], [], [], None, None
+        resources.load_resources(GameContext, resources.map_assets(map_data))
+    return load
+
+
+def test_map_without_water(load):
+    landscapes = [[None, 'sand', 'hole'], ['grass', 'sand', None]]
+    load(landscapes)
+    assert 'water' not in GameContext.resources['textures']
+    terrain = Terrain(landscapes, Culler())
+    assert GameContext.water_animation is None
+    assert isinstance(terrain.get(0, 1), Sand)
+
+
+def test_map_with_water(load):
+    landscapes = [['water', None], [None, 'water']]
+    load(landscapes)
+    terrain = Terrain(landscapes, Culler())
+    assert GameContext.water_animation is not None
+    assert terrain.codes.tolist() == [TERRAIN_CODES['water'], 0, 0, TERRAIN_CODES['water']]
+    GameContext.water_animation.stop_animation()
@@ -0,0 +1,47 @@
+""" Rendering of dynamic objects between simulation steps """
+import pytest
+
+phy = pytest.importorskip('cymunk')
+
+from physics import DynamicObject
+from sprite import Sprite
+
+
+class Obj(object):
+    """ Dynamic object without shape and game context """
+
+    def __init__(self, pos, rotatable=True):
+        self.body = phy.Body(1, 1)
+        self.body.position = pos
+        self.widget = Sprite(size=(10, 10), rotatable=rotatable)
+        self._shown = None
+        self.save_state()
+
+    save_state = DynamicObject.save_state.__func__
+    render = DynamicObject.render.__func__
+
+
+def test_widget_is_changed_only_with_state():
+    obj = Obj((10, 10))
+    assert obj.render(0.5)
+    assert obj.widget.center == (10, 10)
+    # nothing is moved
+    assert not obj.render(0.5)
+    assert not obj.render(1.)
+    obj.body.position = (20, 10)
+    assert obj.render(0.5)
+    assert obj.widget.center == (15, 10)
+    assert not obj.render(0.5)
+    assert obj.render(1.)
+    assert obj.widget.center == (20, 10)
+
+
+def test_rotation_is_interpolated():
+    obj = Obj((10, 10))
+    obj.body.angle = 1.
+    assert obj.render(0.5)
+    assert obj.widget.rotation == pytest.approx(28.6479, abs=1e-4)
+    obj = Obj((10, 10), rotatable=False)
+    obj.body.angle = 1.
+    assert obj.render(0.5)
+    assert not obj.render(0.5)
@@ -0,0 +1,128 @@
+""" Disk cache of decoded pixels """
+import json
+import os
+
+import pytest
+
+import pixelcache
+from backend import Texture
+from pixelcache import PixelCache, PixelData, make_texture
+
+# 2x2 RGBA image with rows padded to 3 pixels
+PIXELS = ''.join(chr(n) for n in xrange(24))
+
+
+@pytest.fixture
+def decoded(monkeypatch):
+    """ Paths of decoded images, decoding of PNG is replaced by stub """
+    paths = []
+
+    def decode(filename):
+        paths.append(os.path.basename(filename))
+        return PixelData(2, 2, 'rgba', PIXELS, True, 3)
+
+    monkeypatch.setattr(pixelcache, '_decode', decode)
+    return paths
+
+
+@pytest.fixture
+def root(tmpdir):
+    images = tmpdir.mkdir('images')
+    images.join('a.png').write('image a')
+    images.join('b.png').write('image a')
+    images.join('c.png').write('image c')
+    return images
+
+
+def make_cache(root):
+    return PixelCache(str(root), str(root.join('.pixels')))
+
+
+def test_pixels_are_decoded_once(root, decoded):
+    cache = make_cache(root)
+    pixels = cache.load('a.png')
+    assert decoded == ['a.png']
+    assert pixels.data == PIXELS
+    cache.flush()
+    # the next launch
+    pixels = make_cache(root).load('a.png')
+    assert decoded == ['a.png']
+    assert pixels.data[:] == PIXELS
+    assert (pixels.width, pixels.height, pixels.fmt) == (2, 2, 'rgba')
+    assert pixels.flip and pixels.rowlength == 3
+
+
+def test_same_images_are_shared(root, decoded):
+    cache = make_cache(root)
+    assert cache.canonical('b.png') == 'b.png'
+    assert cache.canonical('a.png') == 'b.png'
+    assert cache.canonical('c.png') == 'c.png'
+    cache.load('a.png')
+    assert cache.load('b.png').rowlength == 3
+    assert decoded == ['a.png']
+
+
+def test_changed_image_is_decoded_again(root, decoded):
+    cache = make_cache(root)
+    cache.load('c.png')
+    root.join('c.png').write('new image c')
+    cache.load('c.png')
+    assert decoded == ['c.png', 'c.png']
+
+
+def test_old_entries_are_decoded_again(root, decoded):
+    cache = make_cache(root)
+    cache.load('a.png')
+    cache.flush()
+    index = root.join('.pixels', PixelCache.INDEX)
+    entries = json.loads(index.read())
+    del entries['a.png']['rowlength']
+    index.write(json.dumps(entries))
+    assert make_cache(root).load('a.png').rowlength == 3
+    assert decoded == ['a.png', 'a.png']
+
+
+def test_unwritable_directory(root, decoded):
+    root.join('.pixels').write('')
+    cache = PixelCache(str(root), str(root.join('.pixels', 'cache')))
+    assert cache.load('a.png').data == PIXELS
+    cache.flush()
+    assert cache.load('a.png').data == PIXELS
+    assert decoded == ['a.png', 'a.png']
+
+
+def test_texture_gets_row_length(monkeypatch):
+    blits = []
+
+    class RecordingTexture(Texture):
+
+        def blit_buffer(self, pbuffer, **kw):
+            blits.append((pbuffer, kw))
+
+    monkeypatch.setattr(pixelcache, 'Texture', RecordingTexture)
+    texture = make_texture(PixelData(2, 2, 'rgba', PIXELS, True, 3))
+    assert texture.size == (2, 2)
+    assert blits == [(PIXELS, dict(colorfmt='rgba', bufferfmt='ubyte', rowlength=3))]
+    # texture is flipped
+    assert texture.uvsize[1] < 0
+
+
+def test_loader_without_image_data(root, monkeypatch):
+    class Image(object):
+        texture = Texture((2, 2))
+
+    class Loader(object):
+
+        @staticmethod
+        def load(filename):
+            return Image()
+
+    monkeypatch.setattr(pixelcache, 'ImageLoader', Loader)
+    cache = make_cache(root)
+    pixels = cache.load('a.png')
+    assert pixels.data is None and pixels.filename == str(root.join('a.png'))
+    cache.flush()
+    # pixels aren't stored, image is loaded from file the next time too
+    assert not root.join('.pixels').listdir('*.raw')
+    assert make_cache(root).load('a.png').filename == pixels.filename
+    assert make_texture(pixels) is Image.texture
@@ -0,0 +1,55 @@
+""" Budgeted cache of textures """
+import os
+
+import resources
+from backend import Texture
+from pixelcache import PixelCache
+from resources import TextureCache, texture_size
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_cache(budget=3 * 16 * 16 * 4):
+    """ Cache with 16x16 textures at paths a, b and c """
+    cache = TextureCache(budget)
+    for path in 'abc':
+        cache.put(path, Texture((16, 16)))
+    return cache
+
+
+def test_size():
+    cache = make_cache()
+    assert cache.size == 3 * texture_size(Texture((16, 16)))
+    # texture replaced by the other one
+    cache.put('a', Texture((32, 16)))
+    assert cache.size == 4 * 16 * 16 * 4
+    cache.clear()
+    assert cache.size == 0 and 'a' not in cache
+
+
+def test_least_recently_used_are_evicted():
+    cache = make_cache()
+    cache.get('a')
+    cache.put('d', Texture((16, 16)))
+    cache.trim()
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache and 'd' in cache
+    assert cache.size <= cache.budget
+
+
+def test_kept_textures_are_not_evicted():
+    cache = make_cache(16 * 16 * 4)
+    cache.trim(keep=('a', 'b'))
+    assert 'a' in cache and 'b' in cache and 'c' not in cache
+    # budget is exceeded by textures which are kept
+    assert cache.size == 2 * 16 * 16 * 4
+
+
+def test_missing_texture_is_loaded(tmpdir, monkeypatch):
+    monkeypatch.setattr(resources, 'pixel_cache',
+                        PixelCache(os.path.join(ROOT, 'resources'), str(tmpdir)))
+    cache = make_cache()
+    texture = cache.get('96.png')
+    assert '96.png' in cache
+    assert cache.get('96.png') is texture
+    assert cache.size == 3 * 16 * 16 * 4 + texture_size(texture)
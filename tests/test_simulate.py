@@ -0,0 +1,17 @@
+""" Headless rounds of the game (see simulate.py) """
+import os
+
+import pytest
+
+pytest.importorskip('cymunk')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_round_finishes(monkeypatch):
+    # resources are found relative to directory of the game
+    monkeypatch.chdir(ROOT)
+    from simulate import simulate
+    result = simulate('test.map')
+    assert result['finished']
+    assert result['frames'] > 0
@@ -0,0 +1,33 @@
+""" Sprites of game objects """
+import pytest
+
+from backend import PushMatrix, PopMatrix, Translate, Rotate
+from sprite import Sprite
+
+
+def test_static_sprite():
+    sprite = Sprite(pos=(10, 20), size=(30, 40))
+    assert (sprite.x, sprite.y, sprite.width, sprite.height) == (10, 20, 30, 40)
+    assert sprite.center == (25, 40)
+    sprite.center = 45, 60
+    assert sprite.pos == (30, 40)
+    assert not sprite.rotatable
+    assert sprite.canvas.before.children == [] and sprite.canvas.after.children == []
+    with pytest.raises(AttributeError):
+        sprite.rotation
+
+
+def test_rotatable_sprite():
+    sprite = Sprite(pos=(10, 20), size=(30, 40), rotatable=True)
+    assert sprite.rotatable
+    push, translate, rotate, corner = sprite.canvas.before.children
+    assert isinstance(push, PushMatrix) and isinstance(rotate, Rotate)
+    pop, = sprite.canvas.after.children
+    assert isinstance(pop, PopMatrix)
+    # instructions are drawn relative to left bottom corner of sprite
+    assert isinstance(corner, Translate) and corner.xy == (-15, -20)
+    assert translate.xy == (25, 40)
+    sprite.center = 45, 60
+    sprite.rotation = 90
+    assert sprite.pos == (30, 40)
+    assert translate.xy == (45, 60) and rotate.angle == sprite.rotation == 90
@@ -0,0 +1,130 @@
+""" Versions and log of changes of the walk map """
+import pytest
+
+phy = pytest.importorskip('cymunk')
+
+from utils.astar import AStar, SQ_Location, SQ_JumpMapHandler
+from walkmap import WalkMap, FlowFields, JumpMaps
+
+
+def make_walkmap(width=8, height=6):
+    walkmap = WalkMap(phy.Space(), width, height)
+    # empty space, all cells are free
+    walkmap.flush()
+    return walkmap
+
+
+def occupy(walkmap, masks):
+    """ Set masks of cells as if objects were there """
+    walkmap._query = lambda idx: masks.get(idx, 0)
+    walkmap._dirty.update(xrange(walkmap.w * walkmap.h))
+    walkmap.flush()
+
+
+def test_empty_space_makes_no_changes():
+    walkmap = make_walkmap()
+    assert walkmap.version == 0
+    assert walkmap.changes_since(0) == set()
+
+
+def test_changes_since_version():
+    walkmap = make_walkmap()
+    rock = walkmap.bit('Rock')
+    occupy(walkmap, {3: rock})
+    first = walkmap.version
+    occupy(walkmap, {10: rock, 11: rock})
+    assert walkmap.version == first + 1
+    assert walkmap.changes_since(0) == set([3, 10, 11])
+    assert walkmap.changes_since(first) == set([3, 10, 11])
+    assert walkmap.changes_since(walkmap.version) == set()
+    assert walkmap.changed_since(10, first)
+    assert not walkmap.changed_since(4, 0)
+
+
+def test_same_cells_keep_version():
+    walkmap = make_walkmap()
+    rock = walkmap.bit('Rock')
+    occupy(walkmap, {3: rock})
+    version = walkmap.version
+    occupy(walkmap, {3: rock})
+    assert walkmap.version == version
+
+
+def test_changes_since_overflow(monkeypatch):
+    monkeypatch.setattr(WalkMap, 'LOG_SIZE', 10)
+    walkmap = make_walkmap()
+    rock = walkmap.bit('Rock')
+    versions = []
+    for n in xrange(8):
+        occupy(walkmap, {n: rock, n + 8: rock})
+        versions.append(walkmap.version)
+    # old changes were dropped from the log
+    assert len(walkmap._log) <= WalkMap.LOG_SIZE
+    assert walkmap.changes_since(0) is None
+    assert walkmap.changes_since(versions[0]) is None
+    # recent ones are still there
+    assert walkmap.changes_since(versions[-2]) == set([6, 14, 7, 15])
+    assert walkmap.changes_since(versions[-1]) == set()
+
+
+def test_view():
+    walkmap = make_walkmap(3, 2)
+    rock = walkmap.bit('Rock')
+    occupy(walkmap, {1: rock, 2: walkmap.bit('Tree')})
+    view = walkmap.view(walkmap.mask_for(['Rock']))
+    assert [view[idx] for idx in xrange(len(view))] == [1, 1, -1, 1, 1, 1]
+    view = walkmap.view(0, open_cells=(1,))
+    assert [view[idx] for idx in xrange(len(view))] == [1, 1, -1, 1, 1, 1]
+    assert walkmap.free_cells(0) == [1, 0, 0, 1, 1, 1]
+
+
+def test_flow_fields_are_shared_until_changed():
+    walkmap = make_walkmap()
+    rock = walkmap.bit('Rock')
+    hare = walkmap.mask_for(['Rock'])
+    fields = FlowFields(walkmap)
+    field = fields.get((7, 5), 0)
+    assert fields.get((7, 5), 0) is field
+    assert fields.get((7, 5), hare) is not field
+    assert fields.builds == 2 and fields.hits == 1
+    # rock is passable for hare, so its field is still actual
+    hare_field = fields.get((7, 5), hare)
+    occupy(walkmap, {3: rock, 11: rock})
+    assert fields.get((7, 5), hare) is hare_field
+    field = fields.get((7, 5), 0)
+    assert field.free[3] == field.free[11] == 0
+    assert fields.builds == 3
+    # field of the goal is the same if only the goal cell is changed
+    occupy(walkmap, {3: rock, 11: rock, 47: rock})
+    assert fields.get((7, 5), 0) is field
+
+
+def test_flow_fields_after_overflow(monkeypatch):
+    monkeypatch.setattr(WalkMap, 'LOG_SIZE', 4)
+    walkmap = make_walkmap()
+    rock = walkmap.bit('Rock')
+    fields = FlowFields(walkmap)
+    field = fields.get((0, 0), 0)
+    occupy(walkmap, dict((idx, rock) for idx in xrange(20, 30)))
+    # changes which field was built from are not kept
+    assert walkmap.changes_since(field.version) is None
+    assert fields.get((0, 0), 0) is not field
+
+
+def test_jump_maps_are_updated():
+    walkmap = make_walkmap()
+    rock = walkmap.bit('Rock')
+    maps = JumpMaps(walkmap)
+    jumps = maps.get(0)
+    assert maps.get(0) is jumps
+    path = AStar(jumps).findPath(SQ_Location(0, 0), SQ_Location(7, 0))
+    assert path.getTotalMoveCost() == 8
+    # wall across rows 0 and 1
+    occupy(walkmap, {3: rock, 11: rock})
+    assert maps.get(0) is jumps
+    assert jumps._jumps == SQ_JumpMapHandler(jumps.m, 8, 6)._jumps
+    path = AStar(jumps).findPath(SQ_Location(0, 0), SQ_Location(7, 0))
+    assert path.getTotalMoveCost() == 12
+    # rocks are passable for characters which may go through them
+    path = AStar(maps.get(rock)).findPath(SQ_Location(0, 0), SQ_Location(7, 0))
+    assert path.getTotalMoveCost() == 8
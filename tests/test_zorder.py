@@ -0,0 +1,105 @@
+""" Drawing order of static objects """
+import random
+
+from backend import Canvas
+from sprite import Sprite
+from zorder import ZOrder
+
+
+class Static(object):
+
+    def __init__(self, canvas, y):
+        self.widget = Sprite(pos=(0, y))
+        canvas.add(self.widget.canvas)
+
+
+def drawn(zorder):
+    """ Canvases of objects in order they are drawn """
+    return [canvas for bucket in zorder.layer.children for canvas in bucket.children]
+
+
+def test_lower_objects_are_drawn_later():
+    canvas = Canvas()
+    zorder = ZOrder(canvas)
+    rnd = random.Random(0)
+    objs = [Static(canvas, rnd.choice(xrange(0, 400, 20))) for n in xrange(50)]
+    for obj in objs:
+        zorder.add(obj)
+    assert canvas.children == []
+    ys = [obj.widget.y for obj in objs]
+    order = dict((obj.widget.canvas, obj.widget.y) for obj in objs)
+    assert [order[c] for c in drawn(zorder)] == sorted(ys, reverse=True)
+    # one bucket per row
+    assert len(zorder.layer.children) == len(set(ys))
+    assert zorder.bucket(ys[0]) is zorder.bucket(ys[0])
+
+
+def test_bottom_and_restore():
+    canvas = Canvas()
+    zorder = ZOrder(canvas)
+    upper, lower = Static(canvas, 100), Static(canvas, 20)
+    zorder.add(upper)
+    zorder.add(lower)
+    zorder.move_to_bottom(lower)
+    zorder.move_to_bottom(lower)
+    assert zorder.bottom.children == [lower.widget.canvas]
+    assert drawn(zorder) == [upper.widget.canvas]
+    zorder.restore(lower)
+    zorder.restore(lower)
+    assert zorder.bottom.children == []
+    assert drawn(zorder) == [upper.widget.canvas, lower.widget.canvas]
+
+
+def test_restore_of_object_in_place():
+    canvas = Canvas()
+    zorder = ZOrder(canvas)
+    obj = Static(canvas, 40)
+    zorder.add(obj)
+    zorder.restore(obj)
+    assert drawn(zorder) == [obj.widget.canvas]
+
+
+class Dynamic(object):
+
+    def __init__(self, canvas):
+        self.widget = Sprite(pos=(0, 0))
+        canvas.add(self.widget.canvas)
+
+
+def test_hidden_objects_keep_their_place():
+    canvas = Canvas()
+    zorder = ZOrder(canvas)
+    upper, middle, lower = [Static(canvas, y) for y in (100, 60, 20)]
+    for obj in upper, middle, lower:
+        zorder.add(obj)
+    dynamics = [Dynamic(canvas) for n in xrange(4)]
+    for obj in dynamics:
+        zorder.add_dynamic(obj)
+    assert canvas.children == []
+    for obj in middle, dynamics[1], dynamics[2]:
+        zorder.hide(obj)
+        zorder.hide(obj)
+    assert drawn(zorder) == [upper.widget.canvas, lower.widget.canvas]
+    assert zorder.dynamic.children == [dynamics[0].widget.canvas, dynamics[3].widget.canvas]
+    for obj in dynamics[2], middle, dynamics[1]:
+        zorder.show(obj)
+        zorder.show(obj)
+    assert drawn(zorder) == [obj.widget.canvas for obj in (upper, middle, lower)]
+    assert zorder.dynamic.children == [obj.widget.canvas for obj in dynamics]
+
+
+def test_hidden_object_is_moved_to_bottom():
+    canvas = Canvas()
+    zorder = ZOrder(canvas)
+    obj = Static(canvas, 40)
+    zorder.add(obj)
+    zorder.hide(obj)
+    zorder.move_to_bottom(obj)
+    assert zorder.bottom.children == [] and drawn(zorder) == []
+    zorder.show(obj)
+    assert zorder.bottom.children == [obj.widget.canvas]
+    zorder.hide(obj)
+    zorder.restore(obj)
+    assert zorder.bottom.children == [] and drawn(zorder) == []
+    zorder.show(obj)
+    assert drawn(zorder) == [obj.widget.canvas]
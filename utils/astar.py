@@ -3,6 +3,19 @@
 # Changes in 1.1: 
 # In order to optimize the list handling I implemented the location id (lid) attribute.
 # This will make the all list serahces to become extremely more optimized.
+#
+# Changes in 1.2:
+# Open list is a binary heap and closed list is a bitmap indexed by lid.
+# Map handler should provide getLid, getLocation, getAdjacent, heuristic
+# and getSize methods.
+#
+# Changes in 1.3:
+# getAdjacent gets parent of the node and the destination, so map handler
+# may return far successors (see SQ_JumpMapHandler). Cells between node
+# and its parent are taken from getBetween method if handler provides it.
+
+import heapq
+from array import array
 
 class Path:
     def __init__(self,nodes, totalCost):
@@ -23,7 +36,9 @@ class Path:
             return None
         return node
 
-class Node:
+class Node(object):
+    __slots__ = ('location', 'mCost', 'parent', 'score', 'lid')
+
     def __init__(self,location,mCost,lid,parent=None):
         self.location = location # where is this node located
         self.mCost = mCost # total move cost to reach this node
@@ -38,85 +53,82 @@ class Node:
             return 0
 
 class AStar:
+    """
+    A* search over location ids of the map handler. Open list is a binary
+    heap with lazy deletion, closed list is a bitmap indexed by lid and
+    search state is kept in dicts, so no nodes are created until the
+    path is traced.
+    """
 
     def __init__(self,maphandler):
         self.mh = maphandler
-                
-    def _getBestOpenNode(self):
-        bestNode = None        
-        for n in self.on:
-            if not bestNode:
-                bestNode = n
-            else:
-                if n.score<=bestNode.score:
-                    bestNode = n
-        return bestNode
-
-    def _tracePath(self,n):
-        nodes = [];
-        totalCost = n.mCost;
-        p = n.parent;
-        nodes.insert(0,n);       
-        
-        while 1:
-            if p.parent is None: 
-                break
 
-            nodes.insert(0,p)
-            p=p.parent
-        
+    def _tracePath(self,end,endCost,lid,parents,costs):
+        mh = self.mh
+        between = getattr(mh, 'getBetween', None)
+        nodes = [Node(mh.getLocation(end),endCost,end)]
+        totalCost = endCost
+        to = end
+        while True:
+            if between is not None:
+                # cells between jump points are plain ones
+                cost = costs[lid] + len(between(lid, to))
+                for blid in reversed(between(lid, to)):
+                    nodes.append(Node(mh.getLocation(blid),cost,blid))
+                    cost -= 1
+            if parents[lid] is None:
+                break
+            nodes.append(Node(mh.getLocation(lid),costs[lid],lid))
+            to = lid
+            lid = parents[lid]
+        nodes.reverse()
+        for i in xrange(1, len(nodes)):
+            nodes[i].parent = nodes[i - 1]
         return Path(nodes,totalCost)
 
-    def _handleNode(self,node,end):        
-        i = self.o.index(node.lid)
-        self.on.pop(i)
-        self.o.pop(i)
-        self.c.append(node.lid)
-
-        nodes = self.mh.getAdjacentNodes(node,end)
-                   
-        for n in nodes:
-            if n.location == end:
-                # reached the destination
-                return n
-            elif n.lid in self.c:
-                # already in close, skip this
-                continue
-            elif n.lid in self.o:
-                # already in open, check if better score
-                i = self.o.index(n.lid)
-                on = self.on[i];
-                if n.mCost<on.mCost:
-                    self.on.pop(i);
-                    self.o.pop(i);
-                    self.on.append(n);
-                    self.o.append(n.lid);
-            else:
-                # new node, append to open list
-                self.on.append(n);                
-                self.o.append(n.lid);
-
-        return None
-
     def findPath(self,fromlocation, tolocation):
-        self.o = []
-        self.on = []
-        self.c = []
-
-        end = tolocation
-        fnode = self.mh.getNode(fromlocation)
+        mh = self.mh
+        fnode = mh.getNode(fromlocation)
         if not fnode:
             return None
-        self.on.append(fnode)
-        self.o.append(fnode.lid)
-        nextNode = fnode 
-               
-        while nextNode is not None: 
-            finish = self._handleNode(nextNode,end)
-            if finish:                
-                return self._tracePath(finish)
-            nextNode=self._getBestOpenNode()
-                
+        end = mh.getLid(tolocation)
+        if end is None:
+            return None
+
+        start = fnode.lid
+        closed = bytearray(mh.getSize())
+        costs = {start: fnode.mCost}
+        parents = {start: None}
+        # heap entries are (score, -order, lid), so between nodes with
+        # equal score the latest added one is taken first
+        order = 0
+        heap = [(0, 0, start)]
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        adjacent = mh.getAdjacent
+        heuristic = mh.heuristic
+
+        while heap:
+            score, _order, lid = heappop(heap)
+            if closed[lid]:
+                # stale entry of already handled node
+                continue
+            closed[lid] = 1
+            cost = costs[lid]
+            for nlid, ncost in adjacent(lid, parents[lid], end):
+                ncost += cost
+                if nlid == end:
+                    # reached the destination
+                    return self._tracePath(nlid,ncost,lid,parents,costs)
+                if closed[nlid]:
+                    continue
+                if nlid in costs and costs[nlid] <= ncost:
+                    continue
+                costs[nlid] = ncost
+                parents[nlid] = lid
+                order -= 1
+                heappush(heap, (ncost + heuristic(nlid, end), order, nlid))
+
         return None
       
 class SQ_Location:
@@ -143,6 +155,55 @@ class SQ_MapHandler:
         self.w = width
         self.h = height
 
+    def getSize(self):
+        """MUST BE IMPLEMENTED"""
+        return self.w*self.h
+
+    def getLid(self, location):
+        """MUST BE IMPLEMENTED"""
+        x = location.x
+        y = location.y
+        if x<0 or x>=self.w or y<0 or y>=self.h:
+            return None
+        lid = (y*self.w)+x
+        if self.m[lid] == -1:
+            return None
+        return lid
+
+    def getLocation(self, lid):
+        """MUST BE IMPLEMENTED"""
+        y, x = divmod(lid, self.w)
+        return SQ_Location(x,y)
+
+    def getAdjacent(self, lid, parent=None, end=None):
+        """MUST BE IMPLEMENTED
+
+        Returns list of (lid, move cost) for passable neighbours
+        """
+        m = self.m
+        w = self.w
+        y, x = divmod(lid, w)
+        result = []
+        if x+1 < w:
+            d = m[lid+1]
+            if d != -1: result.append((lid+1, d))
+        if x > 0:
+            d = m[lid-1]
+            if d != -1: result.append((lid-1, d))
+        if y+1 < self.h:
+            d = m[lid+w]
+            if d != -1: result.append((lid+w, d))
+        if y > 0:
+            d = m[lid-w]
+            if d != -1: result.append((lid-w, d))
+        return result
+
+    def heuristic(self, lid, destlid):
+        """MUST BE IMPLEMENTED"""
+        y, x = divmod(lid, self.w)
+        dy, dx = divmod(destlid, self.w)
+        return abs(x-dx) + abs(y-dy)
+
     def getNode(self, location):
         """MUST BE IMPLEMENTED"""
         x = location.x
@@ -184,4 +245,187 @@ class SQ_MapHandler:
             n.parent=fromnode
             return n
 
-        return None  
\ No newline at end of file
+        return None  
+
+
+class SQ_JumpMapHandler(SQ_MapHandler):
+    """
+    Square map for Jump Point Search (JPS+) on 4-connected grid.
+
+    Runs of plain cells (with cost 1) are skipped: successors of the node
+    are only the next jump points in each direction. Horizontal run stops
+    at a cell which has passable vertical neighbour behind an obstacle
+    (forced neighbour), vertical run stops at a cell from which horizontal
+    run finds a jump point. Cells with other costs are always jump points,
+    so around them search falls back to normal expansion.
+
+    Distances to jump points are precomputed for each cell and direction
+    and are updated by updateCells only for rows and columns they depend
+    on. Rigid start and goal cells should be opened with openCells before
+    the search.
+    """
+
+    def __init__(self,mapdata,width,height):
+        SQ_MapHandler.__init__(self,mapdata,width,height)
+        self._open = ()
+        self.rebuild()
+
+    def rebuild(self):
+        """ Compute jump tables for the whole map """
+        # jumps[d][lid] for directions right, left, up, down: k > 0 - jump
+        # point after k steps, k <= 0 - -k plain cells before obstacle
+        size = self.w*self.h
+        self._jumps = [array('i', [0])*size for d in xrange(4)]
+        for y in xrange(self.h):
+            self._buildRow(y)
+        for x in xrange(self.w):
+            self._buildColumn(x)
+
+    def _cost(self, lid):
+        d = self.m[lid]
+        if d == -1 and lid in self._open:
+            return 1
+        return d
+
+    def openCells(self, lids):
+        """ Make rigid cells passable until the next call """
+        if set(lids) == set(self._open):
+            return
+        old = self._open
+        self._open = tuple(lids)
+        m = self.m
+        self.updateCells([lid for lid in set(old) ^ set(lids) if m[lid] == -1])
+
+    def _forced(self, lid, back):
+        """ Check if cell has forced neighbour for horizontal run """
+        cost = self._cost
+        w = self.w
+        y = lid / w
+        for side, inside in ((w, y+1 < self.h), (-w, y > 0)):
+            if inside:
+                d = cost(lid+side)
+                if d != -1 and (d != 1 or cost(lid+side+back) != 1):
+                    return True
+        return False
+
+    def _buildRow(self, y):
+        """ Compute horizontal jumps of the row, returns columns which changed """
+        cost = self._cost
+        w = self.w
+        right, left = self._jumps[0], self._jumps[1]
+        row = y*w
+        before = [right[row+x] > 0 or left[row+x] > 0 for x in xrange(w)]
+        for step, table, xs in ((1, right, xrange(w-1, -1, -1)), (-1, left, xrange(w))):
+            for x in xs:
+                lid = row + x
+                n = lid + step
+                if x+step < 0 or x+step >= w:
+                    j = 0
+                else:
+                    d = cost(n)
+                    if d == -1:
+                        j = 0
+                    elif d != 1 or self._forced(n, -step):
+                        j = 1
+                    else:
+                        j = table[n]
+                        j = j+1 if j > 0 else j-1
+                table[lid] = j
+        return [x for x in xrange(w) if before[x] != (right[row+x] > 0 or left[row+x] > 0)]
+
+    def _buildColumn(self, x):
+        cost = self._cost
+        w = self.w
+        h = self.h
+        right, left, up, down = self._jumps
+        for dy, table, ys in ((1, up, xrange(h-1, -1, -1)), (-1, down, xrange(h))):
+            for y in ys:
+                lid = y*w + x
+                n = lid + dy*w
+                if y+dy < 0 or y+dy >= h:
+                    j = 0
+                else:
+                    d = cost(n)
+                    if d == -1:
+                        j = 0
+                    elif d != 1 or right[n] > 0 or left[n] > 0:
+                        j = 1
+                    else:
+                        j = table[n]
+                        j = j+1 if j > 0 else j-1
+                table[lid] = j
+
+    def updateCells(self, lids):
+        """ Notify that cost of cells with given lids was changed """
+        rows = set()
+        columns = set()
+        for lid in lids:
+            y, x = divmod(lid, self.w)
+            columns.add(x)
+            rows.update(r for r in (y-1, y, y+1) if 0 <= r < self.h)
+        for y in rows:
+            columns.update(self._buildRow(y))
+        for x in columns:
+            self._buildColumn(x)
+
+    def getLid(self, location):
+        x = location.x
+        y = location.y
+        if x<0 or x>=self.w or y<0 or y>=self.h:
+            return None
+        lid = (y*self.w)+x
+        if self._cost(lid) == -1:
+            return None
+        return lid
+
+    def getNode(self, location):
+        lid = self.getLid(location)
+        if lid is None:
+            return None
+        return Node(location,self._cost(lid),lid)
+
+    def getAdjacent(self, lid, parent=None, end=None):
+        w = self.w
+        y, x = divmod(lid, w)
+        if end is not None:
+            ey, ex = divmod(end, w)
+        else:
+            ey = ex = -1
+        back = None
+        if parent is not None:
+            if parent / w == y:
+                back = 1 if parent > lid else -1
+            else:
+                back = w if parent > lid else -w
+        result = []
+        for d, step in enumerate((1, -1, w, -w)):
+            if step == back:
+                continue
+            j = self._jumps[d][lid]
+            # steps to the last plain cell or to the jump point
+            reach = j if j > 0 else -j
+            if d < 2:
+                s = (ex - x)*step
+                inline = ey == y
+            else:
+                s = (ey - y)*step/w
+                inline = ex == x
+            if 0 < s <= reach:
+                if inline:
+                    result.append((end, s-1 + self._cost(end)))
+                    continue
+                if s < reach or j <= 0:
+                    # stop on the row (column) of the goal
+                    result.append((lid + s*step, s))
+                    continue
+            if j > 0:
+                result.append((lid + j*step, j-1 + self._cost(lid + j*step)))
+        return result
+
+    def getBetween(self, lid, to):
+        """ Get cells between two jump points on the same line """
+        if to/self.w == lid/self.w:
+            step = 1 if to > lid else -1
+        else:
+            step = self.w if to > lid else -self.w
+        return range(lid+step, to, step)
@@ -0,0 +1,293 @@
+# Incremental planner for square maps (Moving Target D* Lite)
+#
+# Search is rooted in the hunter and keeps its state between calls of
+# findPath:
+#  - when cells of the map are changed only vertices around them are
+#    updated (as in LPA* / D* Lite);
+#  - when the goal moves its heuristic shift is accumulated in km, so the
+#    open list is not reordered (as in D* Lite);
+#  - when the hunter moves along its path, the subtree of the search tree
+#    rooted in the new start is kept and only the rest of the tree is
+#    rebuilt (as in Moving Target D* Lite).
+#
+# Map handler is the same as for AStar (see SQ_MapHandler): it should
+# provide w, h and m attributes, where m[lid] is the cost to enter
+# the cell or -1 if cell is rigid.
+
+import heapq
+from utils.astar import Path, Node, SQ_Location
+
+INF = float('inf')
+
+
+class DStarLite(object):
+
+    def __init__(self, maphandler):
+        self.mh = maphandler
+        self.expanded = 0 # number of expanded nodes during last call
+        self.reset()
+
+    def reset(self):
+        """ Forget all search state """
+        self._start = None
+        self._goal = None
+        self._km = 0
+        self._g = {}
+        self._rhs = {}
+        self._parent = {}
+        self._queue = []
+        self._inq = {}
+
+    # map helpers
+
+    def _lid(self, location):
+        x = location.x
+        y = location.y
+        if x<0 or x>=self.mh.w or y<0 or y>=self.mh.h:
+            return None
+        return y*self.mh.w + x
+
+    def _neighbours(self, lid):
+        w = self.mh.w
+        x = lid % w
+        result = []
+        if x+1 < w: result.append(lid+1)
+        if x > 0: result.append(lid-1)
+        if lid+w < len(self.mh.m): result.append(lid+w)
+        if lid >= w: result.append(lid-w)
+        return result
+
+    def _h(self, a, b):
+        w = self.mh.w
+        ay, ax = divmod(a, w)
+        by, bx = divmod(b, w)
+        return abs(ax-bx) + abs(ay-by)
+
+    def _cellCost(self, lid):
+        d = self.mh.m[lid]
+        if d == -1:
+            # start and goal are always passable
+            if lid == self._start or lid == self._goal:
+                return 1
+            return INF
+        return d
+
+    # core
+
+    def _key(self, lid):
+        m = min(self._g.get(lid, INF), self._rhs.get(lid, INF))
+        return (m + self._h(lid, self._goal) + self._km, m)
+
+    def _push(self, lid):
+        key = self._key(lid)
+        self._inq[lid] = key
+        heapq.heappush(self._queue, (key, lid))
+
+    def _topKey(self):
+        queue = self._queue
+        inq = self._inq
+        while queue:
+            key, lid = queue[0]
+            if inq.get(lid) == key:
+                return key
+            # stale entry
+            heapq.heappop(queue)
+        return (INF, INF)
+
+    def _updateVertex(self, u):
+        g = self._g
+        if u != self._start:
+            best = INF
+            parent = None
+            cost = self._cellCost(u)
+            if cost != INF:
+                for s in self._neighbours(u):
+                    v = g.get(s, INF)
+                    if v < best and self._cellCost(s) != INF:
+                        best = v
+                        parent = s
+                best += cost
+            if best == INF:
+                # keep only vertices reached by search
+                self._rhs.pop(u, None)
+                self._parent.pop(u, None)
+            else:
+                self._rhs[u] = best
+                self._parent[u] = parent
+        if g.get(u, INF) != self._rhs.get(u, INF):
+            self._push(u)
+        else:
+            self._inq.pop(u, None)
+
+    def _computeShortestPath(self):
+        goal = self._goal
+        g = self._g
+        rhs = self._rhs
+        queue = self._queue
+        while True:
+            top = self._topKey()
+            if top == (INF, INF):
+                break
+            if not (top < self._key(goal) or rhs.get(goal, INF) > g.get(goal, INF)):
+                break
+            key, u = heapq.heappop(queue)
+            self.expanded += 1
+            new_key = self._key(u)
+            if key < new_key:
+                self._push(u)
+                continue
+            del self._inq[u]
+            if g.get(u, INF) > rhs.get(u, INF):
+                g[u] = rhs[u]
+            else:
+                del g[u]
+                self._updateVertex(u)
+            for s in self._neighbours(u):
+                self._updateVertex(s)
+
+    def _cellChanged(self, lid):
+        self._updateVertex(lid)
+        for s in self._neighbours(lid):
+            self._updateVertex(s)
+
+    def updateCells(self, lids):
+        """ Notify planner that cost of cells with given lids was changed """
+        if self._start is None:
+            return
+        for lid in lids:
+            self._cellChanged(lid)
+
+    def _init(self, start, goal):
+        self.reset()
+        self._start = start
+        self._goal = goal
+        self._rhs[start] = 0
+        self._parent[start] = None
+        self._push(start)
+
+    def _moveStart(self, start):
+        """
+        Reroot search tree in new start. Returns False if new start is
+        out of the search tree and search should be started from scratch.
+
+        Values of the vertices are not shifted after rerooting: all the
+        vertices of the kept subtree are measured from the old start, so
+        their keys keep the same order and open list is still valid.
+        """
+        old = self._start
+        g = self._g
+        rhs = self._rhs
+        parent = self._parent
+        base = g.get(start, INF)
+        if base == INF:
+            return False
+        # find subtree of the new start
+        children = {}
+        for s, p in parent.iteritems():
+            if p is not None:
+                children.setdefault(p, []).append(s)
+        subtree = set([start])
+        stack = [start]
+        while stack:
+            for s in children.get(stack.pop(), ()):
+                if s not in subtree:
+                    subtree.add(s)
+                    stack.append(s)
+        # forget the rest of the tree
+        deleted = []
+        for s in g.keys():
+            if s not in subtree:
+                del g[s]
+        for s in parent.keys():
+            if s not in subtree:
+                deleted.append(s)
+                del rhs[s]
+                del parent[s]
+                self._inq.pop(s, None)
+        self._start = start
+        rhs[start] = base
+        parent[start] = None
+        self._inq.pop(start, None)
+        # vertices on the border of the subtree could be reached again
+        for s in deleted:
+            for n in self._neighbours(s):
+                if n in subtree:
+                    self._updateVertex(s)
+                    break
+        # passability of old start cell could be changed
+        self._cellChanged(old)
+        return True
+
+    def _moveGoal(self, goal):
+        old = self._goal
+        self._km += self._h(old, goal)
+        self._goal = goal
+        # passability of old and new goal cells could be changed
+        self._cellChanged(old)
+        self._cellChanged(goal)
+
+    def _tracePath(self, origin):
+        """
+        Trace path from origin to the goal back by the search tree.
+        Returns None if origin is not on the way from start to the goal
+        """
+        start = self._start
+        goal = self._goal
+        g = self._g
+        if self._rhs.get(goal, INF) == INF:
+            return None
+        lids = [goal]
+        lid = self._parent.get(goal)
+        while lid is not None and lid != origin:
+            if lid == start:
+                return None
+            lids.append(lid)
+            # follow the best predecessor
+            best = INF
+            nxt = None
+            for s in self._neighbours(lid):
+                v = g.get(s, INF)
+                if v < best and self._cellCost(s) != INF:
+                    best = v
+                    nxt = s
+            lid = nxt
+            if len(lids) > len(self.mh.m):
+                return None
+        if lid is None:
+            return None
+        lids.reverse()
+        nodes = []
+        cost = self._cellCost(origin)
+        w = self.mh.w
+        for lid in lids:
+            cost += self._cellCost(lid)
+            y, x = divmod(lid, w)
+            nodes.append(Node(SQ_Location(x, y), cost, lid, nodes[-1] if nodes else None))
+        return Path(nodes, cost)
+
+    def findPath(self, fromlocation, tolocation):
+        start = self._lid(fromlocation)
+        goal = self._lid(tolocation)
+        if start is None or goal is None:
+            return None
+        self.expanded = 0
+
+        if self._start is None:
+            self._init(start, goal)
+        elif goal != self._goal:
+            self._moveGoal(goal)
+
+        if start == goal:
+            return None
+        if start != self._start:
+            # while hunter goes along the path from the root of search
+            # tree the rest of the path is the shortest one, so there is
+            # no need to reroot the tree
+            self._computeShortestPath()
+            path = self._tracePath(start)
+            if path is not None:
+                return path
+            if not self._moveStart(start):
+                self._init(start, goal)
+        self._computeShortestPath()
+        return self._tracePath(start)
@@ -0,0 +1,124 @@
+# Distance (flow) field for square maps
+#
+# Field keeps for every cell the number of steps to the goal, so all
+# characters which go to the same goal can share it: the next step of a
+# character is the neighbour cell with the lowest distance.
+#
+# Field is built with breadth-first wave over the grid of passable cells.
+# If numpy is available the wave is vectorised, otherwise plain python
+# queue is used.
+
+from collections import deque
+from utils.astar import Path, Node, SQ_Location
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+UNREACHED = -1
+
+
+class FlowField(object):
+
+    def __init__(self, free, width, height, goal):
+        """
+        free - sequence of 0/1 values for each cell of the map, where 1
+        is passable cell; goal - lid of the goal cell
+        """
+        self.w = width
+        self.h = height
+        self.goal = goal
+        self.free = bytearray(free)
+        self.free[goal] = 1
+        if numpy is not None:
+            self.dist = self._build_numpy()
+        else:
+            self.dist = self._build_python()
+
+    def _build_python(self):
+        w, h = self.w, self.h
+        free = self.free
+        dist = [UNREACHED]*(w*h)
+        dist[self.goal] = 0
+        queue = deque([self.goal])
+        while queue:
+            lid = queue.popleft()
+            d = dist[lid] + 1
+            x = lid % w
+            for n in (lid+1 if x+1 < w else -1, lid-1 if x > 0 else -1,
+                      lid+w if lid+w < w*h else -1, lid-w):
+                if n >= 0 and free[n] and dist[n] == UNREACHED:
+                    dist[n] = d
+                    queue.append(n)
+        return dist
+
+    def _build_numpy(self):
+        w, h = self.w, self.h
+        free = numpy.frombuffer(bytes(self.free), dtype=numpy.uint8).reshape(h, w) != 0
+        dist = numpy.empty((h, w), dtype=numpy.int32)
+        dist.fill(UNREACHED)
+        gy, gx = divmod(self.goal, w)
+        dist[gy, gx] = 0
+        frontier = numpy.zeros((h, w), dtype=bool)
+        frontier[gy, gx] = True
+        unvisited = free.copy()
+        unvisited[gy, gx] = False
+        d = 0
+        while frontier.any():
+            d += 1
+            wave = numpy.zeros((h, w), dtype=bool)
+            wave[1:, :] |= frontier[:-1, :]
+            wave[:-1, :] |= frontier[1:, :]
+            wave[:, 1:] |= frontier[:, :-1]
+            wave[:, :-1] |= frontier[:, 1:]
+            wave &= unvisited
+            dist[wave] = d
+            unvisited &= ~wave
+            frontier = wave
+        return dist.ravel().tolist()
+
+    def _neighbours(self, lid):
+        w = self.w
+        x = lid % w
+        result = []
+        if x+1 < w: result.append(lid+1)
+        if x > 0: result.append(lid-1)
+        if lid+w < w*self.h: result.append(lid+w)
+        if lid >= w: result.append(lid-w)
+        return result
+
+    def next_step(self, lid):
+        """ Get neighbour cell with the lowest distance to the goal """
+        dist = self.dist
+        current = dist[lid]
+        best = None
+        for n in self._neighbours(lid):
+            d = dist[n]
+            if d != UNREACHED and (current == UNREACHED or d < current):
+                if best is None or d < dist[best]:
+                    best = n
+        return best
+
+    def findPath(self, fromlocation, tolocation=None):
+        """
+        Get path from location to the goal of the field in the same
+        format as AStar does. Start cell is always passable
+        """
+        x = fromlocation.x
+        y = fromlocation.y
+        if x<0 or x>=self.w or y<0 or y>=self.h:
+            return None
+        lid = y*self.w + x
+        nodes = []
+        cost = 1
+        while lid != self.goal:
+            lid = self.next_step(lid)
+            if lid is None:
+                return None
+            cost += 1
+            ly, lx = divmod(lid, self.w)
+            nodes.append(Node(SQ_Location(lx, ly), cost, lid, nodes[-1] if nodes else None))
+        if not nodes:
+            return None
+        return Path(nodes, cost)
@@ -0,0 +1,295 @@
+# Hierarchical path finding (HPA*) for square maps
+#
+# Map is split into square clusters. On the borders between neighbour
+# clusters entrances are found (runs of passable cell pairs) and every
+# entrance gives one or two transitions. Cells of transitions are nodes
+# of the abstract graph: nodes of the same cluster are connected with
+# precomputed intra-cluster distances, and cells of each transition are
+# connected with each other.
+#
+# To find a path start and goal are connected to the nodes of their
+# clusters, the abstract graph is searched and only the chosen abstract
+# path is refined into cells. When some cell is changed only its cluster
+# and neighbour clusters which share changed borders are recomputed.
+#
+# Map handler is the same as for AStar (see SQ_MapHandler): it should
+# provide w, h and m attributes, where m[lid] is the cost to enter
+# the cell or -1 if cell is rigid.
+
+import heapq
+from utils.astar import Path, Node, SQ_Location
+
+INF = float('inf')
+
+
+class HPAStar(object):
+
+    # entrances longer than this get transitions on both ends
+    MAX_ENTRANCE_WIDTH = 6
+
+    def __init__(self, maphandler, cluster_size=10):
+        self.mh = maphandler
+        self.size = cluster_size
+        self.cw = (maphandler.w + cluster_size - 1) / cluster_size
+        self.ch = (maphandler.h + cluster_size - 1) / cluster_size
+        # start and goal cells of the last search are always passable
+        self._open = ()
+        self.rebuild()
+
+    def rebuild(self):
+        """ Build abstract graph for the whole map """
+        self._borders = {}  # border key -> list of transitions (a, b)
+        self._links = {}    # node -> set of nodes in neighbour clusters
+        self._nodes = {}    # cluster -> set of nodes
+        self._intra = {}    # cluster -> {u: {v: (cost, path)}}
+        for cy in xrange(self.ch):
+            for cx in xrange(self.cw):
+                if cx+1 < self.cw:
+                    self._buildBorder(('r', cx, cy))
+                if cy+1 < self.ch:
+                    self._buildBorder(('t', cx, cy))
+        for cy in xrange(self.ch):
+            for cx in xrange(self.cw):
+                self._buildCluster((cx, cy))
+
+    # map helpers
+
+    def _cluster(self, lid):
+        y, x = divmod(lid, self.mh.w)
+        return x / self.size, y / self.size
+
+    def _bounds(self, cid):
+        x0 = cid[0]*self.size
+        y0 = cid[1]*self.size
+        return x0, y0, min(x0+self.size, self.mh.w), min(y0+self.size, self.mh.h)
+
+    def _cost(self, lid):
+        d = self.mh.m[lid]
+        if d == -1:
+            if lid in self._open:
+                return 1
+            return INF
+        return d
+
+    def _h(self, a, b):
+        w = self.mh.w
+        ay, ax = divmod(a, w)
+        by, bx = divmod(b, w)
+        return abs(ax-bx) + abs(ay-by)
+
+    # abstract graph
+
+    def _borderKeys(self, cid):
+        cx, cy = cid
+        keys = []
+        if cx+1 < self.cw: keys.append(('r', cx, cy))
+        if cx > 0: keys.append(('r', cx-1, cy))
+        if cy+1 < self.ch: keys.append(('t', cx, cy))
+        if cy > 0: keys.append(('t', cx, cy-1))
+        return keys
+
+    def _buildBorder(self, key):
+        w = self.mh.w
+        side, cx, cy = key
+        x0, y0, x1, y1 = self._bounds((cx, cy))
+        if side == 'r':
+            pairs = [(y*w + x1-1, y*w + x1) for y in xrange(y0, y1)]
+        else:
+            pairs = [((y1-1)*w + x, y1*w + x) for x in xrange(x0, x1)]
+        # unlink old transitions
+        for a, b in self._borders.get(key, ()):
+            self._links[a].discard(b)
+            self._links[b].discard(a)
+        transitions = []
+        run = []
+        for a, b in pairs + [(None, None)]:
+            if a is not None and self._cost(a) != INF and self._cost(b) != INF:
+                run.append((a, b))
+                continue
+            if run:
+                if len(run) > self.MAX_ENTRANCE_WIDTH:
+                    transitions.append(run[0])
+                    transitions.append(run[-1])
+                else:
+                    transitions.append(run[len(run) / 2])
+                run = []
+        self._borders[key] = transitions
+        for a, b in transitions:
+            self._links.setdefault(a, set()).add(b)
+            self._links.setdefault(b, set()).add(a)
+
+    def _clusterNodes(self, cid):
+        nodes = set()
+        for key in self._borderKeys(cid):
+            for a, b in self._borders[key]:
+                if self._cluster(a) == cid:
+                    nodes.add(a)
+                else:
+                    nodes.add(b)
+        return nodes
+
+    def _search(self, src, cid, reverse=False):
+        """
+        Dijkstra search inside of the cluster. Returns dicts of distances
+        and parents. In reverse mode distances are from cells to src and
+        parent is the next cell on the way to src.
+        """
+        w = self.mh.w
+        x0, y0, x1, y1 = self._bounds(cid)
+        dist = {src: 0}
+        parent = {src: None}
+        heap = [(0, src)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            y, x = divmod(u, w)
+            for nx, ny in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+                if nx < x0 or nx >= x1 or ny < y0 or ny >= y1:
+                    continue
+                v = ny*w + nx
+                c = self._cost(v)
+                if c == INF:
+                    continue
+                if reverse:
+                    c = self._cost(u)
+                nd = d + c
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+        return dist, parent
+
+    def _buildCluster(self, cid):
+        nodes = self._clusterNodes(cid)
+        intra = {}
+        for u in nodes:
+            dist, parent = self._search(u, cid)
+            edges = intra[u] = {}
+            for v in nodes:
+                if v != u and v in dist:
+                    edges[v] = (dist[v], self._trace(parent, v))
+        self._nodes[cid] = nodes
+        self._intra[cid] = intra
+
+    def _trace(self, parent, lid):
+        """ Get cells from the source of search (excluded) to lid """
+        cells = []
+        while parent[lid] is not None:
+            cells.append(lid)
+            lid = parent[lid]
+        cells.reverse()
+        return cells
+
+    def updateCells(self, lids):
+        """ Notify that cost of cells with given lids was changed """
+        dirty = set(self._cluster(lid) for lid in lids)
+        if not dirty:
+            return
+        borders = set()
+        for cid in dirty:
+            borders.update(self._borderKeys(cid))
+        for key in borders:
+            self._buildBorder(key)
+        # neighbour clusters are recomputed only if their nodes were changed
+        candidates = set(dirty)
+        for side, cx, cy in borders:
+            candidates.add((cx, cy))
+            candidates.add((cx+1, cy) if side == 'r' else (cx, cy+1))
+        for cid in candidates:
+            if cid in dirty or self._clusterNodes(cid) != self._nodes[cid]:
+                self._buildCluster(cid)
+
+    def _openCells(self, lids):
+        """ Make rigid cells passable until the next call """
+        if set(lids) == set(self._open):
+            return
+        old = self._open
+        self._open = lids
+        m = self.mh.m
+        self.updateCells([lid for lid in set(old) ^ set(lids) if m[lid] == -1])
+
+    # search
+
+    def findPath(self, fromlocation, tolocation):
+        mh = self.mh
+        for l in (fromlocation, tolocation):
+            if l.x<0 or l.x>=mh.w or l.y<0 or l.y>=mh.h:
+                return None
+        start = fromlocation.y*mh.w + fromlocation.x
+        goal = tolocation.y*mh.w + tolocation.x
+        if start == goal:
+            return None
+        self._openCells((start, goal))
+
+        # connect start and goal to the abstract graph
+        scid = self._cluster(start)
+        gcid = self._cluster(goal)
+        sdist, sparent = self._search(start, scid)
+        gdist, gparent = self._search(goal, gcid, reverse=True)
+        start_edges = dict((v, sdist[v]) for v in self._nodes[scid] if v in sdist)
+        if goal in sdist:
+            start_edges[goal] = sdist[goal]
+        goal_edges = dict((v, gdist[v]) for v in self._nodes[gcid] if v in gdist)
+
+        # search abstract graph
+        costs = {start: 0}
+        parents = {start: None}
+        # kind of abstract edge the node was reached by
+        kinds = {start: None}
+        closed = set()
+        heap = [(self._h(start, goal), start)]
+        while heap:
+            _score, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            if u == goal:
+                break
+            closed.add(u)
+            cost = costs[u]
+            if u == start:
+                edges = [(v, c, 'start') for v, c in start_edges.iteritems()]
+            else:
+                intra = self._intra[self._cluster(u)].get(u, {})
+                edges = [(v, c, 'intra') for v, (c, _p) in intra.iteritems()]
+            # start could be a transition cell itself
+            edges.extend((v, self._cost(v), 'link') for v in self._links.get(u, ()))
+            if u != start and u in goal_edges:
+                edges.append((goal, goal_edges[u], 'goal'))
+            for v, c, kind in edges:
+                nc = cost + c
+                if nc < costs.get(v, INF):
+                    costs[v] = nc
+                    parents[v] = u
+                    kinds[v] = kind
+                    heapq.heappush(heap, (nc + self._h(v, goal), v))
+        if goal not in parents:
+            return None
+
+        # refine abstract path
+        abstract = [goal]
+        while parents[abstract[-1]] is not None:
+            abstract.append(parents[abstract[-1]])
+        abstract.reverse()
+        cells = []
+        for u, v in zip(abstract, abstract[1:]):
+            kind = kinds[v]
+            if kind == 'start':
+                cells.extend(self._trace(sparent, v))
+            elif kind == 'goal':
+                lid = gparent[u]
+                while lid is not None:
+                    cells.append(lid)
+                    lid = gparent[lid]
+            elif kind == 'link':
+                cells.append(v)
+            else:
+                cells.extend(self._intra[self._cluster(u)][u][v][1])
+
+        nodes = []
+        cost = self._cost(start)
+        for lid in cells:
+            cost += self._cost(lid)
+            y, x = divmod(lid, mh.w)
+            nodes.append(Node(SQ_Location(x, y), cost, lid, nodes[-1] if nodes else None))
+        return Path(nodes, cost)
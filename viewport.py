@@ -2,6 +2,7 @@ from kivy.clock import Clock
 from kivy.core.window import Window
 from kivy.uix.scatter import ScatterPlane
 from gamecontext import GameContext
+from animation import ticker
  
  
 class Viewport(ScatterPlane):
@@ -15,6 +16,17 @@ class Viewport(ScatterPlane):
         super(Viewport, self).__init__( **kwargs)
         
         self.viewport_height = 0
+        self.bind(transform=self.update_view)
+        Window.bind(size=self.update_view)
+
+    def update_view(self, *largs):
+        """ Let animation ticker and culler know which part of scene is visible """
+        x0, y0 = self.to_local(0, 0)
+        x1, y1 = self.to_local(Window.width, Window.height)
+        view = min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+        ticker.set_view(view, self.scale)
+        if GameContext.game:
+            GameContext.game.culler.set_view(view)
 
     def collide_point(self, x, y):
         return True
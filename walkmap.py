@@ -0,0 +1,288 @@
+""" Occupancy grid of the game area used by characters path finding """
+import math
+from array import array
+from physics import phy
+from settings import BLOCK_SIZE
+from utils.flowfield import FlowField
+from utils.astar import SQ_MapHandler, SQ_JumpMapHandler
+from utils.hpastar import HPAStar
+
+
+class WalkMapView(object):
+    """
+    Read only view of the walk map for one character. Works as map data
+    for SQ_MapHandler: returns 1 for passable cell and -1 for rigid one
+    """
+
+    def __init__(self, cells, allowed, open_cells=()):
+        self._cells = cells
+        self._forbidden = ~allowed
+        self._open = open_cells
+
+    def __getitem__(self, idx):
+        if idx in self._open:
+            return 1
+        if self._cells[idx] & self._forbidden:
+            return -1
+        return 1
+
+    def __len__(self):
+        return len(self._cells)
+
+
+class WalkMap(object):
+    """
+    Keeps for every cell of the game area bitmask of object classes
+    which occupy it. Cell is recalculated with shape query only when
+    some object which covers it was added, moved or removed.
+    """
+
+    # max number of cell changes kept in the log
+    LOG_SIZE = 4096
+
+    def __init__(self, space, width, height):
+        self.space = space
+        self.w = width
+        self.h = height
+        self._cells = array('L', [0]*(width*height))
+        # version of the map is increased each time some cell is changed
+        self.version = 0
+        self._changed = array('L', [0]*(width*height))
+        # log of (version, idx) changes for incremental planners
+        self._log = []
+        self._log_start = 0
+        self._dirty = set(xrange(width*height))
+        self._bits = {}
+        self._footprints = {}
+        # probe shape is reused for all cell queries
+        self._probe_body = phy.Body()
+        self._probe = phy.Poly.create_box(self._probe_body,
+                                          (BLOCK_SIZE[0] / 2, BLOCK_SIZE[1] / 2))
+
+    def bit(self, class_name):
+        """ Get bit of the class in cell mask """
+        if class_name not in self._bits:
+            self._bits[class_name] = 1 << len(self._bits)
+        return self._bits[class_name]
+
+    def mask_for(self, class_names):
+        """ Get mask of classes character may go through """
+        mask = 0
+        for name in class_names:
+            mask |= self.bit(name)
+        return mask
+
+    def index(self, x, y):
+        return y*self.w + x
+
+    def footprint(self, obj):
+        """
+        Get range of cells (i0, j0, i1, j1) which probe of cell
+        can touch if object stays in its current position
+        """
+        pos = obj.body.position
+        size = getattr(obj, 'size', BLOCK_SIZE)
+        rx = size[0] / 2. + BLOCK_SIZE[0] / 4.
+        ry = size[1] / 2. + BLOCK_SIZE[1] / 4.
+        i0 = max(int(math.floor((pos.x - rx) / BLOCK_SIZE[0])), 0)
+        j0 = max(int(math.floor((pos.y - ry) / BLOCK_SIZE[1])), 0)
+        i1 = min(int(math.floor((pos.x + rx) / BLOCK_SIZE[0])), self.w - 1)
+        j1 = min(int(math.floor((pos.y + ry) / BLOCK_SIZE[1])), self.h - 1)
+        return i0, j0, i1, j1
+
+    def _mark_dirty(self, footprint):
+        if footprint is None:
+            return
+        i0, j0, i1, j1 = footprint
+        for j in xrange(j0, j1 + 1):
+            for i in xrange(i0, i1 + 1):
+                self._dirty.add(j*self.w + i)
+
+    def track(self, obj):
+        """ Should be called when object is added or could be moved """
+        footprint = self.footprint(obj)
+        prev = self._footprints.get(obj)
+        if footprint != prev:
+            self._mark_dirty(prev)
+            self._mark_dirty(footprint)
+            self._footprints[obj] = footprint
+
+    def invalidate(self, obj):
+        """ Should be called when shape of object was added to or removed from space """
+        self._mark_dirty(self._footprints.get(obj))
+        self.track(obj)
+
+    def _query(self, idx):
+        y, x = divmod(idx, self.w)
+        self._probe_body.position = (x + 0.5)*BLOCK_SIZE[0], (y + 0.5)*BLOCK_SIZE[1]
+        mask = 0
+        for shape in self.space.shape_query(self._probe):
+            if isinstance(shape, phy.Segment) or not hasattr(shape.body, 'data'):
+                continue
+            mask |= self.bit(shape.body.data.__class__.__name__)
+        return mask
+
+    def flush(self):
+        """ Recalculate all dirty cells """
+        if not self._dirty:
+            return
+        cells = self._cells
+        version = self.version + 1
+        changed = False
+        for idx in self._dirty:
+            mask = self._query(idx)
+            if cells[idx] != mask:
+                cells[idx] = mask
+                self._change(idx, version)
+                changed = True
+        self._dirty.clear()
+        if changed:
+            self._commit(version)
+
+    def _change(self, idx, version):
+        self._changed[idx] = version
+        self._log.append((version, idx))
+
+    def _commit(self, version):
+        self.version = version
+        if len(self._log) > self.LOG_SIZE:
+            cut = len(self._log) / 2
+            self._log_start = self._log[cut - 1][0]
+            del self._log[:cut]
+
+    def changed_since(self, idx, version):
+        """ Check if cell was changed after given version of the map """
+        return self._changed[idx] > version
+
+    def changes_since(self, version):
+        """
+        Get set of cells changed after given version of the map
+        or None if such old changes are not kept anymore
+        """
+        if version < self._log_start:
+            return None
+        result = set()
+        for v, idx in reversed(self._log):
+            if v <= version:
+                break
+            result.add(idx)
+        return result
+
+    def view(self, allowed, open_cells=()):
+        """ Get map data for character with mask of allowed classes """
+        self.flush()
+        return WalkMapView(self._cells, allowed, open_cells)
+
+    def is_free(self, idx, allowed):
+        return not self._cells[idx] & ~allowed
+
+    def free_cells(self, allowed):
+        """ Get list of 0/1 passability values of all cells """
+        self.flush()
+        forbidden = ~allowed
+        return [0 if mask & forbidden else 1 for mask in self._cells]
+
+
+class FlowFields(object):
+    """
+    Cache of flow fields shared by all characters which go to the same
+    goal with the same mask of allowed classes. Field is rebuilt only if
+    goal is moved to other cell or passability of some cell is changed
+    for this mask.
+    """
+
+    # max number of fields in cache
+    MAX_FIELDS = 8
+
+    def __init__(self, walkmap):
+        self.walkmap = walkmap
+        self._fields = {}
+        self._used = 0
+        self.builds = 0
+        self.hits = 0
+
+    def _is_actual(self, field, allowed):
+        walkmap = self.walkmap
+        if field.version == walkmap.version:
+            return True
+        changes = walkmap.changes_since(field.version)
+        if changes is None:
+            return False
+        for idx in changes:
+            if idx != field.goal and walkmap.is_free(idx, allowed) != bool(field.free[idx]):
+                return False
+        field.version = walkmap.version
+        return True
+
+    def get(self, goal, allowed):
+        """ Get field for goal cell (x, y) and mask of allowed classes """
+        walkmap = self.walkmap
+        walkmap.flush()
+        key = walkmap.index(*goal), allowed
+        field = self._fields.get(key)
+        if field is None or not self._is_actual(field, allowed):
+            field = FlowField(walkmap.free_cells(allowed), walkmap.w, walkmap.h, key[0])
+            field.version = walkmap.version
+            self._fields[key] = field
+            self.builds += 1
+        else:
+            self.hits += 1
+        self._used += 1
+        field.used = self._used
+        if len(self._fields) > self.MAX_FIELDS:
+            oldest = min(self._fields, key=lambda k: self._fields[k].used)
+            del self._fields[oldest]
+        return field
+
+
+class SharedPlanners(object):
+    """
+    Base for planners shared by all characters with the same mask of
+    allowed classes. Planner is kept in sync with the walk map: on each
+    request it gets cells changed since previous one (updateCells) or is
+    rebuilt if the log of changes is too short.
+    """
+
+    def __init__(self, walkmap, create):
+        """ create makes planner from SQ_MapHandler of the walk map """
+        self.walkmap = walkmap
+        self.create = create
+        self._planners = {}
+
+    def get(self, allowed):
+        """ Get planner for mask of allowed classes """
+        walkmap = self.walkmap
+        walkmap.flush()
+        planner = self._planners.get(allowed)
+        if planner is None:
+            mh = SQ_MapHandler(walkmap.view(allowed), walkmap.w, walkmap.h)
+            planner = self.create(mh)
+            self._planners[allowed] = planner
+        elif planner.version != walkmap.version:
+            changes = walkmap.changes_since(planner.version)
+            if changes is None:
+                planner.rebuild()
+            else:
+                planner.updateCells(changes)
+        planner.version = walkmap.version
+        return planner
+
+
+class HPAGraphs(SharedPlanners):
+    """ Abstract graphs of HPA* search, only changed clusters are recomputed """
+
+    def __init__(self, walkmap, cluster_size=10):
+        super(HPAGraphs, self).__init__(walkmap, lambda mh: HPAStar(mh, cluster_size))
+        self.cluster_size = cluster_size
+
+
+class JumpMaps(SharedPlanners):
+    """
+    Map handlers of Jump Point Search with precomputed jump tables. Cells
+    have uniform costs as for other planners, terrain isn't taken into
+    account by path finding
+    """
+
+    def __init__(self, walkmap):
+        super(JumpMaps, self).__init__(
+            walkmap, lambda mh: SQ_JumpMapHandler(mh.m, mh.w, mh.h))
@@ -0,0 +1,110 @@
+""" Drawing order of static objects """
+from bisect import bisect_left
+
+from backend import Canvas
+
+
+class ZOrder(object):
+    """
+    Keeps canvases of static objects sorted by y, lower objects are drawn
+    over upper ones. Objects with the same y share a bucket canvas, buckets
+    are kept in layer in order of their y, so object is inserted or removed
+    with bisect and without touching other rows.
+
+    Objects moved to bottom are drawn in bottom layer (it should be just
+    above landscape) until they are restored. Dynamic objects are drawn in
+    dynamic layer in order they were added.
+
+    Hidden objects are detached from their layer (Culler hides objects out of
+    view), they are attached back to their place when shown, objects are
+    moved between layers while hidden too
+    """
+
+    def __init__(self, canvas):
+        # canvas where widgets of objects are added by game
+        self.canvas = canvas
+        self.layer = Canvas()
+        self.bottom = Canvas()
+        self.dynamic = Canvas()
+        # sorted -y of buckets in layer
+        self._keys = []
+        self._buckets = {}
+        # obj: its bucket, bottom or dynamic layer
+        self._parents = {}
+        # obj: number of dynamic object, sorted numbers of attached ones
+        self._numbers = {}
+        self._attached = []
+        self._hidden = set()
+
+    def bucket(self, y):
+        """ Get canvas of objects which have bottom at y """
+        key = -y
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = Canvas()
+            index = bisect_left(self._keys, key)
+            self._keys.insert(index, key)
+            self.layer.insert(index, bucket)
+        return bucket
+
+    def _move(self, obj, parent):
+        """ Set parent of object, canvas is returned if it should be inserted """
+        canvas = obj.widget.canvas
+        previous = self._parents.get(obj, self.canvas)
+        self._parents[obj] = parent
+        if obj in self._hidden:
+            return None
+        previous.remove(canvas)
+        return canvas
+
+    def add(self, obj):
+        """ Take widget canvas of just added object to its place """
+        bucket = self.bucket(obj.widget.pos[1])
+        canvas = self._move(obj, bucket)
+        if canvas is not None:
+            bucket.add(canvas)
+
+    def add_dynamic(self, obj):
+        """ Take widget canvas of just added dynamic object to dynamic layer """
+        self._numbers[obj] = number = len(self._numbers)
+        self._move(obj, self.dynamic)
+        self._attached.append(number)
+        self.dynamic.add(obj.widget.canvas)
+
+    def move_to_bottom(self, obj):
+        if self._parents.get(obj) is not self.bottom:
+            canvas = self._move(obj, self.bottom)
+            if canvas is not None:
+                self.bottom.insert(0, canvas)
+
+    def restore(self, obj):
+        """ Return object moved to bottom to its place """
+        if self._parents.get(obj) is self.bottom:
+            self.add(obj)
+
+    def hide(self, obj):
+        """ Detach canvas of object from its layer """
+        if obj in self._hidden:
+            return
+        self._hidden.add(obj)
+        self._parents.get(obj, self.canvas).remove(obj.widget.canvas)
+        number = self._numbers.get(obj)
+        if number is not None:
+            del self._attached[bisect_left(self._attached, number)]
+
+    def show(self, obj):
+        """ Attach canvas of hidden object back to its place """
+        if obj not in self._hidden:
+            return
+        self._hidden.discard(obj)
+        canvas = obj.widget.canvas
+        parent = self._parents.get(obj, self.canvas)
+        number = self._numbers.get(obj)
+        if number is not None:
+            index = bisect_left(self._attached, number)
+            self._attached.insert(index, number)
+            parent.insert(index, canvas)
+        elif parent is self.bottom:
+            self.bottom.insert(0, canvas)
+        else:
+            parent.add(canvas)